@@ -0,0 +1,214 @@
+import ast
+import re
+from bisect import bisect_left
+from rules import LANGUAGES, engine_for, text_blocks
+
+# Line breaks as the Python tokenizer sees them
+_PY_LINE_BREAK_RE = re.compile(r'\r\n?|\n')
+_LONE_CR_RE = re.compile(r'\r(?!\n)')
+_MUTABLE_LITERALS = (ast.List, ast.Dict, ast.Set, ast.ListComp, ast.DictComp, ast.SetComp)
+
+# Text every AST rule finding needs on its line: print(...), except:, None,
+# and the opening bracket of a mutable default, parenthesized or not
+_AST_HINT_RES = [re.compile(p) for p in (r'print', r'except', r'None', r'=[\s(]*[\[{]')]
+
+
+def hint_lines(code):
+    """Sorted line numbers on which PythonRuleVisitor could report something"""
+    ends = sorted({m.end() - 1 for regex in _AST_HINT_RES for m in regex.finditer(code)})
+    lines = []
+    lineno = 1
+    counted = 0
+    for pos in ends:
+        lineno += code.count('\n', counted, pos)
+        counted = pos
+        if not lines or lines[-1] != lineno:
+            lines.append(lineno)
+    return lines
+
+
+class PythonRuleVisitor(ast.NodeVisitor):
+    """
+    Python rules read off the syntax tree, collected in a single walk.
+
+    With candidate_lines (see hint_lines) the walk skips every statement
+    whose lines contain none of them, so large files only pay for the parts
+    that can hold a finding.
+    """
+
+    def __init__(self, code, candidate_lines=None):
+        self.code = code
+        self.candidate_lines = candidate_lines
+        self.issues = []
+        self._lines = None
+
+    def _may_match(self, stmt):
+        first = stmt.decorator_list[0].lineno if getattr(stmt, 'decorator_list', None) else stmt.lineno
+        lines = self.candidate_lines
+        i = bisect_left(lines, first)
+        return i < len(lines) and lines[i] <= stmt.end_lineno
+
+    def generic_visit(self, node):
+        if self.candidate_lines is None:
+            return super().generic_visit(node)
+        for field, value in ast.iter_fields(node):
+            if isinstance(value, list):
+                for item in value:
+                    if isinstance(item, ast.AST) and (not isinstance(item, ast.stmt) or self._may_match(item)):
+                        self.visit(item)
+            elif isinstance(value, ast.AST):
+                self.visit(value)
+
+    def column(self, node):
+        # col_offset counts UTF-8 bytes; report a 1-based character column
+        if self.code.isascii():
+            return node.col_offset + 1
+        if self._lines is None:
+            self._lines = _PY_LINE_BREAK_RE.split(self.code)
+        prefix = self._lines[node.lineno - 1].encode('utf-8')[:node.col_offset]
+        return len(prefix.decode('utf-8', errors='ignore')) + 1
+
+    def report(self, node, issue_type, severity, message, suggestion):
+        self.issues.append({
+            'type': issue_type,
+            'severity': severity,
+            'line': node.lineno,
+            'column': self.column(node),
+            'message': message,
+            'suggestion': suggestion
+        })
+
+    def visit_Call(self, node):
+        if isinstance(node.func, ast.Name) and node.func.id == 'print':
+            self.report(node, 'Debug Code', 'Low',
+                        "Print statement found - possible debug code",
+                        "Remove or replace with proper logging")
+        self.generic_visit(node)
+
+    def visit_ExceptHandler(self, node):
+        if node.type is None:
+            self.report(node, 'Broad Exception', 'Medium',
+                        "Bare except clause catches all exceptions",
+                        "Specify exception types to catch")
+        self.generic_visit(node)
+
+    def _check_none_assignment(self, node):
+        if isinstance(node.value, ast.Constant) and node.value.value is None:
+            self.report(node, 'None Assignment', 'Low',
+                        "Variable assigned to None",
+                        "Consider initializing with appropriate default value")
+
+    def visit_Assign(self, node):
+        self._check_none_assignment(node)
+        self.generic_visit(node)
+
+    def visit_AnnAssign(self, node):
+        self._check_none_assignment(node)
+        self.generic_visit(node)
+
+    def visit_Compare(self, node):
+        for op, right in zip(node.ops, node.comparators):
+            if (isinstance(op, (ast.Eq, ast.NotEq)) and
+                    isinstance(right, ast.Constant) and right.value is None):
+                self.report(node, 'None Comparison', 'Low',
+                            "Comparison to None with == or !=",
+                            "Use 'is None' or 'is not None'")
+                break
+        self.generic_visit(node)
+
+    def _check_defaults(self, node):
+        for default in node.args.defaults + node.args.kw_defaults:
+            if isinstance(default, _MUTABLE_LITERALS):
+                self.report(default, 'Mutable Default Argument', 'Medium',
+                            "Mutable default argument is shared between calls",
+                            "Default to None and create the value inside the function")
+
+    def visit_FunctionDef(self, node):
+        self._check_defaults(node)
+        self.generic_visit(node)
+
+    def visit_AsyncFunctionDef(self, node):
+        self._check_defaults(node)
+        self.generic_visit(node)
+
+    def visit_Lambda(self, node):
+        self._check_defaults(node)
+        self.generic_visit(node)
+
+
+def language_of(filename):
+    file_extension = filename.split('.')[-1].lower() if '.' in filename else ''
+    return LANGUAGES.get(file_extension, 'generic')
+
+
+class CodeAnalyzer:
+    def __init__(self):
+        self.issues = []
+
+    def analyze_python(self, code):
+        """Parse once and run the AST rules over the tree"""
+        try:
+            tree = ast.parse(code)
+        except (RecursionError, MemoryError):
+            # nested too deeply for the parser: no AST findings rather than a failed request
+            return []
+        except SyntaxError as e:
+            return [{
+                'type': 'Syntax Error',
+                'severity': 'Critical',
+                'line': e.lineno,
+                'message': f"Syntax error: {e.msg}",
+                'suggestion': "Fix the syntax error according to Python grammar rules"
+            }]
+        # Hint lines are counted on '\n' only, so old Mac '\r' files get a full walk
+        candidate_lines = None if _LONE_CR_RE.search(code) else hint_lines(code)
+        visitor = PythonRuleVisitor(code, candidate_lines)
+        try:
+            visitor.visit(tree)
+        except RecursionError:
+            # ast.parse accepts nesting deeper than a recursive walk can follow
+            return []
+        return visitor.issues
+
+    def analyze_code(self, code, filename):
+        """Main analysis function"""
+        return self.analyze_blocks(text_blocks(code), filename, code)
+
+    def analyze_blocks(self, blocks, filename, code=None):
+        """
+        Analyze text given as blocks of whole lines (see rules.text_blocks and
+        streaming.SourceUpload.blocks). Only Python needs the full text as
+        well, for its AST rules.
+        """
+        language = language_of(filename)
+        if language == 'python' and code is None:
+            raise ValueError("Python analysis needs the full source text")
+
+        # One pass over the text runs the language rules and the generic rules
+        language_issues, generic_issues = engine_for(language).scan_blocks(blocks)
+
+        if language == 'python':
+            # AST findings and the remaining text rules, in line order
+            language_issues = sorted(self.analyze_python(code) + language_issues,
+                                     key=lambda issue: issue['line'] or 0)
+
+        return language_issues + generic_issues
+
+
+def severity_count(issues):
+    counts = {'Critical': 0, 'High': 0, 'Medium': 0, 'Low': 0}
+    for issue in issues:
+        if issue['severity'] in counts:
+            counts[issue['severity']] += 1
+    return counts
+
+
+def analyze_file(filename, code):
+    """Process-pool entry point: analyze one file and summarize the result"""
+    issues = CodeAnalyzer().analyze_code(code, filename)
+    return {
+        'filename': filename,
+        'issues': issues,
+        'total_issues': len(issues),
+        'severity_count': severity_count(issues)
+    }
@@ -1,12 +1,20 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
 from flask_pymongo import PyMongo
 from bson.objectid import ObjectId
 from datetime import datetime
 import os
-import re
-import ast
 import json
+import itertools
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
 from werkzeug.utils import secure_filename
+from analyzer import CodeAnalyzer, analyze_file, language_of, severity_count
+from batch import BatchError, BatchLimits, iter_archive, iter_json_files
+from cache import AnalysisCache, content_key
+from pagination import CursorError, SORT, fetch_page
+from sources import load_source, release_source, store_source, store_source_data
+from streaming import SourceUpload
+from stats import ensure_stats, forget_analysis, read_stats, rebuild_stats, record_analyses
 
 app = Flask(__name__)
 
@@ -14,11 +22,18 @@ app = Flask(__name__)
 app.config["MONGO_URI"] = "mongodb://localhost:27017/bugfinder"
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['ANALYSIS_CACHE_SIZE'] = 1024  # results kept in the in-process LRU
+app.config['BATCH_WORKERS'] = os.cpu_count() or 1
+app.config['BATCH_MAX_FILES'] = 5000
+app.config['BATCH_MAX_BYTES'] = 256 * 1024 * 1024  # decompressed size of one batch
+app.config['PAGE_SIZE'] = 50
+app.config['MAX_PAGE_SIZE'] = 200
 
 # Create upload folder if it doesn't exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 mongo = PyMongo(app)
+analysis_cache = AnalysisCache(mongo.db.analyses, capacity=app.config['ANALYSIS_CACHE_SIZE'])
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {
@@ -28,173 +43,70 @@ ALLOWED_EXTENSIONS = {
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-class CodeAnalyzer:
-    def __init__(self):
-        self.issues = []
-    
-    def analyze_python(self, code):
-        """Analyze Python code for common issues"""
-        issues = []
-        lines = code.split('\n')
-        
+def file_extension_of(filename):
+    return filename.split('.')[-1].lower() if '.' in filename else ''
+
+_batch_pool = None
+
+def batch_pool():
+    # Created on first use so importing the app does not start worker processes
+    global _batch_pool
+    if _batch_pool is None:
+        _batch_pool = ProcessPoolExecutor(max_workers=app.config['BATCH_WORKERS'])
+    return _batch_pool
+
+def discard_batch_pool(pool):
+    # A worker died (killed, out of memory): the pool is broken for good, so
+    # the next job gets a new one, unless another request already replaced it
+    global _batch_pool
+    if _batch_pool is pool:
+        _batch_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def submit_batch_job(filename, code):
+    """(pool, future) of one file's analysis"""
+    pool = batch_pool()
+    try:
+        return pool, pool.submit(analyze_file, filename, code)
+    except BrokenProcessPool:
+        discard_batch_pool(pool)
+        pool = batch_pool()
+        return pool, pool.submit(analyze_file, filename, code)
+
+def ensure_indexes():
+    # Looks up cached results by content hash
+    mongo.db.analyses.create_index('content_key')
+    # Keyset pagination of the history list
+    mongo.db.analyses.create_index(SORT)
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create the MongoDB indexes the API relies on and seed the /api/stats counters"""
+    ensure_indexes()
+    print('Indexes created.')
+    if ensure_stats(mongo.db):
+        print('Stats counters rebuilt from the stored analyses.')
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the /api/stats counters from the stored analyses"""
+    stats = rebuild_stats(mongo.db)
+    print(f"Counted {stats['total_analyses']} analyses.")
+
+@app.cli.command('migrate-sources')
+def migrate_sources_command():
+    """Move code embedded in older analyses into the sources collection"""
+    moved = 0
+    for analysis in mongo.db.analyses.find({'code': {'$exists': True}}, {'code': 1}):
+        ref = store_source(mongo.db, analysis['code'])
         try:
-            # Parse AST for syntax errors
-            ast.parse(code)
-        except SyntaxError as e:
-            issues.append({
-                'type': 'Syntax Error',
-                'severity': 'Critical',
-                'line': e.lineno,
-                'message': f"Syntax error: {e.msg}",
-                'suggestion': "Fix the syntax error according to Python grammar rules"
-            })
-        
-        for i, line in enumerate(lines, 1):
-            line_stripped = line.strip()
-            
-            # Check for common issues
-            if 'print(' in line and not line_stripped.startswith('#'):
-                issues.append({
-                    'type': 'Debug Code',
-                    'severity': 'Low',
-                    'line': i,
-                    'message': "Print statement found - possible debug code",
-                    'suggestion': "Remove or replace with proper logging"
-                })
-            
-            if re.search(r'except\s*:', line):
-                issues.append({
-                    'type': 'Broad Exception',
-                    'severity': 'Medium',
-                    'line': i,
-                    'message': "Bare except clause catches all exceptions",
-                    'suggestion': "Specify exception types to catch"
-                })
-            
-            if 'TODO' in line.upper() or 'FIXME' in line.upper():
-                issues.append({
-                    'type': 'TODO/FIXME',
-                    'severity': 'Low',
-                    'line': i,
-                    'message': "Unfinished code found",
-                    'suggestion': "Complete the implementation"
-                })
-            
-            if re.search(r'=\s*None\s*$', line) and 'def ' not in line:
-                issues.append({
-                    'type': 'None Assignment',
-                    'severity': 'Low',
-                    'line': i,
-                    'message': "Variable assigned to None",
-                    'suggestion': "Consider initializing with appropriate default value"
-                })
-        
-        return issues
-    
-    def analyze_javascript(self, code):
-        """Analyze JavaScript code for common issues"""
-        issues = []
-        lines = code.split('\n')
-        
-        for i, line in enumerate(lines, 1):
-            line_stripped = line.strip()
-            
-            # Check for console.log
-            if 'console.log(' in line and not line_stripped.startswith('//'):
-                issues.append({
-                    'type': 'Debug Code',
-                    'severity': 'Low',
-                    'line': i,
-                    'message': "Console.log statement found - possible debug code",
-                    'suggestion': "Remove or replace with proper logging"
-                })
-            
-            # Check for == instead of ===
-            if '==' in line and '===' not in line and '!=' in line and '!==' not in line:
-                issues.append({
-                    'type': 'Weak Comparison',
-                    'severity': 'Medium',
-                    'line': i,
-                    'message': "Use strict equality (===) instead of loose equality (==)",
-                    'suggestion': "Replace == with === and != with !=="
-                })
-            
-            # Check for var usage
-            if re.search(r'\bvar\s+', line):
-                issues.append({
-                    'type': 'Deprecated Syntax',
-                    'severity': 'Low',
-                    'line': i,
-                    'message': "Using 'var' keyword - consider 'let' or 'const'",
-                    'suggestion': "Use 'let' for variables or 'const' for constants"
-                })
-            
-            # Check for missing semicolon
-            if line_stripped and not line_stripped.endswith((';', '{', '}', ')', ']')) and not line_stripped.startswith('//'):
-                if re.search(r'(return|break|continue)\s*\w', line):
-                    issues.append({
-                        'type': 'Missing Semicolon',
-                        'severity': 'Low',
-                        'line': i,
-                        'message': "Missing semicolon",
-                        'suggestion': "Add semicolon at the end of the statement"
-                    })
-        
-        return issues
-    
-    def analyze_generic(self, code, file_extension):
-        """Generic analysis for any code"""
-        issues = []
-        lines = code.split('\n')
-        
-        for i, line in enumerate(lines, 1):
-            # Check for long lines
-            if len(line) > 120:
-                issues.append({
-                    'type': 'Long Line',
-                    'severity': 'Low',
-                    'line': i,
-                    'message': f"Line too long ({len(line)} characters)",
-                    'suggestion': "Break long lines for better readability"
-                })
-            
-            # Check for trailing whitespace
-            if line.endswith(' ') or line.endswith('\t'):
-                issues.append({
-                    'type': 'Trailing Whitespace',
-                    'severity': 'Low',
-                    'line': i,
-                    'message': "Trailing whitespace found",
-                    'suggestion': "Remove trailing spaces/tabs"
-                })
-            
-            # Check for tabs and spaces mixed
-            if '\t' in line and '    ' in line:
-                issues.append({
-                    'type': 'Mixed Indentation',
-                    'severity': 'Medium',
-                    'line': i,
-                    'message': "Mixed tabs and spaces for indentation",
-                    'suggestion': "Use consistent indentation (either tabs or spaces)"
-                })
-        
-        return issues
-    
-    def analyze_code(self, code, filename):
-        """Main analysis function"""
-        file_extension = filename.split('.')[-1].lower() if '.' in filename else ''
-        all_issues = []
-        
-        # Language-specific analysis
-        if file_extension == 'py':
-            all_issues.extend(self.analyze_python(code))
-        elif file_extension in ['js', 'jsx']:
-            all_issues.extend(self.analyze_javascript(code))
-        
-        # Generic analysis for all files
-        all_issues.extend(self.analyze_generic(code, file_extension))
-        
-        return all_issues
+            mongo.db.analyses.update_one({'_id': analysis['_id']},
+                                         {'$set': {'code_ref': ref}, '$unset': {'code': ''}})
+        except Exception:
+            release_source(mongo.db, ref)
+            raise
+        moved += 1
+    print(f"Moved the code of {moved} analyses.")
 
 @app.route('/')
 def index():
@@ -213,40 +125,81 @@ def analyze_code():
                 return jsonify({'error': 'File type not supported'}), 400
             
             filename = secure_filename(file.filename)
-            code = file.read().decode('utf-8')
+            # Hashed and checked now; decoded block by block only if analyzed
+            upload = SourceUpload(file.stream, file_extension_of(filename))
+            if upload.blank:
+                return jsonify({'error': 'Empty code provided'}), 400
+            key = upload.content_key
         
         elif request.json and 'code' in request.json:
             # Direct code input
             code = request.json['code']
             filename = request.json.get('filename', 'code.py')
+            upload = None
+            if not code.strip():
+                return jsonify({'error': 'Empty code provided'}), 400
+            key = content_key(code, file_extension_of(filename))
         
         else:
             return jsonify({'error': 'No code or file provided'}), 400
         
-        if not code.strip():
-            return jsonify({'error': 'Empty code provided'}), 400
+        # Identical code under the same rules gets the stored result back
+        cached = analysis_cache.get(key)
+        if cached is not None:
+            return jsonify({
+                '_id': cached['analysis_id'],
+                'filename': filename,
+                'issues': cached['issues'],
+                'created_date': cached['created_date'],
+                'total_issues': cached['total_issues'],
+                'severity_count': cached['severity_count'],
+                'cached': True
+            }), 200
         
         # Analyze the code
         analyzer = CodeAnalyzer()
-        issues = analyzer.analyze_code(code, filename)
+        if upload is None:
+            issues = analyzer.analyze_code(code, filename)
+            code_ref = store_source(mongo.db, code)
+            code_size = len(code)
+        else:
+            if language_of(filename) == 'python':
+                # The AST rules are the only ones that need the whole text
+                issues = analyzer.analyze_code(upload.text(), filename)
+            else:
+                issues = analyzer.analyze_blocks(upload.blocks(), filename)
+            code_ref = upload.source_ref
+            store_source_data(mongo.db, code_ref, upload.size, upload.compressed)
+            code_size = upload.length
         
         # Save analysis to database
         analysis_result = {
             'filename': filename,
-            'code': code,
+            'code_ref': code_ref,
+            'code_size': code_size,
+            'content_key': key,
             'issues': issues,
             'created_date': datetime.utcnow(),
             'total_issues': len(issues),
-            'severity_count': {
-                'Critical': len([i for i in issues if i['severity'] == 'Critical']),
-                'High': len([i for i in issues if i['severity'] == 'High']),
-                'Medium': len([i for i in issues if i['severity'] == 'Medium']),
-                'Low': len([i for i in issues if i['severity'] == 'Low'])
-            }
+            'severity_count': severity_count(issues)
         }
         
-        result = mongo.db.analyses.insert_one(analysis_result)
+        try:
+            result = mongo.db.analyses.insert_one(analysis_result)
+        except Exception:
+            # the reference taken above belongs to no analysis
+            release_source(mongo.db, code_ref)
+            raise
+        record_analyses(mongo.db, [analysis_result])
         analysis_result['_id'] = str(result.inserted_id)
+        analysis_cache.put(key, {
+            'analysis_id': analysis_result['_id'],
+            'issues': issues,
+            'created_date': analysis_result['created_date'],
+            'total_issues': analysis_result['total_issues'],
+            'severity_count': analysis_result['severity_count']
+        })
+        analysis_result['cached'] = False
         
         return jsonify(analysis_result), 201
     
@@ -255,28 +208,150 @@ def analyze_code():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """
+    Analyze many files at once: a zip/tar upload in 'archive' or a JSON body
+    {"files": [{"filename": ..., "code": ...}]}. Files are read one at a time
+    as workers free up, and one NDJSON line is streamed per file as it
+    finishes ({'filename', 'error'} when it could not be analyzed), then a
+    summary line once all results are stored; its inserted_ids follow the
+    order of the streamed uncached lines.
+    """
+    limits = BatchLimits(app.config['BATCH_MAX_FILES'], app.config['MAX_CONTENT_LENGTH'],
+                         app.config['BATCH_MAX_BYTES'])
+    try:
+        if 'archive' in request.files:
+            archive = request.files['archive']
+            files = iter_archive(archive.stream, archive.filename or '', allowed_file, limits)
+        elif request.is_json and 'files' in (request.json or {}):
+            files = iter_json_files(request.json['files'], allowed_file, limits)
+        else:
+            return jsonify({'error': 'No archive or files provided'}), 400
+        # An unreadable archive is still rejected as a whole, before streaming
+        first = next(files, None)
+    except BatchError as e:
+        return jsonify({'error': str(e)}), 400
+    files = itertools.chain([first] if first is not None else [], files)
+    # Files read ahead of the workers; the rest stay in the archive
+    max_pending = 2 * app.config['BATCH_WORKERS']
+
+    def generate():
+        documents = []
+        keys = []
+        pending = {}
+        count = 0
+
+        def finish(futures):
+            for future in futures:
+                pool, filename, key, code = pending.pop(future)
+                try:
+                    result = future.result()
+                except BrokenProcessPool as e:
+                    discard_batch_pool(pool)
+                    yield json.dumps({'filename': filename, 'error': f'Worker process failed: {e}'}) + '\n'
+                    continue
+                except Exception as e:
+                    yield json.dumps({'filename': filename, 'error': str(e)}) + '\n'
+                    continue
+                yield json.dumps({**result, 'cached': False}) + '\n'
+                documents.append({
+                    **result,
+                    'code_ref': store_source(mongo.db, code),
+                    'code_size': len(code),
+                    'content_key': key,
+                    'created_date': datetime.utcnow()
+                })
+                keys.append(key)
+
+        try:
+            for filename, code in files:
+                count += 1
+                if not code.strip():
+                    continue
+                key = content_key(code, file_extension_of(filename))
+                cached = analysis_cache.get(key)
+                if cached is not None:
+                    yield json.dumps({
+                        '_id': cached['analysis_id'],
+                        'filename': filename,
+                        'issues': cached['issues'],
+                        'total_issues': cached['total_issues'],
+                        'severity_count': cached['severity_count'],
+                        'cached': True
+                    }) + '\n'
+                    continue
+                pool, future = submit_batch_job(filename, code)
+                pending[future] = (pool, filename, key, code)
+                if len(pending) >= max_pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from finish(done)
+        except BatchError as e:
+            # a limit reached partway: what was read so far is still stored
+            yield json.dumps({'error': str(e)}) + '\n'
+        for future in as_completed(list(pending)):
+            yield from finish([future])
+
+        inserted_ids = []
+        if documents:
+            try:
+                inserted = mongo.db.analyses.insert_many(documents)
+            except Exception:
+                # the references taken above belong to no analysis
+                for document in documents:
+                    release_source(mongo.db, document['code_ref'])
+                raise
+            record_analyses(mongo.db, documents)
+            for key, document, inserted_id in zip(keys, documents, inserted.inserted_ids):
+                inserted_ids.append(str(inserted_id))
+                analysis_cache.put(key, {
+                    'analysis_id': str(inserted_id),
+                    'issues': document['issues'],
+                    'created_date': document['created_date'],
+                    'total_issues': document['total_issues'],
+                    'severity_count': document['severity_count']
+                })
+        yield json.dumps({
+            'done': True,
+            'files': count,
+            'analyzed': len(documents),
+            'inserted_ids': inserted_ids
+        }) + '\n'
+
+    # the archive is read while the response streams, so the request stays open
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/api/analyses', methods=['GET'])
 def get_analyses():
+    """One page of the history list; pass next_cursor back as ?cursor= for the next"""
     try:
-        analyses = list(mongo.db.analyses.find().sort('created_date', -1).limit(50))
+        limit = min(max(request.args.get('limit', app.config['PAGE_SIZE'], type=int), 1),
+                    app.config['MAX_PAGE_SIZE'])
+        analyses, next_cursor = fetch_page(mongo.db.analyses, request.args.get('cursor'), limit)
         
         for analysis in analyses:
             analysis['_id'] = str(analysis['_id'])
-            # Don't return full code in list view for performance
-            analysis.pop('code', None)
             
-        return jsonify(analyses)
+        return jsonify({'analyses': analyses, 'next_cursor': next_cursor})
+    except CursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/analyses/<analysis_id>', methods=['GET'])
 def get_analysis(analysis_id):
+    """Analysis details; the source body is only loaded with ?include_code=1"""
     try:
-        analysis = mongo.db.analyses.find_one({'_id': ObjectId(analysis_id)})
+        include_code = request.args.get('include_code', '').lower() in ('1', 'true', 'yes')
+        projection = None if include_code else {'code': 0}
+        analysis = mongo.db.analyses.find_one({'_id': ObjectId(analysis_id)}, projection)
         if not analysis:
             return jsonify({'error': 'Analysis not found'}), 404
             
         analysis['_id'] = str(analysis['_id'])
+        # Analyses stored before the sources collection still embed their code
+        if include_code and 'code' not in analysis and analysis.get('code_ref'):
+            analysis['code'] = load_source(mongo.db, analysis['code_ref'])
         return jsonify(analysis)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -284,9 +359,16 @@ def get_analysis(analysis_id):
 @app.route('/api/analyses/<analysis_id>', methods=['DELETE'])
 def delete_analysis(analysis_id):
     try:
-        result = mongo.db.analyses.delete_one({'_id': ObjectId(analysis_id)})
-        if result.deleted_count == 0:
+        deleted = mongo.db.analyses.find_one_and_delete(
+            {'_id': ObjectId(analysis_id)},
+            projection={'issues.severity': 1, 'issues.type': 1, 'code_ref': 1}
+        )
+        if deleted is None:
             return jsonify({'error': 'Analysis not found'}), 404
+        forget_analysis(mongo.db, deleted)
+        if deleted.get('code_ref'):
+            release_source(mongo.db, deleted['code_ref'])
+        analysis_cache.discard_analysis(analysis_id)
             
         return jsonify({'message': 'Analysis deleted successfully'})
     except Exception as e:
@@ -295,31 +377,14 @@ def delete_analysis(analysis_id):
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     try:
-        total_analyses = mongo.db.analyses.count_documents({})
-        
-        # Get severity distribution across all analyses
-        pipeline = [
-            {'$unwind': '$issues'},
-            {'$group': {'_id': '$issues.severity', 'count': {'$sum': 1}}}
-        ]
-        severity_dist = list(mongo.db.analyses.aggregate(pipeline))
-        
-        # Get issue type distribution
-        type_pipeline = [
-            {'$unwind': '$issues'},
-            {'$group': {'_id': '$issues.type', 'count': {'$sum': 1}}},
-            {'$sort': {'count': -1}},
-            {'$limit': 10}
-        ]
-        issue_types = list(mongo.db.analyses.aggregate(type_pipeline))
-        
-        return jsonify({
-            'total_analyses': total_analyses,
-            'severity_distribution': severity_dist,
-            'top_issue_types': issue_types
-        })
+        return jsonify(read_stats(mongo.db))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(analysis_cache.stats())
+
 if __name__ == '__main__':
+    ensure_indexes()
     app.run(debug=True)
\ No newline at end of file
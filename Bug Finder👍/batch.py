@@ -0,0 +1,106 @@
+"""
+Reading the files of a batch submission: a zip or tar archive, or the
+'files' array of a JSON body.
+
+iter_archive(stream, archive_name, allowed, limits) and iter_json_files(files,
+allowed, limits) both yield (filename, code) for every supported file and
+raise BatchError for input the whole batch has to be rejected for.
+"""
+import tarfile
+import zipfile
+
+
+class BatchError(ValueError):
+    pass
+
+
+class BatchLimits:
+    def __init__(self, max_files, max_file_bytes, max_total_bytes):
+        self.max_files = max_files
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+        self.files = 0
+        self.total_bytes = 0
+
+    def admit(self, name, size):
+        """False for a file to skip, BatchError once the batch is too big"""
+        if size > self.max_file_bytes:
+            return False
+        self.files += 1
+        self.total_bytes += size
+        if self.files > self.max_files:
+            raise BatchError(f"Batch contains more than {self.max_files} files")
+        if self.total_bytes > self.max_total_bytes:
+            raise BatchError(f"Batch expands to more than {self.max_total_bytes} bytes")
+        return True
+
+
+def _decode(raw):
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+
+def _iter_zip(stream, allowed, limits):
+    try:
+        archive = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile as e:
+        raise BatchError(f"Invalid zip archive: {e}")
+    with archive:
+        for info in archive.infolist():
+            if info.is_dir() or not allowed(info.filename):
+                continue
+            if not limits.admit(info.filename, info.file_size):
+                continue
+            # file_size comes from the archive header, so the read is capped too
+            with archive.open(info) as member:
+                raw = member.read(limits.max_file_bytes + 1)
+            if len(raw) > limits.max_file_bytes:
+                continue
+            code = _decode(raw)
+            if code is not None:
+                yield info.filename, code
+
+
+def _iter_tar(stream, allowed, limits):
+    try:
+        archive = tarfile.open(fileobj=stream, mode='r:*')
+    except tarfile.TarError as e:
+        raise BatchError(f"Invalid tar archive: {e}")
+    with archive:
+        for info in archive:
+            if not info.isfile() or not allowed(info.name):
+                continue
+            if not limits.admit(info.name, info.size):
+                continue
+            member = archive.extractfile(info)
+            if member is None:
+                continue
+            code = _decode(member.read())
+            if code is not None:
+                yield info.name, code
+
+
+def iter_archive(stream, archive_name, allowed, limits):
+    name = archive_name.lower()
+    if name.endswith('.zip'):
+        return _iter_zip(stream, allowed, limits)
+    if name.endswith(('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')):
+        return _iter_tar(stream, allowed, limits)
+    raise BatchError("Archive must be a .zip or .tar(.gz/.bz2/.xz) file")
+
+
+def iter_json_files(files, allowed, limits):
+    if not isinstance(files, list):
+        raise BatchError("'files' must be a list of {filename, code} objects")
+    for entry in files:
+        if not isinstance(entry, dict) or not isinstance(entry.get('code'), str):
+            raise BatchError("'files' must be a list of {filename, code} objects")
+        filename = entry.get('filename') or 'code.py'
+        code = entry['code']
+        if not allowed(filename):
+            continue
+        if not limits.admit(filename, len(code.encode('utf-8'))):
+            continue
+        yield filename, code
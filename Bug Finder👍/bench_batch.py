@@ -0,0 +1,62 @@
+"""
+Benchmark: batch analysis throughput (files per second) against the number
+of ProcessPoolExecutor workers, next to analyzing every file inline on one
+thread as /api/analyze does.
+
+Usage:
+    python bench_batch.py                 # 400 files of 2000 lines
+    python bench_batch.py 1000 500        # files, lines per file
+"""
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from analyzer import analyze_file
+from bench_analyzer import (PY_CLEAN, PY_ISSUES, JS_CLEAN, JS_ISSUES, CSS_CLEAN, CSS_ISSUES,
+                            make_source)
+
+
+def make_files(n_files, n_lines):
+    templates = [('py', PY_CLEAN, PY_ISSUES), ('js', JS_CLEAN, JS_ISSUES), ('css', CSS_CLEAN, CSS_ISSUES)]
+    files = []
+    for i in range(n_files):
+        extension, clean, issues = templates[i % len(templates)]
+        files.append((f'file{i}.{extension}', make_source(clean, issues, n_lines, seed=i)))
+    return files
+
+
+def run_inline(files):
+    return [analyze_file(filename, code) for filename, code in files]
+
+
+def run_pool(files, workers):
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Start the workers before timing, as the app's long-lived pool would be
+        list(pool.map(int, range(workers)))
+        start = time.perf_counter()
+        futures = [pool.submit(analyze_file, filename, code) for filename, code in files]
+        results = [f.result() for f in as_completed(futures)]
+        return results, time.perf_counter() - start
+
+
+def main(n_files, n_lines):
+    files = make_files(n_files, n_lines)
+    print(f"{n_files} files x {n_lines} lines, {os.cpu_count()} CPUs")
+    print(f"{'mode':<12}{'seconds':>10}{'files/s':>10}{'speedup':>9}")
+
+    start = time.perf_counter()
+    run_inline(files)
+    inline_s = time.perf_counter() - start
+    print(f"{'inline':<12}{inline_s:>10.2f}{n_files / inline_s:>10.1f}{1:>8.1f}x")
+
+    cpus = os.cpu_count() or 1
+    for workers in sorted({2 ** i for i in range(cpus.bit_length())} | {cpus}):
+        results, pool_s = run_pool(files, workers)
+        assert len(results) == n_files
+        print(f"{f'{workers} workers':<12}{pool_s:>10.2f}{n_files / pool_s:>10.1f}{inline_s / pool_s:>8.1f}x")
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:]]
+    main(*(args + [400, 2000][len(args):]))
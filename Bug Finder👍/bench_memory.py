@@ -0,0 +1,72 @@
+"""
+Benchmark: peak Python memory (tracemalloc) to hash, analyze and compress one
+upload, reading it whole as /api/analyze used to against the streaming
+SourceUpload path. The upload sits in a temporary file, as Werkzeug spools
+large uploads.
+
+Usage:
+    python bench_memory.py            # 1, 4 and 16 MB uploads
+    python bench_memory.py 8          # custom sizes in MB
+"""
+import sys
+import tempfile
+import tracemalloc
+import zlib
+
+from analyzer import CodeAnalyzer
+from bench_analyzer import (LegacyCodeAnalyzer, PY_CLEAN, PY_ISSUES, JS_CLEAN, JS_ISSUES,
+                            CSS_CLEAN, CSS_ISSUES, make_source)
+from cache import content_key
+from streaming import SourceUpload
+
+
+def whole_file(stream, filename, extension):
+    """The previous request path: bytes, str and per-analyzer line lists at once"""
+    code = stream.read().decode('utf-8')
+    content_key(code, extension)
+    zlib.compress(code.encode('utf-8'))
+    return LegacyCodeAnalyzer().analyze_code(code, filename)
+
+
+def streaming(stream, filename, extension):
+    upload = SourceUpload(stream, extension)
+    if extension == 'py':
+        issues = CodeAnalyzer().analyze_code(upload.text(), filename)
+    else:
+        issues = CodeAnalyzer().analyze_blocks(upload.blocks(), filename)
+    upload.compressed()
+    return issues
+
+
+def peak_mb(fn, *args):
+    tracemalloc.start()
+    try:
+        fn(*args)
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def main(sizes_mb):
+    cases = [('py', PY_CLEAN, PY_ISSUES), ('js', JS_CLEAN, JS_ISSUES), ('css', CSS_CLEAN, CSS_ISSUES)]
+    print(f"{'lang':<5}{'upload MB':>10}{'whole MB':>10}{'stream MB':>11}")
+    for size_mb in sizes_mb:
+        for extension, clean, issues in cases:
+            # ~28 bytes per line on average
+            code = make_source(clean, issues, size_mb * 2 ** 20 // 28)
+            data = code.encode('utf-8')
+            del code
+            with tempfile.TemporaryFile() as stream:
+                stream.write(data)
+                del data
+                filename = f'bench.{extension}'
+                stream.seek(0)
+                whole = peak_mb(whole_file, stream, filename, extension)
+                stream.seek(0)
+                streamed = peak_mb(streaming, stream, filename, extension)
+                upload_mb = stream.tell() / 2 ** 20
+            print(f"{extension:<5}{upload_mb:>10.1f}{whole:>10.1f}{streamed:>11.1f}")
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [1, 4, 16])
@@ -0,0 +1,88 @@
+"""
+Benchmark: history page latency at increasing depth, keyset cursors against
+skip/limit offsets. Needs a running MongoDB; it works in its own database,
+which it fills on first run.
+
+Usage:
+    python bench_pagination.py                  # 200k analyses
+    python bench_pagination.py 50000
+    MONGO_URI=mongodb://host:27017/bench python bench_pagination.py
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+
+from pagination import LIST_PROJECTION, SORT, fetch_page
+
+PAGE_SIZE = 50
+DEPTHS = [1, 10, 100, 1000, 3000]
+REPEAT = 5
+
+
+def seed(collection, n_docs):
+    if collection.estimated_document_count() >= n_docs:
+        return
+    collection.drop()
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1)
+    issue = {'type': 'Long Line', 'severity': 'Low', 'line': 1,
+             'message': 'Line too long (130 characters)', 'suggestion': 'Break long lines'}
+    batch = []
+    for i in range(n_docs):
+        batch.append({
+            'filename': f'file{i}.py',
+            'code': 'x = 1\n' * 700,
+            'issues': [issue] * 20,
+            # Several analyses share a timestamp so ties on created_date are exercised
+            'created_date': start + timedelta(seconds=i // 4),
+            'total_issues': 20,
+            'severity_count': {'Critical': 0, 'High': 0, 'Medium': 0, 'Low': 20}
+        })
+        if len(batch) == 5000:
+            collection.insert_many(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch)
+    collection.create_index(SORT)
+
+
+def best_of(fn):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main(n_docs):
+    uri = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/bugfinder_bench')
+    collection = MongoClient(uri).get_default_database()['analyses']
+    seed(collection, n_docs)
+
+    # Walk the keyset pages once to find the cursor that starts each depth
+    cursors = {1: None}
+    cursor = None
+    for page in range(1, max(DEPTHS)):
+        _, cursor = fetch_page(collection, cursor, PAGE_SIZE)
+        if cursor is None:
+            break
+        cursors[page + 1] = cursor
+
+    print(f"{n_docs} analyses, {PAGE_SIZE} per page, best of {REPEAT}")
+    print(f"{'page':>6}{'keyset ms':>12}{'skip ms':>12}")
+    for depth in DEPTHS:
+        if depth not in cursors:
+            break
+        keyset_ms = best_of(lambda: fetch_page(collection, cursors[depth], PAGE_SIZE))
+        skip_ms = best_of(lambda: list(collection.find({}, LIST_PROJECTION).sort(SORT)
+                                       .skip((depth - 1) * PAGE_SIZE).limit(PAGE_SIZE)))
+        print(f"{depth:>6}{keyset_ms:>12.2f}{skip_ms:>12.2f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,95 @@
+"""
+Result cache for /api/analyze.
+
+Results are keyed by a hash of the code, its file extension and the rule set
+version. Recently used keys live in an in-process LRU; behind it, the stored
+analyses themselves act as the persistent store through their indexed
+content_key field, so a repeat submission never re-runs the analyzer and never
+stores the code again.
+"""
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+
+from rules import RULESET_VERSION
+
+# Fields of a stored analysis that make up a cached result
+ENTRY_FIELDS = ('issues', 'total_issues', 'severity_count', 'created_date')
+
+
+def content_hasher(file_extension):
+    """sha256 object to feed the UTF-8 code into; its hexdigest is the key"""
+    return hashlib.sha256(f'{RULESET_VERSION}:{file_extension}:'.encode('utf-8'))
+
+
+def content_key(code, file_extension):
+    h = content_hasher(file_extension)
+    h.update(code.encode('utf-8'))
+    return h.hexdigest()
+
+
+class AnalysisCache:
+    def __init__(self, collection=None, capacity=1024):
+        self.collection = collection
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Cached entry for key ({'analysis_id', 'issues', ...}) or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return entry
+
+        if self.collection is not None:
+            projection = {field: 1 for field in ENTRY_FIELDS}
+            doc = self.collection.find_one({'content_key': key}, projection)
+            if doc is not None:
+                entry = {field: doc.get(field) for field in ENTRY_FIELDS}
+                entry['analysis_id'] = str(doc['_id'])
+                with self._lock:
+                    self.store_hits += 1
+                self._remember(key, entry)
+                return entry
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, entry):
+        """Remember a freshly stored analysis; the store side is its own document"""
+        self._remember(key, entry)
+
+    def discard_analysis(self, analysis_id):
+        """Forget in-memory entries pointing at a deleted analysis"""
+        with self._lock:
+            stale = [k for k, e in self._entries.items() if e['analysis_id'] == analysis_id]
+            for key in stale:
+                del self._entries[key]
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.store_hits
+            lookups = hits + self.misses
+            return {
+                'hits': hits,
+                'memory_hits': self.memory_hits,
+                'store_hits': self.store_hits,
+                'misses': self.misses,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+                'size': len(self._entries),
+                'capacity': self.capacity
+            }
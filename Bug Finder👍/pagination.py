@@ -0,0 +1,50 @@
+"""
+Keyset pagination over analyses, newest first.
+
+Pages are ordered by (created_date, _id) descending and backed by the index
+of the same shape, so fetching page N costs the same as page 1. The cursor
+handed to clients is the sort key of the last item on the previous page.
+"""
+import base64
+import json
+from datetime import datetime
+
+from bson.objectid import ObjectId
+
+SORT = [('created_date', -1), ('_id', -1)]
+# What the history list shows; code and issues are never fetched for it
+LIST_PROJECTION = {'filename': 1, 'created_date': 1, 'total_issues': 1, 'severity_count': 1}
+
+
+class CursorError(ValueError):
+    pass
+
+
+def encode_cursor(analysis):
+    key = {'d': analysis['created_date'].isoformat(), 'id': str(analysis['_id'])}
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(key['d']), ObjectId(key['id'])
+    except Exception:
+        raise CursorError('Invalid cursor')
+
+
+def page_filter(cursor):
+    if not cursor:
+        return {}
+    created_date, oid = decode_cursor(cursor)
+    return {'$or': [
+        {'created_date': {'$lt': created_date}},
+        {'created_date': created_date, '_id': {'$lt': oid}}
+    ]}
+
+
+def fetch_page(collection, cursor=None, limit=50):
+    """Returns (analyses, next_cursor); next_cursor is None on the last page"""
+    docs = list(collection.find(page_filter(cursor), LIST_PROJECTION).sort(SORT).limit(limit + 1))
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return docs[:limit], next_cursor
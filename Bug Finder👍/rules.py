@@ -0,0 +1,247 @@
+"""
+Rule registry and single-pass line rule engine.
+
+Every line rule declares its language, one or more prefilter regexes and a
+precise check. The prefilters of a language (plus the generic ones) are run
+over the whole text by the regex engine, the lines they hit are merged into a
+single candidate set, and one pass over those lines runs the precise checks.
+Lines no prefilter can hit are never split out or looked at in Python.
+
+Prefilters are kept as separate literal-prefixed patterns rather than one big
+alternation: `re` can only use its fast literal search when a pattern starts
+with a literal, and an alternation of unrelated rules loses that.
+
+Public names:
+- rule(...)            decorator registering a line rule
+- RULES                the registry, in declaration order
+- LANGUAGES            file extension -> rule language
+- RuleEngine           compiled, cached scanner for one language
+- engine_for(language) shared RuleEngine instance
+- text_blocks(code)    split text into line-aligned blocks for scan_blocks
+- RULESET_VERSION      part of every cached result's key
+"""
+import re
+
+# Bump whenever a rule is added, removed or changes what it reports, here or in
+# analyzer.PythonRuleVisitor, so cached results from older rules are not reused
+RULESET_VERSION = 2
+
+# file extension -> rule language; everything else only gets the generic rules
+LANGUAGES = {
+    'py': 'python',
+    'js': 'javascript',
+    'jsx': 'javascript',
+}
+
+RULES = []
+
+
+class Rule:
+    def __init__(self, language, issue_type, severity, patterns, message, suggestion, check,
+                 uppercase=False):
+        self.language = language
+        self.type = issue_type
+        self.severity = severity
+        # Prefilters, searched in the text with a '\n' before the first line and
+        # after the last one. Every line the check accepts must contain a match
+        # whose last character is in that line or is its terminating newline.
+        self.patterns = patterns
+        # Search the prefilters in the upper-cased text
+        self.uppercase = uppercase
+        # Formatted with the line length, e.g. "Line too long ({length} characters)"
+        self.message = message
+        self.suggestion = suggestion
+        self.check = check
+
+    def issue(self, line, lineno):
+        return {
+            'type': self.type,
+            'severity': self.severity,
+            'line': lineno,
+            'message': self.message.format(length=len(line)),
+            'suggestion': self.suggestion
+        }
+
+
+def rule(language, issue_type, severity, patterns, message, suggestion, uppercase=False):
+    """Register the decorated check(line, stripped) -> bool as a line rule"""
+    def register(check):
+        RULES.append(Rule(language, issue_type, severity, patterns, message, suggestion, check,
+                          uppercase=uppercase))
+        return check
+    return register
+
+
+# ---------------------------------------------------------------- Python rules
+# Everything that can be read off the syntax tree lives in
+# analyzer.PythonRuleVisitor; only rules about comments and raw text stay here.
+
+# ﬁ is the "fi" ligature, which upper() expands to "FI"
+@rule('python', 'TODO/FIXME', 'Low', ('TODO', 'FIXME', 'ﬁXME'),
+      "Unfinished code found",
+      "Complete the implementation", uppercase=True)
+def _py_todo(line, stripped):
+    upper = line.upper()
+    return 'TODO' in upper or 'FIXME' in upper
+
+
+# ------------------------------------------------------------ JavaScript rules
+
+@rule('javascript', 'Debug Code', 'Low', (r'console\.log\(',),
+      "Console.log statement found - possible debug code",
+      "Remove or replace with proper logging")
+def _js_console_log(line, stripped):
+    return 'console.log(' in line and not stripped.startswith('//')
+
+
+@rule('javascript', 'Weak Comparison', 'Medium', ('!=',),
+      "Use strict equality (===) instead of loose equality (==)",
+      "Replace == with === and != with !==")
+def _js_weak_comparison(line, stripped):
+    return '==' in line and '===' not in line and '!=' in line and '!==' not in line
+
+
+_VAR_RE = re.compile(r'\bvar\s+')
+
+
+@rule('javascript', 'Deprecated Syntax', 'Low', (r'var[^\S\n]',),
+      "Using 'var' keyword - consider 'let' or 'const'",
+      "Use 'let' for variables or 'const' for constants")
+def _js_var(line, stripped):
+    return _VAR_RE.search(line) is not None
+
+
+_JUMP_RE = re.compile(r'(return|break|continue)\s*\w')
+
+
+@rule('javascript', 'Missing Semicolon', 'Low', ('return', 'break', 'continue'),
+      "Missing semicolon",
+      "Add semicolon at the end of the statement")
+def _js_missing_semicolon(line, stripped):
+    return (bool(stripped) and not stripped.endswith((';', '{', '}', ')', ']'))
+            and not stripped.startswith('//') and _JUMP_RE.search(line) is not None)
+
+
+# --------------------------------------------------------------- Generic rules
+
+@rule('generic', 'Long Line', 'Low', (r'\n.{121}',),
+      "Line too long ({length} characters)",
+      "Break long lines for better readability")
+def _long_line(line, stripped):
+    return len(line) > 120
+
+
+@rule('generic', 'Trailing Whitespace', 'Low', (' \n', '\t\n'),
+      "Trailing whitespace found",
+      "Remove trailing spaces/tabs")
+def _trailing_whitespace(line, stripped):
+    return line.endswith(' ') or line.endswith('\t')
+
+
+@rule('generic', 'Mixed Indentation', 'Medium', ('\t',),
+      "Mixed tabs and spaces for indentation",
+      "Use consistent indentation (either tabs or spaces)")
+def _mixed_indentation(line, stripped):
+    return '\t' in line and '    ' in line
+
+
+class RuleEngine:
+    """Scans text once for every line rule of one language plus the generic rules"""
+
+    def __init__(self, language):
+        self.language = language
+        self.language_rules = [r for r in RULES if r.language == language and language != 'generic']
+        self.generic_rules = [r for r in RULES if r.language == 'generic']
+        self.rules = self.language_rules + self.generic_rules
+        self.prefilters = []
+        for index, r in enumerate(self.rules):
+            for pattern in r.patterns:
+                regex = re.compile(pattern, re.MULTILINE)
+                # upper() can change the length of non-ASCII text, so those
+                # inputs are matched case-insensitively in place instead
+                fallback = re.compile(pattern, re.MULTILINE | re.IGNORECASE) if r.uppercase else regex
+                self.prefilters.append((1 << index, r.uppercase, regex, fallback))
+
+    def scan(self, code, first_line=1):
+        """
+        Returns (language_issues, generic_issues), each ordered by line and
+        then by rule declaration order. Line numbers start at first_line.
+        """
+        text = '\n' + code + '\n'
+        upper = text.upper() if text.isascii() else None
+        rfind = text.rfind
+
+        # line start offset -> bitmask of the rules whose prefilter hit the line
+        candidates = {}
+        for bit, uppercase, regex, fallback in self.prefilters:
+            if not uppercase:
+                matches = regex.finditer(text)
+            elif upper is not None:
+                matches = regex.finditer(upper)
+            else:
+                matches = fallback.finditer(text)
+            for m in matches:
+                start = rfind('\n', 0, m.end() - 1) + 1
+                candidates[start] = candidates.get(start, 0) | bit
+
+        language_issues = []
+        generic_issues = []
+        n_language = len(self.language_rules)
+        lineno = first_line - 1
+        counted = 0
+        for start in sorted(candidates):
+            mask = candidates[start]
+            lineno += text.count('\n', counted, start)
+            counted = start
+            line = text[start:text.find('\n', start)]
+            stripped = line.strip()
+            for index, r in enumerate(self.rules):
+                if mask >> index & 1 and r.check(line, stripped):
+                    issues = language_issues if index < n_language else generic_issues
+                    issues.append(r.issue(line, lineno))
+
+        return language_issues, generic_issues
+
+    def scan_blocks(self, blocks):
+        """
+        scan() over text that arrives as blocks of whole lines: joined with
+        '\n' the blocks make up the text. Only one block is held at a time.
+        """
+        language_issues = []
+        generic_issues = []
+        first_line = 1
+        for block in blocks:
+            block_language, block_generic = self.scan(block, first_line)
+            language_issues.extend(block_language)
+            generic_issues.extend(block_generic)
+            first_line += block.count('\n') + 1
+        return language_issues, generic_issues
+
+
+# Characters per block handed to RuleEngine.scan; bounds the copies scan makes
+BLOCK_SIZE = 1 << 20
+
+
+def text_blocks(code, block_size=BLOCK_SIZE):
+    """Split code into blocks of whole lines for RuleEngine.scan_blocks"""
+    start = 0
+    end = len(code)
+    while end - start > block_size:
+        cut = code.rfind('\n', start, start + block_size)
+        if cut == -1:
+            cut = code.find('\n', start + block_size)
+            if cut == -1:
+                break
+        yield code[start:cut]
+        start = cut + 1
+    yield code[start:]
+
+
+_engines = {}
+
+
+def engine_for(language):
+    engine = _engines.get(language)
+    if engine is None:
+        engine = _engines[language] = RuleEngine(language)
+    return engine
@@ -0,0 +1,57 @@
+"""
+Content-addressed store for uploaded source code.
+
+Bodies live zlib-compressed in the sources collection under the SHA-256 of
+their UTF-8 bytes, with a reference count, so identical uploads are stored
+once. Analysis documents only keep the hash in code_ref and the body is
+loaded when someone actually asks for it.
+"""
+import hashlib
+import zlib
+
+from bson.binary import Binary
+from pymongo.errors import DuplicateKeyError
+
+
+def source_ref(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def store_source(db, code):
+    """Store code (or add a reference to the existing copy) and return its ref"""
+    data = code.encode('utf-8')
+    ref = source_ref(data)
+    store_source_data(db, ref, len(data), lambda: zlib.compress(data))
+    return ref
+
+
+def store_source_data(db, ref, size, compress):
+    """
+    Like store_source for a body that was hashed elsewhere; compress() returns
+    its zlib-compressed bytes and is only called if the body is new.
+    """
+    if db.sources.update_one({'_id': ref}, {'$inc': {'refs': 1}}).matched_count:
+        return
+    try:
+        db.sources.insert_one({
+            '_id': ref,
+            'data': Binary(compress()),
+            'size': size,
+            'refs': 1
+        })
+    except DuplicateKeyError:
+        # Stored concurrently by another request
+        db.sources.update_one({'_id': ref}, {'$inc': {'refs': 1}})
+
+
+def load_source(db, ref):
+    doc = db.sources.find_one({'_id': ref}, {'data': 1})
+    if doc is None:
+        return None
+    return zlib.decompress(doc['data']).decode('utf-8')
+
+
+def release_source(db, ref):
+    """Drop one reference; the body is deleted with its last reference"""
+    db.sources.update_one({'_id': ref}, {'$inc': {'refs': -1}})
+    db.sources.delete_one({'_id': ref, 'refs': {'$lte': 0}})
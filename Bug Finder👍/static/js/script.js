@@ -222,7 +222,9 @@ function displayResults(analysis) {
                             <span class="issue-type">${escapeHtml(
                               issue.type
                             )}</span>
-                            <span class="issue-line">Line ${issue.line}</span>
+                            <span class="issue-line">Line ${issue.line}${
+                              issue.column ? `:${issue.column}` : ""
+                            }</span>
                             <span class="severity-badge severity-${issue.severity.toLowerCase()}">${
           issue.severity
         }</span>
@@ -281,15 +283,19 @@ async function loadStats() {
   }
 }
 
-// Load analysis history
-async function loadHistory() {
+// Load analysis history; with a cursor, append the next page
+async function loadHistory(cursor = null) {
   const container = document.getElementById("historyContainer");
 
   try {
-    const response = await fetch("/api/analyses");
-    const analyses = await response.json();
-
-    if (analyses.length === 0) {
+    const url = cursor
+      ? `/api/analyses?cursor=${encodeURIComponent(cursor)}`
+      : "/api/analyses";
+    const response = await fetch(url);
+    const page = await response.json();
+    const analyses = page.analyses;
+
+    if (!cursor && analyses.length === 0) {
       container.innerHTML =
         '<div class="loading">No analyses found. Upload some code to get started!</div>';
       return;
@@ -334,7 +340,23 @@ async function loadHistory() {
       )
       .join("");
 
-    container.innerHTML = `<div class="history-grid">${historyHtml}</div>`;
+    if (cursor) {
+      container
+        .querySelector(".history-grid")
+        .insertAdjacentHTML("beforeend", historyHtml);
+      container.querySelector(".load-more")?.remove();
+    } else {
+      container.innerHTML = `<div class="history-grid">${historyHtml}</div>`;
+    }
+
+    if (page.next_cursor) {
+      container.insertAdjacentHTML(
+        "beforeend",
+        `<div class="load-more" style="text-align: center; margin-top: 20px;">
+                    <button class="btn btn-secondary" onclick="loadHistory('${page.next_cursor}')">Load More</button>
+                </div>`
+      );
+    }
   } catch (error) {
     container.innerHTML =
       '<div class="error">Failed to load analysis history.</div>';
@@ -0,0 +1,93 @@
+"""
+Precomputed counters behind /api/stats.
+
+A single document in the stats collection holds the number of analyses and
+the number of issues per severity and per issue type. It is updated with $inc
+whenever analyses are stored or deleted, so reading it is O(1) no matter how
+many issues are stored. rebuild_stats recomputes it from the analyses.
+
+Only a document carrying the current STATS_VERSION, which only rebuild_stats
+writes, is ever incremented. On a database that predates the counters (or
+an older layout of them), the first write rebuilds them instead, so they
+never start from zero. init-db rebuilds them ahead of that.
+"""
+from collections import Counter
+
+STATS_ID = 'analyses'
+STATS_VERSION = 1
+TOP_ISSUE_TYPES = 10
+
+
+def _increments(issue_lists, sign):
+    inc = Counter()
+    for issues in issue_lists:
+        inc['total_analyses'] += sign
+        for issue in issues:
+            inc['severity.' + issue['severity']] += sign
+            inc['types.' + issue['type']] += sign
+    return inc
+
+
+def _apply(db, inc):
+    if not inc:
+        return
+    updated = db.stats.update_one({'_id': STATS_ID, 'version': STATS_VERSION}, {'$inc': dict(inc)})
+    if updated.matched_count == 0:
+        # Not seeded yet: the rebuild already sees this write, which has
+        # been made to the analyses before it is counted
+        rebuild_stats(db)
+
+
+def record_analyses(db, documents):
+    """Count analyses once they are inserted"""
+    _apply(db, _increments((d['issues'] for d in documents), 1))
+
+
+def forget_analysis(db, document):
+    """Uncount an analysis once it is deleted; document needs issues.severity and issues.type"""
+    _apply(db, _increments([document.get('issues', [])], -1))
+
+
+def ensure_stats(db):
+    """Rebuild the counters unless they are current; True when rebuilt"""
+    if db.stats.find_one({'_id': STATS_ID, 'version': STATS_VERSION}, {'_id': 1}) is None:
+        rebuild_stats(db)
+        return True
+    return False
+
+
+def rebuild_stats(db):
+    """Recompute every counter from the stored analyses"""
+    severity = {doc['_id']: doc['count'] for doc in db.analyses.aggregate([
+        {'$unwind': '$issues'},
+        {'$group': {'_id': '$issues.severity', 'count': {'$sum': 1}}}
+    ])}
+    types = {doc['_id']: doc['count'] for doc in db.analyses.aggregate([
+        {'$unwind': '$issues'},
+        {'$group': {'_id': '$issues.type', 'count': {'$sum': 1}}}
+    ])}
+    doc = {
+        '_id': STATS_ID,
+        'version': STATS_VERSION,
+        'total_analyses': db.analyses.count_documents({}),
+        'severity': severity,
+        'types': types
+    }
+    db.stats.replace_one({'_id': STATS_ID}, doc, upsert=True)
+    return doc
+
+
+def read_stats(db):
+    doc = db.stats.find_one({'_id': STATS_ID})
+    if doc is None or doc.get('version') != STATS_VERSION:
+        # First call on a database that predates the counters
+        doc = rebuild_stats(db)
+
+    severity_dist = [{'_id': k, 'count': v} for k, v in doc.get('severity', {}).items() if v > 0]
+    issue_types = sorted(({'_id': k, 'count': v} for k, v in doc.get('types', {}).items() if v > 0),
+                         key=lambda item: item['count'], reverse=True)[:TOP_ISSUE_TYPES]
+    return {
+        'total_analyses': doc.get('total_analyses', 0),
+        'severity_distribution': severity_dist,
+        'top_issue_types': issue_types
+    }
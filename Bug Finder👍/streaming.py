@@ -0,0 +1,79 @@
+"""
+Streaming reader for uploaded files.
+
+SourceUpload makes one pass over the upload that hashes it (cache key and
+source ref) and checks it is UTF-8 text, without keeping the decoded text.
+Analysis and storage then re-read the stream: blocks() decodes it
+incrementally into line-aligned blocks for the line rules, compressed()
+deflates it chunk by chunk. Only text(), needed for the Python AST rules,
+ever holds the whole source as a str.
+
+Werkzeug spools large uploads to a temporary file, so the stream can be
+rewound; peak memory per request stays around one block for everything but
+Python.
+"""
+import codecs
+import hashlib
+import zlib
+
+from cache import content_hasher
+from rules import BLOCK_SIZE
+
+# Bytes read from the upload at a time
+CHUNK_SIZE = 256 * 1024
+
+
+class SourceUpload:
+    def __init__(self, stream, file_extension, chunk_size=CHUNK_SIZE):
+        """Reads the stream once; raises UnicodeDecodeError for non UTF-8 input"""
+        self.stream = stream
+        self.chunk_size = chunk_size
+        key_hash = content_hasher(file_extension)
+        ref_hash = hashlib.sha256()
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        self.size = 0     # bytes
+        self.length = 0   # characters
+        self.blank = True
+        for chunk in self._chunks():
+            key_hash.update(chunk)
+            ref_hash.update(chunk)
+            self.size += len(chunk)
+            text = decoder.decode(chunk)
+            self.length += len(text)
+            if self.blank and text.strip():
+                self.blank = False
+        decoder.decode(b'', final=True)
+        self.content_key = key_hash.hexdigest()
+        self.source_ref = ref_hash.hexdigest()
+
+    def _chunks(self):
+        self.stream.seek(0)
+        while True:
+            chunk = self.stream.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def blocks(self, block_size=BLOCK_SIZE):
+        """Decoded text in blocks of whole lines, as RuleEngine.scan_blocks expects"""
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        pending = ''
+        for chunk in self._chunks():
+            pending += decoder.decode(chunk)
+            if len(pending) < block_size:
+                continue
+            cut = pending.rfind('\n')
+            if cut != -1:
+                yield pending[:cut]
+                pending = pending[cut + 1:]
+        yield pending + decoder.decode(b'', final=True)
+
+    def text(self):
+        self.stream.seek(0)
+        return self.stream.read().decode('utf-8')
+
+    def compressed(self):
+        compressor = zlib.compressobj()
+        parts = [compressor.compress(chunk) for chunk in self._chunks()]
+        parts.append(compressor.flush())
+        return b''.join(parts)
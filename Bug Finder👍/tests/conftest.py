@@ -0,0 +1,22 @@
+# Shared fixtures: the Flask app on a mongomock database (requires pytest, mongomock)
+from types import SimpleNamespace
+
+import mongomock
+import pytest
+
+import app as app_module
+from cache import AnalysisCache
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock.MongoClient().bugfinder
+    monkeypatch.setattr(app_module, 'mongo', SimpleNamespace(db=database))
+    monkeypatch.setattr(app_module, 'analysis_cache', AnalysisCache(database.analyses))
+    return database
+
+
+@pytest.fixture
+def client(db):
+    app_module.app.config['TESTING'] = True
+    return app_module.app.test_client()
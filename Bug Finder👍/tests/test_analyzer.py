@@ -0,0 +1,67 @@
+# Unit tests for the AST rules of the Python analyzer (requires pytest)
+from analyzer import CodeAnalyzer, hint_lines
+
+
+def findings(code):
+    return [(issue['type'], issue['line'], issue['column']) for issue in CodeAnalyzer().analyze_python(code)]
+
+
+def test_print_call():
+    assert findings("x = 1\nif x:\n    print(x)\n") == [('Debug Code', 3, 5)]
+
+
+def test_bare_except():
+    code = "try:\n    pass\nexcept:\n    pass\ntry:\n    pass\nexcept ValueError:\n    pass\n"
+    assert findings(code) == [('Broad Exception', 3, 1)]
+
+
+def test_none_assignment():
+    assert findings("a = None\nb: int = None\nc = 0\n") == [('None Assignment', 1, 1), ('None Assignment', 2, 1)]
+
+
+def test_none_comparison():
+    code = "if a == None:\n    pass\nif b != None:\n    pass\nif c is None:\n    pass\n"
+    assert findings(code) == [('None Comparison', 1, 4), ('None Comparison', 3, 4)]
+
+
+def test_mutable_defaults():
+    code = ("def f(a=[], b={}, c=0):\n    pass\n"
+            "def g(*, d={1}, e=[x for x in 'ab']):\n    pass\n"
+            "h = lambda k={}: k\n")
+    assert findings(code) == [('Mutable Default Argument', 1, 9), ('Mutable Default Argument', 1, 15),
+                              ('Mutable Default Argument', 3, 12), ('Mutable Default Argument', 3, 19),
+                              ('Mutable Default Argument', 5, 14)]
+
+
+def test_parenthesized_mutable_default():
+    assert findings("def f(a=([])):\n    pass\n") == [('Mutable Default Argument', 1, 10)]
+    assert findings("def f(a=( {} )):\n    pass\n") == [('Mutable Default Argument', 1, 11)]
+
+
+def test_default_on_a_continuation_line():
+    code = "def f(a,\n      b=\n      []):\n    pass\n"
+    assert findings(code) == [('Mutable Default Argument', 3, 7)]
+
+
+def test_strings_and_comments_do_not_match():
+    code = "s = 'print(x) except: == None'\n# print(x)\nt = \"def f(a=[]): pass\"\n"
+    assert findings(code) == []
+
+
+def test_column_counts_characters():
+    assert findings("s = 'é'; print(s)\n") == [('Debug Code', 1, 10)]
+
+
+def test_hint_lines():
+    assert hint_lines("a = 1\nprint(a)\nb = 2\nc=([])\n") == [2, 4]
+
+
+def test_deep_nesting_gives_no_ast_findings():
+    # parses, but is deeper than a recursive walk can follow
+    assert findings("x = " + "-" * 1000 + "None == None\n") == []
+    # too deep for the parser itself
+    assert findings("x = " + "-" * 50000 + "1\n") == []
+
+
+def test_syntax_error():
+    assert CodeAnalyzer().analyze_python("def f(:\n")[0]['type'] == 'Syntax Error'
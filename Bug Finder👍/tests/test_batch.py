@@ -0,0 +1,67 @@
+# Unit tests for /api/analyze/batch (requires pytest, mongomock)
+import io
+import json
+import os
+import zipfile
+
+import pytest
+
+import app as app_module
+from analyzer import analyze_file
+
+
+@pytest.fixture(autouse=True)
+def small_pool(monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'BATCH_WORKERS', 2)
+    yield
+    if app_module._batch_pool is not None:
+        app_module._batch_pool.shutdown()
+        app_module._batch_pool = None
+
+
+def lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def zip_of(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, code in files.items():
+            archive.writestr(name, code)
+    buffer.seek(0)
+    return buffer
+
+
+def test_archive_is_streamed_and_stored(client, db):
+    files = {f'f{i}.py': f'x{i} = None\n' for i in range(9)}
+    response = client.post('/api/analyze/batch', data={'archive': (zip_of(files), 'batch.zip')})
+    results = lines(response)
+    assert sorted(r['filename'] for r in results[:-1]) == sorted(files)
+    assert results[-1] == {'done': True, 'files': 9, 'analyzed': 9, 'inserted_ids': results[-1]['inserted_ids']}
+    assert db.analyses.count_documents({}) == 9
+
+
+def test_invalid_archive_is_rejected(client):
+    response = client.post('/api/analyze/batch', data={'archive': (io.BytesIO(b'not a zip'), 'batch.zip')})
+    assert response.status_code == 400
+
+
+def test_limit_reached_partway(client, db, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'BATCH_MAX_FILES', 3)
+    files = [{'filename': f'f{i}.py', 'code': f'y{i} = None\n'} for i in range(5)]
+    results = lines(client.post('/api/analyze/batch', json={'files': files}))
+    assert {'error': 'Batch contains more than 3 files'} in results
+    assert results[-1]['analyzed'] == 3
+
+
+def crash(filename, code):
+    os._exit(1)
+
+
+def test_error_lines_name_the_file_and_the_pool_recovers(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'analyze_file', crash)
+    results = lines(client.post('/api/analyze/batch', json={'files': [{'filename': 'a.py', 'code': 'a = 1\n'}]}))
+    assert results[0]['filename'] == 'a.py' and 'error' in results[0]
+    monkeypatch.setattr(app_module, 'analyze_file', analyze_file)
+    results = lines(client.post('/api/analyze/batch', json={'files': [{'filename': 'b.py', 'code': 'b = 1\n'}]}))
+    assert results[0]['filename'] == 'b.py' and 'issues' in results[0]
@@ -0,0 +1,53 @@
+# Unit tests for the /api/analyze result cache (requires pytest, mongomock)
+import app as app_module
+import cache
+from cache import AnalysisCache, content_key
+
+CODE = "def f(a=[]):\n    print(a)\n"
+
+
+def analyze(client, code=CODE):
+    return client.post('/api/analyze', json={'code': code, 'filename': 'f.py'})
+
+
+def test_repeat_submission_is_cached(client, db):
+    first = analyze(client)
+    assert first.status_code == 201 and first.json['cached'] is False
+    second = analyze(client)
+    assert second.status_code == 200 and second.json['cached'] is True
+    assert second.json['_id'] == first.json['_id']
+    assert second.json['issues'] == first.json['issues']
+    assert db.analyses.count_documents({}) == 1
+    assert client.get('/api/cache/stats').json['memory_hits'] == 1
+
+
+def test_stored_analysis_serves_a_fresh_process(client, db):
+    first = analyze(client)
+    # a new process: empty LRU, same database
+    app_module.analysis_cache = AnalysisCache(db.analyses)
+    second = analyze(client)
+    assert second.json['cached'] is True and second.json['_id'] == first.json['_id']
+    assert client.get('/api/cache/stats').json['store_hits'] == 1
+
+
+def test_ruleset_version_bump_invalidates(client, db, monkeypatch):
+    first = analyze(client)
+    monkeypatch.setattr(cache, 'RULESET_VERSION', cache.RULESET_VERSION + 1)
+    second = analyze(client)
+    assert second.status_code == 201 and second.json['cached'] is False
+    assert second.json['_id'] != first.json['_id']
+    assert db.analyses.count_documents({}) == 2
+
+
+def test_key_depends_on_extension_and_version(monkeypatch):
+    key = content_key(CODE, 'py')
+    assert content_key(CODE, 'js') != key
+    monkeypatch.setattr(cache, 'RULESET_VERSION', cache.RULESET_VERSION + 1)
+    assert content_key(CODE, 'py') != key
+
+
+def test_deleted_analysis_is_forgotten(client, db):
+    first = analyze(client)
+    assert client.delete(f"/api/analyses/{first.json['_id']}").status_code == 200
+    again = analyze(client)
+    assert again.json['cached'] is False
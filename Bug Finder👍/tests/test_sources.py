@@ -0,0 +1,37 @@
+# Unit tests for the source store's reference counts (requires pytest, mongomock)
+import pytest
+
+import app as app_module
+from sources import load_source, release_source, store_source
+
+
+def test_identical_sources_are_stored_once(db):
+    ref = store_source(db, 'x = 1\n')
+    assert store_source(db, 'x = 1\n') == ref
+    assert db.sources.find_one({'_id': ref})['refs'] == 2
+    release_source(db, ref)
+    assert load_source(db, ref) == 'x = 1\n'
+    release_source(db, ref)
+    assert db.sources.count_documents({}) == 0
+
+
+def test_failed_insert_releases_the_source(client, db, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError('insert failed')
+    monkeypatch.setattr(db.analyses, 'insert_one', fail)
+    response = client.post('/api/analyze', json={'code': 'x = 1\n', 'filename': 'a.py'})
+    assert response.status_code == 500
+    assert db.sources.count_documents({}) == 0
+
+
+def test_failed_batch_insert_releases_the_sources(client, db, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'BATCH_WORKERS', 1)
+    def fail(*args, **kwargs):
+        raise RuntimeError('insert failed')
+    monkeypatch.setattr(db.analyses, 'insert_many', fail)
+    files = [{'filename': 'a.py', 'code': 'a = 1\n'}, {'filename': 'b.py', 'code': 'b = 1\n'}]
+    with pytest.raises(RuntimeError):
+        client.post('/api/analyze/batch', json={'files': files}).get_data()
+    assert db.sources.count_documents({}) == 0
+    app_module._batch_pool.shutdown()
+    app_module._batch_pool = None
@@ -0,0 +1,40 @@
+# Unit tests for the /api/stats counters (requires pytest, mongomock)
+from stats import STATS_ID, ensure_stats, read_stats, record_analyses
+
+
+def existing_analyses(db, n):
+    db.analyses.insert_many([{'issues': [{'severity': 'Low', 'type': 'Debug Code'}]} for _ in range(n)])
+
+
+def test_first_insert_after_deploy_counts_existing_analyses(client, db):
+    existing_analyses(db, 100)
+    assert client.post('/api/analyze', json={'code': 'x = None\n', 'filename': 'a.py'}).status_code == 201
+    stats = client.get('/api/stats').json
+    assert stats['total_analyses'] == 101
+    assert {'_id': 'Low', 'count': 101} in stats['severity_distribution']
+
+
+def test_first_delete_after_deploy_counts_existing_analyses(client, db):
+    existing_analyses(db, 10)
+    analysis_id = str(db.analyses.find_one()['_id'])
+    assert client.delete(f'/api/analyses/{analysis_id}').status_code == 200
+    assert client.get('/api/stats').json['total_analyses'] == 9
+
+
+def test_partial_counter_document_is_rebuilt(db):
+    existing_analyses(db, 5)
+    # what the unversioned code upserted on its first write
+    db.stats.insert_one({'_id': STATS_ID, 'total_analyses': 1})
+    assert read_stats(db)['total_analyses'] == 5
+
+
+def test_counters_follow_writes_once_seeded(db):
+    existing_analyses(db, 3)
+    assert ensure_stats(db) is True
+    assert ensure_stats(db) is False
+    documents = [{'issues': [{'severity': 'High', 'type': 'Security'}]}]
+    db.analyses.insert_many(documents)
+    record_analyses(db, documents)
+    stats = read_stats(db)
+    assert stats['total_analyses'] == 4
+    assert {'_id': 'High', 'count': 1} in stats['severity_distribution']
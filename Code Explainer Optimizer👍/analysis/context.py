@@ -0,0 +1,97 @@
+import ast
+import hashlib
+from collections import OrderedDict
+from functools import cached_property
+from threading import Lock
+
+from black import FileMode, format_str
+from radon.complexity import cc_visit_ast
+
+from analysis.performance import analyze_performance
+
+
+def format_code(code: str) -> str:
+    try:
+        return format_str(code, mode=FileMode())
+    except Exception:
+        return code
+
+
+class AnalysisContext:
+    """
+    One submitted source, shared by the explainer, the complexity and
+    performance passes and the optimizer: each of these is worked out on first use and only once.
+    tree is the parse of the code as submitted, formatted_tree the parse of
+    its Black formatting, which the optimizer transforms in place.
+    """
+
+    def __init__(self, code: str, language='python'):
+        self.code = code
+        self.language = language
+
+    @cached_property
+    def formatted(self):
+        return format_code(self.code)
+
+    @cached_property
+    def tree(self):
+        # raises SyntaxError, every time it is asked for
+        return ast.parse(self.code)
+
+    @cached_property
+    def formatted_tree(self):
+        # a tree of its own even when formatting changed nothing, as the
+        # optimizer rewrites it while tree stays what the explainer reads
+        return ast.parse(self.formatted)
+
+    @cached_property
+    def complexity(self):
+        """radon cyclomatic complexity blocks of tree"""
+        return cc_visit_ast(self.tree)
+
+    @cached_property
+    def performance(self):
+        """Performance hotspots and Big-O estimates of tree's functions"""
+        return analyze_performance(self.tree)
+
+
+def content_key(action, code, language='python'):
+    """Key of one action's result for a source, a hash of its content"""
+    h = hashlib.sha256(f'{action}:{language}:'.encode('utf-8'))
+    h.update(code.encode('utf-8', errors='surrogatepass'))
+    return h.hexdigest()
+
+
+class ResultCache:
+    """In-process LRU of explain/optimize results by content_key"""
+
+    def __init__(self, capacity=512):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "capacity": self.capacity,
+                    "hits": self.hits, "misses": self.misses}
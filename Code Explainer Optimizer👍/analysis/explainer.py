@@ -1,19 +1,24 @@
 import ast
-from radon.visitors import ComplexityVisitor
-from radon.complexity import cc_visit
 from pygments import highlight
 from pygments.lexers import PythonLexer
 from pygments.formatters import HtmlFormatter
+from analysis.context import AnalysisContext
 
-def explain_code(code: str, language='python'):
+# Built once; highlighting keeps no state in them between calls
+LEXER = PythonLexer()
+HTML_FORMATTER = HtmlFormatter(nowrap=True)
+
+def explain_code(code: str, language='python', context=None):
+    """context: the AnalysisContext of code, when the caller has one"""
     if not code.strip():
         return "No code provided."
     if language != 'python':
         return "Only Python supported in this version."
+    context = context or AnalysisContext(code, language)
 
-    # 1) Syntax parse check
+    # 1) Syntax parse check (the one parse, shared with the complexity pass)
     try:
-        tree = ast.parse(code)
+        tree = context.tree
     except SyntaxError as e:
         return f"SyntaxError: {e}"
 
@@ -33,20 +38,27 @@ def explain_code(code: str, language='python'):
 
     # 3) Complexity analysis (radon)
     try:
-        cc = cc_visit(code)
+        cc = context.complexity
         complexity_summary = [{"name": c.name, "complexity": c.complexity, "lineno": c.lineno} for c in cc]
     except Exception:
         complexity_summary = []
     explanation['complexity'] = complexity_summary
 
-    # 4) Pretty source (html) - optional
+    # 4) Performance hotspots and Big-O estimates (same tree)
+    try:
+        performance = context.performance
+    except Exception:
+        performance = {"functions": [], "hotspots": []}
+    explanation['performance'] = performance
+
+    # 5) Pretty source (html) - optional
     try:
-        highlighted = highlight(code, PythonLexer(), HtmlFormatter(nowrap=True))
+        highlighted = highlight(code, LEXER, HTML_FORMATTER)
     except Exception:
         highlighted = None
     explanation['highlighted'] = highlighted
 
-    # 5) Human readable summary
+    # 6) Human readable summary
     summary_lines = []
     summary_lines.append(f"Detected {len(funcs)} function(s).")
     high_cc = [c for c in complexity_summary if c['complexity'] >= 10]
@@ -54,5 +66,13 @@ def explain_code(code: str, language='python'):
         summary_lines.append(f"{len(high_cc)} function(s) have high cyclomatic complexity (>=10). Consider refactoring.")
     else:
         summary_lines.append("No functions with dangerously high cyclomatic complexity detected.")
+    hotspots = performance['hotspots']
+    if hotspots:
+        kinds = sorted({h['kind'].replace('_', ' ') for h in hotspots})
+        summary_lines.append(f"{len(hotspots)} performance hotspot(s) found: {', '.join(kinds)}.")
+    superlinear = [f"{f['name']} {f['big_o']}" for f in performance['functions']
+                   if f['big_o'] not in ('O(1)', 'O(log n)', 'O(n)')]
+    if superlinear:
+        summary_lines.append(f"Superlinear in their input: {', '.join(superlinear)}.")
     explanation['summary'] = "\n".join(summary_lines)
     return explanation
\ No newline at end of file
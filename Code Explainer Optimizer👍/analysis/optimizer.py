@@ -1,16 +1,137 @@
-import io
+"""
+Performance rewrites of Python source, run by a pass manager.
+
+Every pass is an OptimizationPass: an ast.NodeTransformer that may also
+rewrite whole statement lists (rewrite_block) and records each change it
+makes. PassManager runs its passes over the module to a fixpoint. The unit
+of work is a statement of the module or of a class body (a function, a
+method, a loop at module level): after the first round only the units a
+pass changed are visited again, and in the output only those units are
+regenerated and spliced into the Black-formatted source, so the rest of the
+file, comments included, comes through untouched. Regenerating a unit would
+drop its comments, so units with comments in them are left as they are.
+
+    result = optimize(code)
+    result.source, result.changes
+"""
+import abc
 import ast
-import astor  # optional for AST to source (you can pip install astor)
-from black import FileMode, format_str
+import builtins
+import io
+import sys
+import tokenize
+from collections import Counter, namedtuple
+
+from analysis.context import AnalysisContext, format_code
+
+Change = namedtuple("Change", "pass_name lineno message")
+
+OptimizationResult = namedtuple("OptimizationResult", "source changes rounds")
+
+# Calls that certainly build a list, dict or set, unless the module rebinds the name
+CONTAINER_FACTORIES = {"list", "dict", "set", "bytearray"}
+
+SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)
+
+# Statements after which the rest of a loop body may not run
+EXITS = (ast.Break, ast.Continue, ast.Return, ast.Raise)
+# try and, from Python 3.11, try/except*
+TRIES = (ast.Try, getattr(ast, "TryStar", ast.Try))
+
+
+def _names(node, ctx=ast.Load):
+    """Names read (or, with ctx=ast.Store, bound) anywhere under node"""
+    return {n.id for n in ast.walk(node) if isinstance(n, ast.Name) and isinstance(n.ctx, ctx)}
+
 
-def format_code(code: str) -> str:
+def comment_lines(source):
+    """Line numbers of source that hold a comment"""
     try:
-        return format_str(code, mode=FileMode())
-    except Exception:
-        return code
+        return frozenset(token.start[0] for token in tokenize.generate_tokens(io.StringIO(source).readline)
+                         if token.type == tokenize.COMMENT)
+    except (tokenize.TokenError, SyntaxError):
+        return frozenset()
+
+
+def _first_line(unit):
+    return min([unit.lineno] + [d.lineno for d in getattr(unit, "decorator_list", [])])
+
+
+def _span(first, last, node):
+    """node, given the source lines of the statements first to last it replaces"""
+    ast.copy_location(node, first)
+    node.end_lineno, node.end_col_offset = last.end_lineno, last.end_col_offset
+    return ast.fix_missing_locations(node)
+
+
+class OptimizationPass(ast.NodeTransformer):
+    """
+    A rewrite of a unit. Expression rewrites are visit_* methods as for any
+    NodeTransformer; statement rewrites go in rewrite_block, which is given
+    every statement list under the unit once its statements have been
+    visited. scope is the function (or module) the current block belongs to.
+    A unit without any node of the types in triggers is not run at all.
+    comment_lines are the lines of the source that hold comments, which a
+    rewrite spanning them would lose.
+    """
+    name = ""
+    triggers = (ast.AST,)
+    comment_lines = frozenset()
+
+    def __init__(self):
+        self.changes = []
+        self.scope = None
+
+    def prepare(self, tree):
+        """Called with the module once, before any unit of it is run"""
+
+    def record(self, node, message):
+        self.changes.append(Change(self.name, getattr(node, "lineno", None), message))
+
+    def run(self, unit, scope):
+        """Rewrite unit in place; unit itself is kept, its contents may not be"""
+        self.scope = scope
+        self.visit(unit)
+
+    def run_block(self, statements, scope):
+        """The statement list of a module or class body, rewritten without entering its statements"""
+        self.scope = scope
+        return self.rewrite_block(statements)
+
+    def rewrite_block(self, statements):
+        return statements
+
+    def generic_visit(self, node):
+        super().generic_visit(node)
+        for field in ("body", "orelse", "finalbody"):
+            block = getattr(node, field, None)
+            if isinstance(block, list) and block and isinstance(block[0], ast.stmt):
+                setattr(node, field, self.rewrite_block(block))
+        return node
+
+    def visit_FunctionDef(self, node):
+        outer, self.scope = self.scope, node
+        try:
+            return self.generic_visit(node)
+        finally:
+            self.scope = outer
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node):
+        # a class nested in a function; its body sees neither scope
+        outer, self.scope = self.scope, node
+        try:
+            return self.generic_visit(node)
+        finally:
+            self.scope = outer
+
+
+class SimplifyIfTrue(OptimizationPass):
+    """x == True -> x"""
+    name = "simplify_if_true"
+    triggers = (ast.Compare,)
 
-class SimplifyIfTrue(ast.NodeTransformer):
-    # Example transform: if x == True -> if x
     def visit_Compare(self, node):
         self.generic_visit(node)
         # only handle simple cases: Name == True
@@ -18,26 +139,550 @@ class SimplifyIfTrue(ast.NodeTransformer):
             len(node.ops) == 1 and isinstance(node.ops[0], ast.Eq) and
             len(node.comparators) == 1 and isinstance(node.comparators[0], ast.Constant) and
             node.comparators[0].value is True):
-            return ast.Name(id=node.left.id, ctx=ast.Load())
+            self.record(node, f"{node.left.id} == True -> {node.left.id}")
+            return ast.copy_location(ast.Name(id=node.left.id, ctx=ast.Load()), node)
+        return node
+
+
+class MembershipToSet(OptimizationPass):
+    """
+    x in [1, 2, 3] -> x in {1, 2, 3}: a hash lookup instead of a scan. Only
+    literals of constants, which are all hashable; an unhashable x would now
+    raise TypeError instead of being compared element by element.
+    """
+    name = "membership_to_set"
+    triggers = (ast.Compare,)
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        for i, (op, right) in enumerate(zip(node.ops, node.comparators)):
+            if (isinstance(op, (ast.In, ast.NotIn)) and isinstance(right, (ast.List, ast.Tuple)) and
+                    len(right.elts) > 1 and all(isinstance(e, ast.Constant) for e in right.elts)):
+                node.comparators[i] = ast.copy_location(ast.Set(elts=right.elts), right)
+                self.record(node, f"membership test against a {len(right.elts)}-element "
+                                  f"{type(right).__name__.lower()} literal now uses a set")
         return node
 
-def optimize_code(code: str, language='python') -> str:
+
+class _LoopToExpression(OptimizationPass, metaclass=abc.ABCMeta):
+    """
+    Shared matching for passes that fold
+
+        name = <start>
+        for target in iterable:
+            [if condition:]
+                <accumulate item into name>
+
+    into one assignment. The loop must have no else, its one statement must
+    only touch name to accumulate, and the loop variables must not be read
+    anywhere else in the scope, since a comprehension does not leak them.
+    Nor may the loop be where an exception it raises can be caught, or seen
+    by a finally that reads name: the loop leaves name partly built, the
+    assignment leaves it as it was before.
+    """
+    triggers = (ast.For,)
+
+    @abc.abstractmethod
+    def start(self, value):
+        """Whether value is a start this pass folds from"""
+
+    @abc.abstractmethod
+    def item(self, statement, name):
+        """The item statement accumulates into name, or None"""
+
+    @abc.abstractmethod
+    def fold(self, name, start, generator):
+        """The expression name ends up holding, given the loop as a generator expression"""
+
+    @abc.abstractmethod
+    def message(self, name):
+        """The change recorded for a fold into name"""
+
+    def rewrite_block(self, statements):
+        if isinstance(self.scope, ast.ClassDef):
+            # a comprehension in a class body cannot see the class's names
+            return statements
+        result = []
+        i = 0
+        while i < len(statements):
+            folded = None
+            if i + 1 < len(statements):
+                folded = self._fold(statements[i], statements[i + 1])
+            if folded is None:
+                result.append(statements[i])
+                i += 1
+            else:
+                result.append(folded)
+                i += 2
+        return result
+
+    def _fold(self, first, loop):
+        if not (isinstance(first, ast.Assign) and len(first.targets) == 1 and
+                isinstance(first.targets[0], ast.Name) and self.start(first.value) and
+                isinstance(loop, ast.For) and not loop.orelse and len(loop.body) == 1):
+            return None
+        name = first.targets[0].id
+        statement, condition = loop.body[0], None
+        if isinstance(statement, ast.If) and not statement.orelse and len(statement.body) == 1:
+            statement, condition = statement.body[0], statement.test
+        element = self.item(statement, name)
+        if element is None:
+            return None
+        parts = [loop.target, loop.iter, element] + ([condition] if condition is not None else [])
+        if any(name in _names(part) | _names(part, ast.Store) for part in parts):
+            return None
+        if any(isinstance(n, (ast.Yield, ast.YieldFrom, ast.Await, ast.NamedExpr))
+               for part in parts for n in ast.walk(part)):
+            return None
+        targets = _names(loop.target, ast.Store)
+        if self._read_elsewhere(targets, loop):
+            return None
+        # a global or nonlocal target outlives the loop outside this scope
+        if any(isinstance(n, (ast.Global, ast.Nonlocal)) and targets & set(n.names) for n in ast.walk(self.scope)):
+            return None
+        if self._guarded(name):
+            return None
+        if any(first.lineno <= line <= loop.end_lineno for line in self.comment_lines):
+            return None
+        comprehension = ast.comprehension(target=loop.target, iter=loop.iter,
+                                          ifs=[condition] if condition is not None else [], is_async=0)
+        value = self.fold(name, first.value, ast.GeneratorExp(elt=element, generators=[comprehension]))
+        self.record(first, self.message(name))
+        return _span(first, loop, ast.Assign(targets=[ast.Name(id=name, ctx=ast.Store())], value=value))
+
+    def run(self, unit, scope):
+        self._scope_reads = {}
+        self._guards = []
+        super().run(unit, scope)
+
+    def run_block(self, statements, scope):
+        self._scope_reads = {}
+        self._guards = []
+        return super().run_block(statements, scope)
+
+    def visit_Try(self, node):
+        self._guards.append(node)
+        try:
+            return self.generic_visit(node)
+        finally:
+            self._guards.pop()
+
+    visit_TryStar = visit_With = visit_AsyncWith = visit_Try
+
+    def visit_FunctionDef(self, node):
+        # a function defined in a try raises into its caller, not the try
+        guards, self._guards = self._guards, []
+        try:
+            return super().visit_FunctionDef(node)
+        finally:
+            self._guards = guards
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def _guarded(self, name):
+        """Whether an exception from the current block could leave name partly built where it is read"""
+        for node in self._guards:
+            # a handler, or a context manager suppressing the exception, lets
+            # the code after it run on; a finally runs either way
+            if isinstance(node, (ast.With, ast.AsyncWith)) or node.handlers:
+                return True
+            if any(name in _names(statement) for statement in node.finalbody):
+                return True
+        return False
+
+    def _read_elsewhere(self, names, loop):
+        # folding moves reads into the comprehension, so the counts stay right for the whole run
+        if self.scope not in self._scope_reads:
+            self._scope_reads[self.scope] = Counter(n.id for n in ast.walk(self.scope) if isinstance(n, ast.Name)
+                                                    and isinstance(n.ctx, ast.Load))
+        reads = Counter({name: self._scope_reads[self.scope][name] for name in names})
+        reads.subtract(n.id for n in ast.walk(loop) if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Load)
+                       and n.id in names)
+        return any(count > 0 for count in reads.values())
+
+
+class LoopToComprehension(_LoopToExpression):
+    """result = []; for x in xs: result.append(f(x)) -> result = [f(x) for x in xs]"""
+    name = "loop_to_comprehension"
+
+    def start(self, value):
+        return isinstance(value, ast.List) and not value.elts
+
+    def item(self, statement, name):
+        if (isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Call) and
+                isinstance(statement.value.func, ast.Attribute) and statement.value.func.attr == "append" and
+                isinstance(statement.value.func.value, ast.Name) and statement.value.func.value.id == name and
+                len(statement.value.args) == 1 and not statement.value.keywords and
+                not isinstance(statement.value.args[0], ast.Starred)):
+            return statement.value.args[0]
+        return None
+
+    def fold(self, name, start, generator):
+        return ast.ListComp(elt=generator.elt, generators=generator.generators)
+
+    def message(self, name):
+        return f"list built with {name}.append in a loop is now a list comprehension"
+
+
+class ConcatToJoin(_LoopToExpression):
+    """s = ""; for x in xs: s += f(x) -> s = "".join([f(x) for x in xs]), linear instead of quadratic"""
+    name = "concat_to_join"
+
+    def start(self, value):
+        return isinstance(value, ast.Constant) and isinstance(value.value, str)
+
+    def item(self, statement, name):
+        if (isinstance(statement, ast.AugAssign) and isinstance(statement.op, ast.Add) and
+                isinstance(statement.target, ast.Name) and statement.target.id == name):
+            return statement.value
+        return None
+
+    def fold(self, name, start, generator):
+        joined = ast.Call(func=ast.Attribute(value=ast.Constant(value=""), attr="join", ctx=ast.Load()),
+                          args=[ast.ListComp(elt=generator.elt, generators=generator.generators)], keywords=[])
+        if not start.value:
+            return joined
+        return ast.BinOp(left=start, op=ast.Add(), right=joined)
+
+    def message(self, name):
+        return f"string {name} built with += in a loop is now built with str.join"
+
+
+class HoistAttributeLookups(OptimizationPass):
+    """
+    Inside a function, name.method(...) called in a loop -> a local bound
+    before the loop, for names that are modules imported by the file or local
+    lists, dicts and sets: their methods cannot change while the loop runs.
+    The lookup is hoisted above the outermost loop it is invariant in.
+    Only calls every iteration makes are hoisted, and only attributes the
+    module or container certainly has: the lookup now happens even when the
+    loop runs no iteration.
+    """
+    name = "hoist_attribute_lookups"
+    triggers = (ast.For, ast.While)
+
+    def prepare(self, tree):
+        self.module_imports, self.module_bindings = _module_names(tree)
+        # the module each import binds
+        self.module_paths = {a.asname or a.name.split(".")[0]: a.name if a.asname else a.name.split(".")[0]
+                             for statement in tree.body if isinstance(statement, ast.Import)
+                             for a in statement.names}
+
+    def run_block(self, statements, scope):
+        # module-level loops read globals whatever is hoisted
+        return statements
+
+    def generic_visit(self, node):
+        # statements first, so the outermost loop hoists what is under it
+        for field in ("body", "orelse", "finalbody"):
+            block = getattr(node, field, None)
+            if isinstance(block, list) and block and isinstance(block[0], ast.stmt):
+                setattr(node, field, self.rewrite_block(block))
+        return ast.NodeTransformer.generic_visit(self, node)
+
+    def rewrite_block(self, statements):
+        if not isinstance(self.scope, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            return statements
+        result = []
+        for statement in statements:
+            if isinstance(statement, (ast.For, ast.While)):
+                result.extend(self._hoist(statement))
+            result.append(statement)
+        return result
+
+    def _hoist(self, loop):
+        calls = {}
+        for node in self._walk_loop(loop):
+            if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and
+                    isinstance(node.func.value, ast.Name)):
+                calls.setdefault((node.func.value.id, node.func.attr), []).append(node)
+        if not calls:
+            return []
+        bound, assigned_attributes, called = set(), set(), set()
+        for node in ast.walk(loop):
+            if isinstance(node, ast.Name):
+                (called if isinstance(node.ctx, ast.Load) else bound).add(node.id)
+            elif isinstance(node, ast.Attribute) and not isinstance(node.ctx, ast.Load):
+                assigned_attributes.add(node.attr)
+        if {"setattr", "delattr"} & called:
+            return []
+        # names certainly bound where the lookup moves to; None when the loop is not in scope's own blocks
+        definite = _bound_before(self.scope.body, loop, frozenset()) or frozenset()
+        calls = {(owner, attr): sites for (owner, attr), sites in calls.items()
+                 if attr not in assigned_attributes and owner not in bound and
+                 self._invariant(owner, attr, definite)}
+        if not calls:
+            return []
+        hoisted = []
+        taken = _names(self.scope) | _names(self.scope, ast.Store) | {a.arg for a in ast.walk(self.scope)
+                                                                      if isinstance(a, ast.arg)}
+        for (owner, attr), sites in calls.items():
+            local = f"_{owner}_{attr}"
+            while local in taken:
+                local += "_"
+            taken.add(local)
+            for call in sites:
+                call.func = ast.copy_location(ast.Name(id=local, ctx=ast.Load()), call.func)
+            assign = ast.Assign(targets=[ast.Name(id=local, ctx=ast.Store())],
+                                value=ast.Attribute(value=ast.Name(id=owner, ctx=ast.Load()), attr=attr,
+                                                    ctx=ast.Load()))
+            hoisted.append(_span(loop, loop, assign))
+            self.record(loop, f"{owner}.{attr} looked up once before the loop instead of "
+                              f"{'on every iteration' if len(sites) == 1 else f'at {len(sites)} call sites'}")
+        return hoisted
+
+    def _walk_loop(self, loop):
+        """
+        Nodes evaluated on every iteration: not those under an if, a try, a
+        with, a nested loop's body, the later operands of and/or, the branches
+        of a conditional expression or a comprehension past its first
+        iterable, nor those of nested functions or classes
+        """
+        todo = [loop.test] if isinstance(loop, ast.While) else []
+        for statement in loop.body:
+            todo.append(statement)
+            # a statement that may leave the iteration makes the rest conditional
+            if any(isinstance(node, EXITS) for node in self._walk_own(statement)):
+                break
+        while todo:
+            node = todo.pop()
+            yield node
+            if isinstance(node, (ast.If, ast.While, ast.IfExp)):
+                todo.append(node.test)
+            elif isinstance(node, (ast.For, ast.AsyncFor)):
+                todo.append(node.iter)
+            elif isinstance(node, (ast.With, ast.AsyncWith)):
+                todo.extend(item.context_expr for item in node.items)
+            elif isinstance(node, ast.Match):
+                todo.append(node.subject)
+            elif isinstance(node, ast.BoolOp):
+                todo.append(node.values[0])
+            elif isinstance(node, (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)):
+                todo.append(node.generators[0].iter)
+            elif not isinstance(node, SCOPES + TRIES + (ast.Assert,)):
+                todo.extend(ast.iter_child_nodes(node))
+
+    @staticmethod
+    def _walk_own(node):
+        """Nodes under node, not those of nested functions or classes"""
+        todo = [node]
+        while todo:
+            node = todo.pop()
+            yield node
+            if not isinstance(node, SCOPES):
+                todo.extend(ast.iter_child_nodes(node))
+
+    def _invariant(self, name, attr, definite):
+        """
+        Whether name is a module or a local container throughout the
+        function, bound (when local) on every path to the loop: definite,
+        with an attribute attr whatever the loop does
+        """
+        function = self.scope
+        if name in {a.arg for a in ast.walk(function.args) if isinstance(a, ast.arg)}:
+            return False
+        bindings = []
+        for node in ast.walk(function):
+            if isinstance(node, (ast.Global, ast.Nonlocal)) and name in node.names:
+                return False
+            if isinstance(node, ast.Name) and node.id == name and not isinstance(node.ctx, ast.Load):
+                bindings.append(node)
+            elif isinstance(node, (ast.Import, ast.ImportFrom)) and any(
+                    (a.asname or a.name.split(".")[0]) == name for a in node.names):
+                return False
+        if not bindings:
+            # only a module this process has loaded can be asked for the attribute
+            module = sys.modules.get(self.module_paths[name]) if name in self.module_imports else None
+            return module is not None and hasattr(module, attr)
+        if name not in definite:
+            return False
+        values = {id(node.targets[0]): node.value for node in ast.walk(function)
+                  if isinstance(node, ast.Assign) and len(node.targets) == 1}
+        types = [self._container(values.get(id(binding))) for binding in bindings]
+        return all(t is not None and hasattr(t, attr) for t in types)
+
+    def _container(self, value):
+        """The type of container value certainly builds, or None"""
+        if isinstance(value, (ast.List, ast.ListComp)):
+            return list
+        if isinstance(value, (ast.Dict, ast.DictComp)):
+            return dict
+        if isinstance(value, (ast.Set, ast.SetComp)):
+            return set
+        if (isinstance(value, ast.Call) and isinstance(value.func, ast.Name) and
+                value.func.id in CONTAINER_FACTORIES and value.func.id not in self.module_bindings):
+            return getattr(builtins, value.func.id)
+        return None
+
+
+class PassManager:
+    """
+    Runs passes over a module until none of them changes anything. The first
+    round visits every unit; later rounds only the units changed in the one
+    before, and the module and class bodies whose statement lists changed.
+    incremental=False visits everything in every round, for comparison.
+    """
+
+    def __init__(self, passes=None, max_rounds=10, incremental=True):
+        self.passes = passes if passes is not None else default_passes()
+        self.max_rounds = max_rounds
+        self.incremental = incremental
+
+    def run(self, tree, comment_lines=frozenset()):
+        """
+        Rewrite tree in place; (changes, units changed, rounds run). Units on
+        any of comment_lines are not rewritten.
+        """
+        for p in self.passes:
+            p.comment_lines = comment_lines
+            p.prepare(tree)
+        changes = []
+        changed_units = set()
+        dirty_units = None
+        dirty_blocks = None
+        frozen = {unit for _, unit, _ in _units(tree)
+                  if any(_first_line(unit) <= line <= unit.end_lineno for line in comment_lines)}
+        rounds = 0
+        while rounds < self.max_rounds:
+            rounds += 1
+            next_units, next_blocks = set(), set()
+            for owner in _block_owners(tree):
+                if dirty_blocks is None or owner in dirty_blocks:
+                    self._run_block(owner, next_units, next_blocks, changes)
+            for _, unit, scope in list(_units(tree)):
+                if unit in frozen:
+                    continue
+                if dirty_units is None or unit in dirty_units:
+                    present = tuple({type(node) for node in ast.walk(unit)})
+                    for p in self.passes:
+                        if not any(issubclass(t, p.triggers) for t in present):
+                            continue
+                        before = len(p.changes)
+                        p.run(unit, scope)
+                        if len(p.changes) > before:
+                            changes.extend(p.changes[before:])
+                            next_units.add(unit)
+            changed_units |= next_units
+            if not next_units and not next_blocks:
+                break
+            if self.incremental:
+                dirty_units, dirty_blocks = next_units, next_blocks
+        return changes, changed_units, rounds
+
+    def _run_block(self, owner, next_units, next_blocks, changes):
+        for p in self.passes:
+            before = len(p.changes)
+            kept = set(owner.body)
+            owner.body = p.run_block(owner.body, owner)
+            if len(p.changes) > before:
+                changes.extend(p.changes[before:])
+                next_blocks.add(owner)
+                next_units.update(s for s in owner.body if s not in kept)
+
+
+def default_passes():
+    # statement folds first, so hoisting does not take the append of a list about to become a comprehension
+    return [LoopToComprehension(), ConcatToJoin(), MembershipToSet(), SimplifyIfTrue(), HoistAttributeLookups()]
+
+
+def _blocks(statement):
+    """The statement lists directly under statement"""
+    for field in ("body", "orelse", "finalbody"):
+        block = getattr(statement, field, None)
+        if isinstance(block, list) and block and isinstance(block[0], ast.stmt):
+            yield block
+    for part in getattr(statement, "handlers", []) + getattr(statement, "cases", []):
+        yield part.body
+
+
+def _bound_before(block, target, bound):
+    """
+    Names bound by an assignment on every path through block to the
+    statement target (bound: those bound on the way to block), or None when
+    target is not in block or the blocks under it
+    """
+    for statement in block:
+        if statement is target:
+            return bound
+        if not isinstance(statement, SCOPES):
+            for inner in _blocks(statement):
+                found = _bound_before(inner, target, bound)
+                if found is not None:
+                    return found
+        if isinstance(statement, ast.Assign):
+            bound = bound | {t.id for t in statement.targets if isinstance(t, ast.Name)}
+        elif isinstance(statement, ast.AnnAssign) and statement.value is not None and \
+                isinstance(statement.target, ast.Name):
+            bound = bound | {statement.target.id}
+    return None
+
+
+def _block_owners(tree):
+    """The module and every class whose body holds units, outermost first"""
+    owners = [tree]
+    for owner in owners:
+        owners.extend(s for s in owner.body if isinstance(s, ast.ClassDef))
+    return owners
+
+
+def _units(tree):
+    """(module or class owning it, unit, scope) for every unit of tree"""
+    for owner in _block_owners(tree):
+        for statement in owner.body:
+            if not isinstance(statement, ast.ClassDef):
+                yield owner, statement, owner
+
+
+def _module_names(tree):
+    """(names bound only by `import` at module level, every name bound at module level)"""
+    imported, other = set(), set()
+    for statement in tree.body:
+        if isinstance(statement, ast.Import):
+            imported.update(a.asname or a.name.split(".")[0] for a in statement.names)
+        elif isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            # what their bodies bind is their own
+            other.add(statement.name)
+        elif isinstance(statement, ast.ImportFrom):
+            other.update(a.asname or a.name for a in statement.names)
+        else:
+            other |= _names(statement, ast.Store)
+    return imported - other, imported | other
+
+
+def splice(source, tree, changed_units):
+    """source with the changed units of tree regenerated and everything else kept as it was"""
+    lines = source.splitlines(keepends=True)
+    edits = []
+    for _, unit, _ in _units(tree):
+        if unit in changed_units:
+            edits.append((_first_line(unit), unit.end_lineno, unit.col_offset, unit))
+    for first, last, indent, unit in sorted(edits, key=lambda e: e[0], reverse=True):
+        text = format_code(ast.unparse(unit) + "\n")
+        lines[first - 1:last] = [" " * indent + line if line.strip() else line
+                                 for line in text.splitlines(keepends=True)]
+    return "".join(lines)
+
+
+def optimize(code: str, language='python', context=None, passes=None) -> OptimizationResult:
+    """The optimized source of code and the changes that made it"""
     if language != 'python':
         raise NotImplementedError("Only Python supported")
-    # Format first
-    formatted = format_code(code)
+    context = context or AnalysisContext(code, language)
+    # Format first (once per context)
+    formatted = context.formatted
     try:
-        tree = ast.parse(formatted)
+        tree = context.formatted_tree
     except SyntaxError:
-        return formatted
-
-    # Apply simple AST transform(s)
-    tree = SimplifyIfTrue().visit(tree)
-    ast.fix_missing_locations(tree)
+        return OptimizationResult(formatted, [], 0)
+    changes, changed_units, rounds = PassManager(passes).run(tree, comment_lines(formatted))
     try:
-        import astor
-        new_src = astor.to_source(tree)
+        new_src = splice(formatted, tree, changed_units)
     except Exception:
-        # fallback: use built-in
-        new_src = formatted
-    return new_src
\ No newline at end of file
+        # fallback: the formatted source, unchanged
+        return OptimizationResult(formatted, [], rounds)
+    return OptimizationResult(new_src, sorted(changes, key=lambda c: c.lineno or 0), rounds)
+
+
+def optimize_code(code: str, language='python', context=None) -> str:
+    """context: the AnalysisContext of code, when the caller has one"""
+    return optimize(code, language, context).source
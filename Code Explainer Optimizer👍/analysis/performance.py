@@ -0,0 +1,264 @@
+"""
+Static performance hotspots of Python source, from its AST.
+
+One visitor pass over the tree tracks the loops enclosing every node and
+flags what tends to cost at runtime: nested loops over the same iterable,
+list.pop(0) and list.insert(0, ...) in loops, `in` tests on lists in loops,
+regexes compiled in loops, strings built with + in loops and attribute
+lookups repeated in loops. Per function it gives the deepest loop nesting
+and a rough Big-O in n, the size of the data the loops run over: loops over
+constant ranges and literals do not count, and a linear operation inside
+the loops (pop(0), insert(0, ...), `in` on a list) adds a degree.
+
+    analyze_performance(ast.parse(code))["functions"][0]["big_o"]  # "O(n^2)"
+"""
+import ast
+from collections import Counter
+
+REGEX_COMPILE = {("re", "compile"), ("regex", "compile")}
+SORTS = {"sorted"}
+
+# Times one attribute lookup (self.items.append, os.path.join) has to appear
+# in a loop to be worth a local; a single one, however long its chain, is not
+REPEATED_LOOKUPS = 2
+
+LIST_VALUES = (ast.List, ast.ListComp)
+
+
+def _dotted(node):
+    """'a.b.c' for a chain of attributes on a name, else None"""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+def _constant_size(iterable):
+    """Whether a loop over iterable runs a number of times fixed by the code"""
+    if isinstance(iterable, (ast.List, ast.Tuple, ast.Set, ast.Constant)):
+        return True
+    return (isinstance(iterable, ast.Call) and isinstance(iterable.func, ast.Name) and
+            iterable.func.id in ("range", "enumerate") and bool(iterable.args) and
+            all(isinstance(a, ast.Constant) for a in iterable.args))
+
+
+def _big_o(degree, log):
+    if degree == 0:
+        return "O(log n)" if log else "O(1)"
+    power = "n" if degree == 1 else f"n^{degree}"
+    return f"O({power} log n)" if log else f"O({power})"
+
+
+class _Loop:
+    def __init__(self, node, iterable):
+        self.node = node
+        self.iterable = iterable
+        self.key = ast.dump(iterable) if iterable is not None else None
+        self.scales = iterable is None or not _constant_size(iterable)
+        self.lookups = Counter()
+
+
+class _Function:
+    def __init__(self, node):
+        self.node = node
+        self.loop_depth = 0
+        self.degree = 0
+        self.log = False
+        self.lists = set()
+        self.strings = set()
+        self.hotspots = []
+
+
+class PerformanceVisitor(ast.NodeVisitor):
+    def __init__(self):
+        self.loops = []
+        self.function = _Function(None)
+        self.functions = []
+        self.hotspots = []
+
+    # scopes
+
+    def visit_FunctionDef(self, node):
+        outer_function, outer_loops = self.function, self.loops
+        self.function, self.loops = _Function(node), []
+        self._collect_bindings(node)
+        self.generic_visit(node)
+        self.functions.append(self.function)
+        self.function, self.loops = outer_function, outer_loops
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def _collect_bindings(self, function):
+        """Local names only ever bound to lists, and to strings"""
+        kinds = {}
+        for node in ast.walk(function):
+            if isinstance(node, ast.Assign):
+                for target in node.targets:
+                    if isinstance(target, ast.Name):
+                        # name = name + ... keeps whatever name was
+                        appended = (isinstance(node.value, ast.BinOp) and isinstance(node.value.left, ast.Name)
+                                    and node.value.left.id == target.id)
+                        kinds.setdefault(target.id, set()).add("augmented" if appended else self._kind(node.value))
+            elif isinstance(node, (ast.AnnAssign, ast.AugAssign)) and isinstance(node.target, ast.Name):
+                value = node.value if isinstance(node, ast.AnnAssign) else None
+                kinds.setdefault(node.target.id, set()).add(
+                    self._kind(value) if value is not None else "augmented")
+            elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+                kinds.setdefault(node.id, set())
+        for arg in ast.walk(function.args):
+            if isinstance(arg, ast.arg):
+                kinds.setdefault(arg.arg, set()).add(None)
+        for name, found in kinds.items():
+            if found - {"augmented"} == {"list"}:
+                self.function.lists.add(name)
+            elif found - {"augmented"} == {"str"}:
+                self.function.strings.add(name)
+
+    def _kind(self, value):
+        if isinstance(value, LIST_VALUES) or (isinstance(value, ast.Call) and isinstance(value.func, ast.Name)
+                                              and value.func.id == "list"):
+            return "list"
+        if isinstance(value, ast.JoinedStr) or (isinstance(value, ast.Constant) and isinstance(value.value, str)):
+            return "str"
+        return None
+
+    # loops
+
+    def visit_For(self, node):
+        self.visit(node.iter)
+        self.visit(node.target)
+        self._loop(node, node.iter, node.body + node.orelse)
+
+    visit_AsyncFor = visit_For
+
+    def visit_While(self, node):
+        self._loop(node, None, [node.test] + node.body + node.orelse)
+
+    def _comprehension(self, node):
+        # every generator is a loop; the element sits inside all of them
+        entered = []
+        for generator in node.generators:
+            self.visit(generator.iter)
+            loop = self._enter(generator, generator.iter)
+            entered.append(loop)
+            for condition in generator.ifs:
+                self.visit(condition)
+        for child in ([node.key, node.value] if isinstance(node, ast.DictComp) else [node.elt]):
+            self.visit(child)
+        for loop in reversed(entered):
+            self._leave(loop)
+
+    visit_ListComp = visit_SetComp = visit_DictComp = visit_GeneratorExp = _comprehension
+
+    def _loop(self, node, iterable, body):
+        loop = self._enter(node, iterable)
+        for child in body:
+            self.visit(child)
+        self._leave(loop)
+
+    def _enter(self, node, iterable):
+        loop = _Loop(node, iterable)
+        outer = next((l for l in self.loops if l.key is not None and l.key == loop.key), None)
+        if outer is not None and loop.scales:
+            self.flag(node, "nested_loop_same_iterable",
+                      f"nested loop over {ast.unparse(iterable)} again: quadratic in its length; "
+                      "an index (dict or set) of it usually does the inner loop's work in O(1)")
+        self.loops.append(loop)
+        self.function.loop_depth = max(self.function.loop_depth, len(self.loops))
+        self._raise_degree(0)
+        return loop
+
+    def _leave(self, loop):
+        self.loops.pop()
+        for name, count in loop.lookups.items():
+            if count >= REPEATED_LOOKUPS:
+                self.flag(loop.node, "repeated_attribute_lookup",
+                          f"{name} looked up {count} times an iteration; bind it to a local before the loop")
+
+    def _raise_degree(self, extra, log=False):
+        degree = sum(1 for l in self.loops if l.scales) + extra
+        if (degree, log) > (self.function.degree, self.function.log):
+            self.function.degree, self.function.log = degree, log
+
+    # operations inside loops
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        name = _dotted(node.func)
+        if (isinstance(node.func, ast.Name) and node.func.id in SORTS and node.args and
+                not _constant_size(node.args[0])) or (
+                isinstance(node.func, ast.Attribute) and node.func.attr == "sort"):
+            self._raise_degree(1, log=True)
+        if not self.loops:
+            return
+        if name and tuple(name.split(".")) in REGEX_COMPILE:
+            self.flag(node, "regex_compile_in_loop",
+                      f"{name}() in a loop compiles the pattern on every iteration; compile it once outside")
+        if isinstance(node.func, ast.Attribute) and node.args and isinstance(node.args[0], ast.Constant) \
+                and node.args[0].value == 0:
+            method = node.func.attr
+            if (method == "pop" and len(node.args) == 1) or (method == "insert" and len(node.args) == 2):
+                self.flag(node, "list_front_operation",
+                          f"{ast.unparse(node.func)}(0{'' if method == 'pop' else ', ...'}) in a loop moves "
+                          "every element of the list each time; use collections.deque")
+                self._raise_degree(1)
+
+    def visit_Attribute(self, node):
+        name = _dotted(node)
+        if name is None:
+            self.generic_visit(node)
+        elif self.loops and isinstance(node.ctx, ast.Load):
+            # the whole chain, not each of its prefixes again
+            self.loops[-1].lookups[name] += 1
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if not self.loops:
+            return
+        for op, right in zip(node.ops, node.comparators):
+            if (isinstance(op, (ast.In, ast.NotIn)) and isinstance(right, ast.Name) and
+                    right.id in self.function.lists):
+                self.flag(node, "list_membership_in_loop",
+                          f"`in {right.id}` in a loop scans the list every time; keep a set of it")
+                self._raise_degree(1)
+
+    def visit_AugAssign(self, node):
+        self.generic_visit(node)
+        if (self.loops and isinstance(node.op, ast.Add) and isinstance(node.target, ast.Name) and
+                node.target.id in self.function.strings):
+            self._flag_concatenation(node, node.target.id)
+
+    def visit_Assign(self, node):
+        self.generic_visit(node)
+        if (self.loops and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name) and
+                node.targets[0].id in self.function.strings and isinstance(node.value, ast.BinOp) and
+                isinstance(node.value.op, ast.Add) and isinstance(node.value.left, ast.Name) and
+                node.value.left.id == node.targets[0].id):
+            self._flag_concatenation(node, node.targets[0].id)
+
+    def _flag_concatenation(self, node, name):
+        self.flag(node, "string_concat_in_loop",
+                  f"string {name} built with + in a loop copies it every time; collect the parts and str.join them")
+
+    def flag(self, node, kind, message):
+        hotspot = {"kind": kind, "lineno": node.lineno if hasattr(node, "lineno") else node.iter.lineno,
+                   "function": self.function.node.name if self.function.node is not None else None,
+                   "message": message}
+        self.function.hotspots.append(hotspot)
+        self.hotspots.append(hotspot)
+
+
+def analyze_performance(tree):
+    """Hotspots of tree, and loop depth and Big-O estimate of each function"""
+    visitor = PerformanceVisitor()
+    visitor.visit(tree)
+    functions = sorted(visitor.functions, key=lambda f: f.node.lineno)
+    return {
+        "functions": [{"name": f.node.name, "lineno": f.node.lineno, "loop_depth": f.loop_depth,
+                       "big_o": _big_o(f.degree, f.log), "hotspots": len(f.hotspots)} for f in functions],
+        "hotspots": sorted(visitor.hotspots, key=lambda h: h["lineno"]),
+    }
@@ -1,17 +1,57 @@
 from flask import Flask, render_template, request, jsonify
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import time
 import json
+import threading
+import atexit
 from models import db_init, UsageRecord, engine, SessionLocal
+from analysis.context import ResultCache, content_key
 from analysis.explainer import explain_code
 from analysis.optimizer import optimize_code, format_code
+from workers import JobTimeout, PoolSaturated, WorkerPool, run_job
+from measure import MeasurementError, measure_options
+from events import EventWriter
+from rollups import Rollups
 from pymongo import MongoClient
+import os
 
 app = Flask(__name__)
 # MongoDB connection (local or Atlas)
 client = MongoClient("mongodb://localhost:27017/Code_Explainer_Optimizer")  # update with your URI
 db = client["code_explainer"]
 usage_collection = db["usage_records"]
+# Per-minute and per-hour counts and latency histograms behind /api/stats
+usage_rollups = Rollups(db["usage_rollups"])
+
+# Usage records are buffered and written in batches off the request path,
+# and folded into the rollups as they are
+usage_events = EventWriter(usage_collection, rollups=usage_rollups,
+                           batch_size=int(os.environ.get("USAGE_BATCH_SIZE", 100)),
+                           flush_interval=float(os.environ.get("USAGE_FLUSH_SECONDS", 1.0)),
+                           max_buffer=int(os.environ.get("USAGE_BUFFER_SIZE", 10000)))
+atexit.register(usage_events.close)
+
+# Results of recent submissions by content hash; repeats skip the analysis
+result_cache = ResultCache(int(os.environ.get("RESULT_CACHE_SIZE", 512)))
+
+# Worker processes running explain/optimize jobs; 0 runs them in the request thread
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", os.cpu_count() or 1))
+# Jobs that may wait for a worker; more than that are rejected with 429
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", 2 * JOB_WORKERS))
+# Wall-clock (and CPU) seconds per job, queueing included, and memory per worker
+JOB_TIMEOUT = float(os.environ.get("JOB_TIMEOUT", 10))
+JOB_MEMORY_MB = int(os.environ.get("JOB_MEMORY_MB", 1024))
+# Whether /api/optimize measures rewrites ("measure"): that runs submitted
+# code, in a sandbox (see measure.py), so it is off unless turned on
+MEASURE_ENABLED = os.environ.get("MEASURE_ENABLED", "0").lower() in ("1", "true", "yes")
+# Wall-clock (and CPU) seconds and memory of the process measuring a rewrite;
+# it runs in a pool job, so it ends well within JOB_TIMEOUT and a slow
+# measurement is reported as such rather than as a timed-out job
+MEASURE_TIMEOUT = max(min(float(os.environ.get("MEASURE_TIMEOUT", JOB_TIMEOUT - 2)), JOB_TIMEOUT - 2), 1.0)
+MEASURE_MEMORY_MB = int(os.environ.get("MEASURE_MEMORY_MB", 512))
+
+_job_pool = None
+_job_pool_lock = threading.Lock()
 
 @app.route('/')
 def index():
@@ -21,95 +61,164 @@ def index():
 def analytics_page():
     return render_template('analytics.html')
 
-@app.route('/api/explain', methods=['POST'])
-def api_explain():
+def job_pool():
+    """The analysis worker pool, or None to run jobs in the request thread"""
+    # Created on first use so importing the app does not start worker processes
+    global _job_pool
+    if JOB_WORKERS < 1:
+        return None
+    with _job_pool_lock:
+        if _job_pool is None:
+            _job_pool = WorkerPool(JOB_WORKERS, JOB_QUEUE_SIZE, JOB_TIMEOUT,
+                                   memory_bytes=JOB_MEMORY_MB * 1024 * 1024 if JOB_MEMORY_MB else None)
+    return _job_pool
+
+def run_action(action, code, language):
+    """The result of explain/optimize for code, from the result cache or a worker"""
+    key = content_key(action, code, language)
+    result = result_cache.get(key)
+    if result is None:
+        result = submit_job(action, code, language)
+        result_cache.put(key, result)
+    return result
+
+def submit_job(action, code, language, options=None):
+    pool = job_pool()
+    return pool.submit(action, code, language, options) if pool else run_job(action, code, language, options)
+
+def record_usage(action, language, code, start, error=None):
+    record = {
+        "timestamp": datetime.utcnow(),
+        "language": language,
+        "code_size": len(code),
+        "action": action,
+        "success": error is None,
+        "latency_ms": int((time.time()-start)*1000)
+    }
+    if error is not None:
+        record["error"] = error
+    usage_events.emit(record)
+
+def handle_action(action, respond, check=None):
+    """
+    The response to an explain/optimize request: respond(result) of its
+    result. check, if given, looks at the payload before any work and raises
+    ValueError for a 400. Every request records exactly one usage event.
+    """
     payload = request.json or {}
     code = payload.get('code', '')
     language = payload.get('language', 'python')
     start = time.time()
     try:
-        from analysis.explainer import explain_code
-        explanation = explain_code(code, language=language)
-        elapsed = time.time() - start
-        usage_collection.insert_one({
-            "timestamp": datetime.utcnow(),
-            "language": language,
-            "code_size": len(code),
-            "action": "explain",
-            "success": True,
-            "latency_ms": int(elapsed * 1000)
-        })
-        return jsonify({"explanation": explanation})
+        if check is not None:
+            check(payload)
+    except ValueError as e:
+        record_usage(action, language, code, start, str(e))
+        return jsonify({"error": str(e)}), 400
+    try:
+        body = respond(run_action(action, code, language))
+    except PoolSaturated as e:
+        # fail fast: the client may retry, the queue is not made any longer
+        record_usage(action, language, code, start, str(e))
+        return jsonify({"error": str(e)}), 429, {"Retry-After": "1"}
+    except JobTimeout as e:
+        record_usage(action, language, code, start, str(e))
+        return jsonify({"error": str(e)}), 504
     except Exception as e:
-        usage_collection.insert_one({
-            "timestamp": datetime.utcnow(),
-            "language": language,
-            "code_size": len(code),
-            "action": "explain",
-            "success": False,
-            "latency_ms": int((time.time()-start)*1000),
-            "error": str(e)
-        })
+        record_usage(action, language, code, start, str(e))
         return jsonify({"error": str(e)}), 500
+    record_usage(action, language, code, start)
+    return jsonify(body)
+
+@app.route('/api/explain', methods=['POST'])
+def api_explain():
+    return handle_action('explain', lambda explanation: {"explanation": explanation})
 
 @app.route('/api/optimize', methods=['POST'])
 def api_optimize():
+    # {"optimized", "formatted", "changes"}, formatted and parsed once in the worker;
+    # given "measure": {"function", "inputs"[, "repeat"]} and MEASURE_ENABLED, also
+    # the "measurement" of that function, original against optimized (or its "error"),
+    # taken by another worker job
     payload = request.json or {}
-    code = payload.get('code', '')
-    language = payload.get('language', 'python')
-    start = time.time()
-    try:
-        from analysis.optimizer import optimize_code, format_code
-        formatted = format_code(code)
-        optimized = optimize_code(formatted, language=language)
-        elapsed = time.time() - start
-
-        usage_collection.insert_one({
-            "timestamp": datetime.utcnow(),
-            "language": language,
-            "code_size": len(code),
-            "action": "optimize",
-            "success": True,
-            "latency_ms": int(elapsed * 1000)
-        })
-
-        return jsonify({"optimized": optimized, "formatted": formatted})
-    except Exception as e:
-        usage_collection.insert_one({
-            "timestamp": datetime.utcnow(),
-            "language": language,
-            "code_size": len(code),
-            "action": "optimize",
-            "success": False,
-            "latency_ms": int((time.time()-start)*1000),
-            "error": str(e)
-        })
-        return jsonify({"error": str(e)}), 500
+    if 'measure' not in payload:
+        return handle_action('optimize', lambda result: result)
+    options = {}
+
+    def check(payload):
+        if not MEASURE_ENABLED:
+            raise ValueError("measuring is not enabled on this server")
+        try:
+            options.update(measure_options(payload['measure']))
+        except MeasurementError as e:
+            raise ValueError(str(e))
+
+    def respond(result):
+        try:
+            measurement = submit_job('measure', payload.get('code', ''), payload.get('language', 'python'), {
+                **options, "optimized": result["optimized"], "timeout": MEASURE_TIMEOUT,
+                "memory_bytes": MEASURE_MEMORY_MB * 1024 * 1024 if MEASURE_MEMORY_MB else None})
+        except (PoolSaturated, JobTimeout) as e:
+            # the rewrite is still worth returning
+            measurement = {"error": str(e)}
+        # result is shared with the result cache
+        return {**result, "measurement": measurement}
+    return handle_action('optimize', respond, check)
+
+
+def utc_time(value):
+    """Naive UTC datetime of an ISO time, as the usage records store them; naive input is taken as UTC"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
 
 
 @app.route('/api/stats', methods=['GET'])
 def api_stats():
-    total = usage_collection.count_documents({})
-    pipeline = [
-        {"$group": {
-            "_id": "$action",
-            "count": {"$sum": 1}
-        }}
-    ]
-    actions = {doc["_id"]: doc["count"] for doc in usage_collection.aggregate(pipeline)}
-
-    avg_pipeline = [
-        {"$group": {"_id": None, "avg_size": {"$avg": "$code_size"}}}
-    ]
-    avg_size_doc = list(usage_collection.aggregate(avg_pipeline))
-    avg_size = int(avg_size_doc[0]["avg_size"]) if avg_size_doc else 0
-
+    """
+    Usage over a window, from the rollups: ?minutes=N for the last N minutes,
+    or ?since=&until= as ISO times (UTC); everything recorded without either
+    """
+    try:
+        until = utc_time(request.args['until']) if 'until' in request.args else None
+        if 'minutes' in request.args:
+            since = (until or datetime.utcnow()) - timedelta(minutes=float(request.args['minutes']))
+        else:
+            since = utc_time(request.args['since']) if 'since' in request.args else None
+    except (ValueError, OverflowError) as e:
+        return jsonify({"error": f"bad window: {e}"}), 400
+    stats = usage_rollups.stats(since, until)
     return jsonify({
-        "total_requests": total,
-        "avg_code_size": avg_size,
-        "actions": actions
+        "since": since.isoformat() if since else None,
+        "until": until.isoformat() if until else None,
+        "total_requests": stats["count"],
+        "errors": stats["errors"],
+        "avg_code_size": stats["avg_code_size"],
+        "latency_ms": stats["latency_ms"],
+        "actions": {action: s["count"] for action, s in stats["by_action"].items()},
+        "by_action": stats["by_action"],
+        "by_language": stats["by_language"]
     })
 
 
+@app.cli.command('init-db')
+def init_db_command():
+    """Create the rollup indexes and build the rollups from the usage records kept before them"""
+    if usage_rollups.ensure(usage_collection):
+        print('Rollups rebuilt from the usage records.')
+    else:
+        print('Rollups already up to date.')
+
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recompute the /api/stats rollups from every usage record"""
+    records = usage_rollups.rebuild(usage_collection)
+    print(f"Rolled up {records} usage records.")
+
+
 if __name__ == '__main__':
+    # start the workers now, so they are warm by the first request
+    job_pool()
     app.run(debug=True)
\ No newline at end of file
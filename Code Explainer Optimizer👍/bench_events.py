@@ -0,0 +1,100 @@
+"""
+Benchmark: time spent on the request path recording usage events with a
+synchronous insert_one per request, as app.py used to, and with
+EventWriter.emit. The collection is mongomock behind a stand-in that adds
+a round-trip latency to every call, so no Mongo server is needed. Checks
+that every event reaches the collection, and that a writer whose database
+stalls drops events rather than blocking requests.
+
+Usage:
+    python bench_events.py               # 2000 events, 2 ms round trip
+    python bench_events.py 10000 5
+"""
+import sys
+import threading
+import time
+
+import mongomock
+
+from events import EventWriter
+
+
+class SlowCollection:
+    """A mongomock collection with a network round trip on every write"""
+
+    def __init__(self, collection, latency):
+        self.collection = collection
+        self.latency = latency
+        self.calls = 0
+
+    def insert_one(self, document):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self.collection.insert_one(document)
+
+    def insert_many(self, documents, ordered=True):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self.collection.insert_many(documents, ordered=ordered)
+
+
+def event(n):
+    return {"timestamp": time.time(), "language": "python", "code_size": n, "action": "explain",
+            "success": True, "latency_ms": n % 50}
+
+
+def record(emit, n_events, clients=8):
+    """Per-event seconds spent in emit, with clients threads emitting concurrently"""
+    timings = []
+    lock = threading.Lock()
+
+    def client(c):
+        local = []
+        for n in range(c, n_events, clients):
+            start = time.perf_counter()
+            emit(event(n))
+            local.append(time.perf_counter() - start)
+        with lock:
+            timings.extend(local)
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sorted(timings)
+
+
+def main(n_events, latency_ms):
+    latency = latency_ms / 1000
+    print(f"{n_events} events, {latency_ms} ms round trip")
+    print(f"{'writer':<14}{'mean ms':>9}{'p99 ms':>9}{'calls':>7}{'stored':>8}{'dropped':>9}")
+
+    direct = SlowCollection(mongomock.MongoClient().db.usage, latency)
+    timings = record(direct.insert_one, n_events)
+    print(f"{'insert_one':<14}{sum(timings) / len(timings) * 1000:>9.3f}{timings[int(len(timings) * .99)] * 1000:>9.3f}"
+          f"{direct.calls:>7}{direct.collection.count_documents({}):>8}{0:>9}")
+
+    batched = SlowCollection(mongomock.MongoClient().db.usage, latency)
+    writer = EventWriter(batched, batch_size=100, flush_interval=0.2)
+    timings = record(writer.emit, n_events)
+    writer.close()
+    stored = batched.collection.count_documents({})
+    assert stored == n_events, f"{stored} of {n_events} events written"
+    print(f"{'EventWriter':<14}{sum(timings) / len(timings) * 1000:>9.3f}{timings[int(len(timings) * .99)] * 1000:>9.3f}"
+          f"{batched.calls:>7}{stored:>8}{writer.dropped:>9}")
+
+    # the database stalls for a second: the buffer fills and emit stays fast
+    stalled = SlowCollection(mongomock.MongoClient().db.usage, 1.0)
+    writer = EventWriter(stalled, batch_size=100, max_buffer=500, block_timeout=0.01)
+    timings = record(writer.emit, n_events)
+    writer.close(timeout=30)
+    stored = stalled.collection.count_documents({})
+    assert stored + writer.dropped == n_events
+    print(f"{'stalled db':<14}{sum(timings) / len(timings) * 1000:>9.3f}{timings[int(len(timings) * .99)] * 1000:>9.3f}"
+          f"{stalled.calls:>7}{stored:>8}{writer.dropped:>9}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 2)
@@ -0,0 +1,94 @@
+"""
+Load test: concurrent explain/optimize requests run the way app.py used to
+(inline on the request threads) and on a WorkerPool, with a few
+pathological submissions mixed in. Prints throughput, p50/p99 latency of
+the requests that succeeded, and how many were rejected (429) or timed out.
+
+Inline, a pathological submission holds its thread and the GIL for as long
+as it takes; on the pool it is cut off at the job timeout and the
+rejections come back immediately instead of queueing.
+
+Usage:
+    python bench_load.py                 # 8 clients x 25 requests, 1 in 25 pathological
+    python bench_load.py 16 50 2         # clients, requests per client, workers
+"""
+import os
+import sys
+import threading
+import time
+
+from workers import JobTimeout, PoolSaturated, WorkerPool, run_job
+
+SMALL = '''def handler_{n}(request, retries=3):
+    """Handle request {n}"""
+    value = compute(request,retries)
+    for item in value.items():
+        if item.active == True:
+            total = item.weight*scale
+    return value
+'''
+# Black and radon take seconds on this
+PATHOLOGICAL = "".join(f"def h{{n}}_{i}(a,b):\n  return a+b\n" for i in range(20000))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else float("nan")
+
+
+def load(run, clients, requests_per_client, pathological_every=25):
+    latencies = []
+    outcomes = {"ok": 0, "429": 0, "timeout": 0}
+    lock = threading.Lock()
+
+    def client(c):
+        for r in range(requests_per_client):
+            n = c * requests_per_client + r
+            # distinct code every time, so nothing could be served from a cache
+            code = (PATHOLOGICAL if n % pathological_every == pathological_every - 1 else SMALL).format(n=n)
+            start = time.perf_counter()
+            try:
+                run("explain" if n % 2 else "optimize", code)
+                outcome = "ok"
+            except PoolSaturated:
+                outcome = "429"
+            except JobTimeout:
+                outcome = "timeout"
+            elapsed = time.perf_counter() - start
+            with lock:
+                outcomes[outcome] += 1
+                if outcome == "ok":
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, latencies, outcomes
+
+
+def report(name, elapsed, latencies, outcomes):
+    print(f"{name:<10}{outcomes['ok'] / elapsed:>8.1f}{percentile(latencies, 50) * 1000:>9.0f}"
+          f"{percentile(latencies, 99) * 1000:>9.0f}{outcomes['ok']:>6}{outcomes['429']:>6}{outcomes['timeout']:>9}")
+
+
+def main(clients, requests_per_client, workers):
+    print(f"{clients} clients x {requests_per_client} requests, {workers} workers, {os.cpu_count()} CPUs")
+    print(f"{'mode':<10}{'req/s':>8}{'p50 ms':>9}{'p99 ms':>9}{'ok':>6}{'429':>6}{'timeout':>9}")
+    report("inline", *load(lambda action, code: run_job(action, code, "python"), clients, requests_per_client))
+
+    pool = WorkerPool(workers, queue_size=2 * workers, timeout=2.0)
+    pool.warm_up()
+    try:
+        report("pool", *load(lambda action, code: pool.submit(action, code, "python"), clients,
+                             requests_per_client))
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(args[0] if len(args) > 0 else 8, args[1] if len(args) > 1 else 25,
+         args[2] if len(args) > 2 else os.cpu_count() or 1)
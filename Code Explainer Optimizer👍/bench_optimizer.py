@@ -0,0 +1,103 @@
+"""
+Benchmark: the optimizer's PassManager on generated modules of growing
+size, incremental (later rounds revisit only changed units, only those are
+regenerated) against visiting every unit in every round and regenerating
+the whole file. Checks that both make the same changes, and that every
+function of the optimized module returns what the original one does.
+
+Usage:
+    python bench_optimizer.py           # 1000, 5000, 10000 and 20000 line modules
+    python bench_optimizer.py 50000     # custom sizes
+"""
+import ast
+import sys
+import time
+
+from analysis.context import format_code
+from analysis.optimizer import PassManager, comment_lines, splice
+
+HEADER = '''import math
+
+
+'''
+
+# 40 lines; every other block is already as fast as the passes can make it
+FUNCTIONS = '''def evens_{i}(xs):
+    """Square roots of the even values"""
+    out = []
+    for x in xs:
+        if x % 2 == 0:
+            out.append(math.sqrt(x))
+    return out
+
+
+def label_{i}(items):
+    s = "#"
+    for item in items:
+        s += str(item)
+    return s
+
+
+def classify_{i}(values, strict):
+    kept = []
+    for v in values:
+        kept.append(math.floor(v))
+        if v in [1, 2, 3] and strict == True:
+            kept.append(-v)
+    return kept
+
+
+def untouched_{i}(values):
+    # nothing for the passes here
+    total = 0
+    for v in values:
+        total = total + v * {i}
+    return total
+
+
+def count_{i}(values):
+    return sum(1 for v in values if v > {i})
+
+
+'''
+
+SAMPLE = [4, 1, 2, 3, 9, 16, 2.5, 0]
+
+
+def optimized(formatted, incremental):
+    """(source, changes, rounds, seconds in passes, seconds writing the source)"""
+    tree = ast.parse(formatted)
+    start = time.perf_counter()
+    changes, changed_units, rounds = PassManager(incremental=incremental).run(tree, comment_lines(formatted))
+    passes = time.perf_counter() - start
+    if incremental:
+        source = splice(formatted, tree, changed_units)
+    else:
+        source = format_code(ast.unparse(tree))
+    return source, changes, rounds, passes, time.perf_counter() - start - passes
+
+
+def results(source):
+    namespace = {}
+    exec(compile(source, "<bench>", "exec"), namespace)
+    return {name: (f(SAMPLE, True) if name.startswith("classify") else f(SAMPLE))
+            for name, f in namespace.items() if callable(f) and name.split("_")[0] in
+            ("evens", "label", "classify", "untouched", "count")}
+
+
+def main(sizes):
+    # Black on the input is the same for both and left out
+    print(f"{'lines':>7}{'changes':>9}{'rounds':>8}{'full passes/write s':>21}"
+          f"{'incremental passes/write s':>28}{'passes us/line':>16}")
+    for lines in sizes:
+        code = format_code(HEADER + "".join(FUNCTIONS.format(i=i) for i in range(lines // 40)))
+        full_source, full_changes, _, full_passes, full_write = optimized(code, False)
+        source, changes, rounds, passes, write = optimized(code, True)
+        assert changes == full_changes, "incremental runs made different changes"
+        assert results(source) == results(code) == results(full_source), "optimizing changed behaviour"
+        print(f"{lines:>7}{len(changes):>9}{rounds:>8}{f'{full_passes:.2f}/{full_write:.2f}':>21}"
+              f"{f'{passes:.2f}/{write:.2f}':>28}{passes / lines * 1e6:>16.1f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1000, 5000, 10000, 20000])
@@ -0,0 +1,94 @@
+"""
+Benchmark: explain + optimize of one submission the way app.py used to run
+them (Black twice, three parses, a new Pygments lexer per call) against one
+shared AnalysisContext, and against a repeat served by the ResultCache.
+Checks that both pipelines return the same explanation and formatting (the
+optimized source is no longer astor's regeneration of the whole file).
+
+Usage:
+    python bench_pipeline.py            # 200, 1000 and 5000 line modules
+    python bench_pipeline.py 20000      # custom sizes
+"""
+import ast
+import sys
+import time
+
+from black import FileMode, format_str
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import PythonLexer
+from radon.complexity import cc_visit
+
+from analysis.context import AnalysisContext, ResultCache, content_key
+from analysis.explainer import explain_code
+from analysis.optimizer import SimplifyIfTrue, optimize_code
+
+FUNCTION = '''def handler_{i}(request, retries=3):
+    """Handle request {i}"""
+    value = compute(request,retries)
+    for item in value.items():
+        if item.active == True:
+            total = item.weight*scale
+    return value
+
+'''
+
+
+def legacy_pipeline(code):
+    """/api/explain then /api/optimize as app.py ran them before the shared context"""
+    tree = ast.parse(code)
+    functions = [node.name for node in ast.walk(tree) if isinstance(node, ast.FunctionDef)]
+    complexity = cc_visit(code)
+    highlight(code, PythonLexer(), HtmlFormatter(nowrap=True))
+    formatted = format_str(code, mode=FileMode())
+    formatted_again = format_str(formatted, mode=FileMode())
+    import astor
+    optimized = astor.to_source(ast.fix_missing_locations(SimplifyIfTrue().visit(ast.parse(formatted_again))))
+    return functions, [c.complexity for c in complexity], formatted, optimized
+
+
+def shared_pipeline(code):
+    context = AnalysisContext(code)
+    explanation = explain_code(code, context=context)
+    optimized = optimize_code(code, context=context)
+    return ([f["name"] for f in explanation["functions"]], [c["complexity"] for c in explanation["complexity"]],
+            context.formatted, optimized)
+
+
+def cached_pipeline(code, cache):
+    results = []
+    for action, run in (("explain", lambda: explain_code(code)), ("optimize", lambda: optimize_code(code))):
+        key = content_key(action, code)
+        result = cache.get(key)
+        if result is None:
+            result = run()
+            cache.put(key, result)
+        results.append(result)
+    return results
+
+
+def timed(run, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return value, best
+
+
+def main(sizes):
+    print(f"{'lines':>7}{'legacy s':>10}{'shared s':>10}{'speedup':>9}{'repeat ms':>11}")
+    for lines in sizes:
+        code = "".join(FUNCTION.format(i=i) for i in range(lines // 8))
+        expected, legacy = timed(lambda: legacy_pipeline(code))
+        result, shared = timed(lambda: shared_pipeline(code))
+        assert result[:3] == expected[:3], "the shared context changed the results"
+        cache = ResultCache()
+        cached_pipeline(code, cache)
+        _, repeat = timed(lambda: cached_pipeline(code, cache))
+        print(f"{lines:>7}{legacy:>10.3f}{shared:>10.3f}{legacy / shared:>9.2f}{repeat * 1000:>11.3f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [200, 1000, 5000])
@@ -0,0 +1,91 @@
+"""
+Benchmark: /api/stats computed from the raw usage events (what app.py used
+to do, plus exact percentiles from a scan of every latency) against the
+per-minute/per-hour rollups rebuilt from them, on mongomock. Checks that the counts agree,
+that every rollup percentile is within 1 / SUB_BUCKETS of the exact one,
+and that a window cutting through hours counts exactly the events in it.
+
+Usage:
+    python bench_stats.py                # 10000 events over 48 hours
+    python bench_stats.py 50000 168
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import mongomock
+
+from rollups import PERCENTILES, SUB_BUCKETS, Rollups
+
+
+def synthetic_events(n_events, hours, seed=0):
+    rng = random.Random(seed)
+    # recent, or the minute documents would already have expired
+    end = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    start = end - timedelta(hours=hours)
+    span = (end - start).total_seconds()
+    events = []
+    for _ in range(n_events):
+        events.append({
+            "timestamp": start + timedelta(seconds=rng.random() * span),
+            "language": rng.choice(["python", "python", "python", "javascript"]),
+            "code_size": rng.randrange(50, 20000),
+            "action": rng.choice(["explain", "optimize"]),
+            "success": rng.random() > 0.03,
+            # mostly fast, with a long tail
+            "latency_ms": int(rng.lognormvariate(3.5, 1.0)),
+        })
+    return sorted(events, key=lambda e: e["timestamp"]), start, end
+
+
+def raw_stats(collection, since=None, until=None):
+    match = {}
+    if since or until:
+        match["timestamp"] = {k: v for k, v in (("$gte", since), ("$lt", until)) if v}
+    total = collection.count_documents(match)
+    actions = {doc["_id"]: doc["count"] for doc in collection.aggregate(
+        [{"$match": match}, {"$group": {"_id": "$action", "count": {"$sum": 1}}}])}
+    latencies = sorted(doc["latency_ms"] for doc in collection.find(match, {"latency_ms": 1}))
+    exact = {f"p{p}": latencies[max(1, -(-len(latencies) * p // 100)) - 1] for p in PERCENTILES}
+    return total, actions, exact
+
+
+def main(n_events, hours):
+    events, start, end = synthetic_events(n_events, hours)
+    db = mongomock.MongoClient().db
+    db.usage_records.insert_many([dict(e) for e in events])
+    rollups = Rollups(db.usage_rollups)
+    # what `flask init-db` does on deploy; the EventWriter's batches of live
+    # events upsert into the same documents
+    begin = time.perf_counter()
+    rollups.rebuild(db.usage_records)
+    print(f"{n_events} events over {hours} hours: {db.usage_rollups.count_documents({}) - 1} rollup documents,"
+          f" rebuilt from the usage records in {time.perf_counter() - begin:.1f}s")
+    print(f"{'window':<22}{'raw ms':>9}{'rollup ms':>11}{'requests':>10}" +
+          "".join(f"{f'p{p} exact/rollup':>20}" for p in PERCENTILES))
+
+    windows = [("everything", None, None),
+               ("last 90 minutes", end - timedelta(minutes=90), None),
+               ("6h at :17 to :43", start + timedelta(hours=3, minutes=17), start + timedelta(hours=9, minutes=43))]
+    for name, since, until in windows:
+        begin = time.perf_counter()
+        total, actions, exact = raw_stats(db.usage_records, since, until)
+        raw_ms = (time.perf_counter() - begin) * 1000
+        begin = time.perf_counter()
+        stats = rollups.stats(since, until or end)
+        rollup_ms = (time.perf_counter() - begin) * 1000
+        assert stats["count"] == total, (stats["count"], total)
+        assert {a: s["count"] for a, s in stats["by_action"].items()} == actions
+        columns = ""
+        for p in PERCENTILES:
+            value = stats["latency_ms"][f"p{p}"]
+            assert exact[f"p{p}"] <= value <= exact[f"p{p}"] * (1 + 1 / SUB_BUCKETS), (p, exact, value)
+            pair = f"{exact[f'p{p}']}/{value}"
+            columns += f"{pair:>20}"
+        print(f"{name:<22}{raw_ms:>9.0f}{rollup_ms:>11.1f}{total:>10}" + columns)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 48)
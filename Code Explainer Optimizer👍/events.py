@@ -0,0 +1,133 @@
+"""
+Usage events written to Mongo off the request path.
+
+emit() appends the event to an in-process buffer and returns; a background
+thread writes the buffer with insert_many once batch_size events are
+waiting or flush_interval seconds have passed. When the buffer is full,
+emit waits up to block_timeout for room (backpressure) and then drops the
+event, counting it. close() writes whatever is left. Given rollups
+(rollups.Rollups), every batch written is also folded into them.
+
+    events = EventWriter(db["usage_records"])
+    events.emit({"action": "explain", ...})
+    events.close()
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+
+class EventWriter:
+    def __init__(self, collection, batch_size=100, flush_interval=1.0, max_buffer=10000, block_timeout=0.05,
+                 rollups=None):
+        self.collection = collection
+        self.rollups = rollups
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.block_timeout = block_timeout
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        # events taken from the buffer and not yet written
+        self._in_flight = 0
+        self._flush_requested = False
+        self._closed = False
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self._thread = threading.Thread(target=self._run, name="usage-event-writer", daemon=True)
+        self._thread.start()
+
+    def emit(self, event):
+        """Queue an event; False when it was dropped because the buffer stayed full"""
+        with self._cond:
+            if self._closed:
+                self.dropped += 1
+                return False
+            if len(self._buffer) >= self.max_buffer:
+                self._cond.notify_all()
+                deadline = time.monotonic() + self.block_timeout
+                while len(self._buffer) >= self.max_buffer and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.dropped += 1
+                        return False
+                    self._cond.wait(remaining)
+                if self._closed:
+                    self.dropped += 1
+                    return False
+            self._buffer.append(event)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+            return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while (len(self._buffer) < self.batch_size and not self._flush_requested
+                       and not self._closed):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if not self._buffer:
+                    self._flush_requested = False
+                    self._cond.notify_all()
+                    if self._closed:
+                        return
+                    continue
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                self._in_flight = len(batch)
+                # room for emitters waiting on a full buffer
+                self._cond.notify_all()
+            self._write(batch)
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+
+    def _write(self, batch):
+        try:
+            self.collection.insert_many(batch, ordered=False)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception:
+            # usage records are best effort: a failed batch is counted, not retried
+            self.failed += len(batch)
+            log.exception("writing %d usage events failed", len(batch))
+        if self.rollups is not None:
+            try:
+                self.rollups.add(batch)
+            except Exception:
+                log.exception("updating rollups with %d usage events failed", len(batch))
+
+    def flush(self, timeout=5.0):
+        """Write everything emitted so far; True when done within timeout"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._buffer or self._in_flight:
+                self._flush_requested = True
+                self._cond.notify_all()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._thread.is_alive():
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def close(self, timeout=5.0):
+        """Stop taking events, write the ones buffered and stop the writer thread"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            return {"buffered": len(self._buffer) + self._in_flight, "written": self.written,
+                    "dropped": self.dropped, "failed": self.failed, "batches": self.batches}
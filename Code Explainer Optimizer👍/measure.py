@@ -0,0 +1,272 @@
+"""
+Measure what the optimizer's rewrite of a function buys.
+
+measure() runs one function of the submitted source and of its optimized
+source on sample inputs, in a fresh Python process that is sandboxed before
+it runs any submitted code:
+
+- it is in namespaces of its own (unshare): no network (an empty network
+  namespace), no other processes to see or signal (its own PID namespace),
+  killed with the namespace when the wall clock runs out
+- its root is an empty, read-only tmpfs holding read-only bind mounts of
+  the Python installation and the system libraries, and nothing else
+- it runs as nobody (uid 65534) with no capabilities and no_new_privs; an
+  app that is not root already is unprivileged, in a user namespace
+- it limits its CPU time and address space, and writes no files (rlimits)
+- an audit hook refuses sockets, subprocesses, signals, ctypes and writes
+  to the filesystem, as a second line behind the above
+
+It needs Linux with util-linux (unshare, setpriv); without them measure()
+raises MeasurementError instead of running anything. The process times both
+versions, repeat after repeat, alternating between them, on fresh inputs
+for every call, built outside the timed region, and takes the peak memory
+of each call with tracemalloc; the app turns the samples into a speedup and
+a memory delta with 95% bootstrap confidence intervals.
+
+    options = measure_options({"function": "evens", "inputs": [[[1, 2, 3]], [[]]]})
+    measurement = measure(code, optimized, **options)
+    measurement["speedup"], measurement["speedup_ci95"]
+"""
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+
+BOOTSTRAP_RESAMPLES = 2000
+
+MAX_REPEAT = 30
+
+# uid and gid the measuring process runs as, when the app is root
+NOBODY = 65534
+
+# Where the sandbox's commands (mount, chroot, setpriv, env) are looked up
+SANDBOX_PATH = "/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin"
+
+# Read-only in the sandbox, with the Python installation; symlinks are copied as symlinks
+SYSTEM_PATHS = ("/usr", "/bin", "/lib", "/lib32", "/lib64", "/libx32")
+
+# Run by sh in the new namespaces as their root: builds the sandbox's file
+# system and runs the runner in it as an unprivileged user.
+# Arguments: python, runner, uid (empty to keep the current one), paths to expose
+SANDBOX = r'''
+set -eu
+python=$1 runner=$2 uid=$3
+shift 3
+mount --make-rprivate /
+root=/tmp
+mount -t tmpfs -o mode=755,size=1m,nosuid,nodev sandbox "$root"
+for path in "$@"; do
+    if [ -L "$path" ]; then
+        mkdir -p "$root$(dirname "$path")"
+        ln -s "$(readlink "$path")" "$root$path"
+    elif [ -d "$path" ]; then
+        mkdir -p "$root$path"
+        mount --rbind "$path" "$root$path"
+        mount -o remount,bind,ro,nosuid,nodev "$root$path"
+    fi
+done
+mount -o remount,ro "$root"
+set -- --clear-groups --no-new-privs --inh-caps=-all --bounding-set=-all
+if [ -n "$uid" ]; then
+    set -- --reuid="$uid" --regid="$uid" "$@"
+fi
+exec chroot "$root" setpriv "$@" -- env -i "$python" -I -c "$runner"
+'''
+
+# Run in the child; reads the spec as JSON from stdin, writes the samples as JSON to stdout
+RUNNER = r'''
+import gc, io, json, os, resource, sys, time, tracemalloc
+
+spec = json.load(sys.stdin)
+resource.setrlimit(resource.RLIMIT_CPU, (spec["cpu_seconds"], spec["cpu_seconds"]))
+if spec["memory_bytes"]:
+    resource.setrlimit(resource.RLIMIT_AS, (spec["memory_bytes"], spec["memory_bytes"]))
+resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+out = os.fdopen(os.dup(1), "w")
+# what the submitted code prints is not ours to parse
+sys.stdout = sys.stderr = io.StringIO()
+
+DENIED = ("socket.", "subprocess.", "os.system", "os.exec", "os.posix_spawn", "os.spawn", "os.fork",
+          "os.forkpty", "os.kill", "os.killpg", "signal.pthread_kill", "ctypes.", "os.remove", "os.rmdir",
+          "os.rename", "os.truncate", "os.chmod", "os.chown", "os.chflags", "os.mkdir", "os.link",
+          "os.symlink", "os.utime", "os.setxattr", "os.removexattr", "shutil.", "sys.remote_exec")
+DENIED_MODULES = {"ctypes", "_ctypes", "_posixsubprocess", "_xxsubinterpreters", "_interpreters"}
+WRITE_FLAGS = os.O_WRONLY | os.O_RDWR | os.O_APPEND | os.O_CREAT | os.O_TRUNC
+
+
+def audit(event, args):
+    if event.startswith(DENIED):
+        raise PermissionError(f"{event} is not allowed while measuring")
+    if event == "import" and args[0].partition(".")[0] in DENIED_MODULES:
+        raise PermissionError(f"importing {args[0]} is not allowed while measuring")
+    if event == "open":
+        mode, flags = args[1], args[2]
+        if (isinstance(mode, str) and set(mode) & set("wax+")) or (isinstance(flags, int) and flags & WRITE_FLAGS):
+            raise PermissionError("writing files is not allowed while measuring")
+
+
+sys.addaudithook(audit)
+encoded = json.dumps(spec["inputs"])
+
+
+def load(source):
+    namespace = {"__name__": "__measured__"}
+    exec(compile(source, "<submitted>", "exec"), namespace)
+    function = namespace.get(spec["function"])
+    if not callable(function):
+        raise LookupError(f"no function {spec['function']!r}")
+    return function
+
+
+def timed(f, number):
+    """Seconds number runs of f take, a run being a call per argument list, each on inputs of its own"""
+    # built before the clock starts, so neither the copying nor what a call
+    # does to its arguments carries over into the time of another call
+    runs = [json.loads(encoded) for _ in range(number)]
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for run in runs:
+            for args in run:
+                f(*args)
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+try:
+    functions = [load(spec["original"]), load(spec["optimized"])]
+    results = [repr([f(*args) for args in json.loads(encoded)]) for f in functions]
+    # enough calls that the slower version takes at least min_seconds a timing
+    number = 1
+    while max(timed(f, number) for f in functions) < spec["min_seconds"]:
+        number *= 2
+    times = [[], []]
+    for _ in range(spec["repeat"]):
+        for version, f in enumerate(functions):
+            times[version].append(timed(f, number) / number)
+    tracemalloc.start()
+    peaks = [[], []]
+    for _ in range(spec["repeat"]):
+        for version, f in enumerate(functions):
+            peak = 0
+            for args in json.loads(encoded):
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                f(*args)
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+            peaks[version].append(peak)
+    tracemalloc.stop()
+    reply = {"number": number, "times": times, "peaks": peaks, "same_results": results[0] == results[1]}
+except MemoryError:
+    reply = {"error": "memory limit exceeded"}
+except BaseException as e:
+    reply = {"error": f"{type(e).__name__}: {e}"}
+out.write(json.dumps(reply))
+out.flush()
+'''
+
+
+class MeasurementError(Exception):
+    """The function could not be measured; the message says why"""
+
+
+def measure_options(spec):
+    """
+    The function, inputs and repeat of a "measure" request, checked before
+    anything is run; MeasurementError says what is wrong with them
+    """
+    if not isinstance(spec, dict):
+        raise MeasurementError("measure must be an object")
+    function = spec.get("function")
+    if not isinstance(function, str) or not function.isidentifier():
+        raise MeasurementError("measure.function must be the name of a function")
+    inputs = spec.get("inputs")
+    if not isinstance(inputs, list) or not inputs or not all(isinstance(args, list) for args in inputs):
+        raise MeasurementError("measure.inputs must be a non-empty list of argument lists")
+    repeat = spec.get("repeat", 7)
+    if isinstance(repeat, bool) or not isinstance(repeat, int) or not 2 <= repeat <= MAX_REPEAT:
+        raise MeasurementError(f"measure.repeat must be a whole number from 2 to {MAX_REPEAT}")
+    return {"function": function, "inputs": inputs, "repeat": repeat}
+
+
+def sandbox_command():
+    """The command that runs the runner in the sandbox, or MeasurementError when it cannot be built"""
+    tools = {name: shutil.which(name, path=SANDBOX_PATH) for name in ("timeout", "unshare", "sh", "setpriv", "chroot")}
+    if not sys.platform.startswith("linux") or not all(tools.values()):
+        raise MeasurementError("measuring needs Linux with unshare and setpriv (util-linux)")
+    paths = sorted({path for path in SYSTEM_PATHS if os.path.lexists(path)} |
+                   {sys.base_prefix, sys.prefix, os.path.dirname(os.path.realpath(sys.executable))})
+    if os.geteuid() == 0:
+        namespaces, uid = [], str(NOBODY)
+    else:
+        # an unprivileged app maps itself to root of a user namespace of its own
+        namespaces, uid = ["--user", "--map-root-user"], ""
+    return [tools["unshare"], *namespaces, "--mount", "--net", "--pid", "--ipc", "--uts", "--fork",
+            "--kill-child", tools["sh"], "-c", SANDBOX, "sandbox", os.path.realpath(sys.executable), RUNNER,
+            uid, *paths]
+
+
+def measure(original, optimized, function, inputs, repeat=7, min_seconds=0.05, timeout=10.0,
+            memory_bytes=512 * 1024 * 1024):
+    """
+    Speedup and memory delta of function in optimized over original.
+    inputs is a list of positional argument lists, each a call; every
+    timing covers one call per argument list, enough times to last at least
+    min_seconds. timeout bounds the process's wall clock and CPU time.
+    """
+    options = measure_options({"function": function, "inputs": inputs, "repeat": repeat})
+    spec = {"original": original, "optimized": optimized, **options, "min_seconds": min_seconds,
+            "cpu_seconds": max(1, int(timeout)), "memory_bytes": memory_bytes}
+    command = sandbox_command()
+    # timeout(1) kills the namespace on time even if whoever waits for it is gone
+    command = [shutil.which("timeout", path=SANDBOX_PATH), "-s", "KILL", f"{timeout:g}", *command]
+    try:
+        done = subprocess.run(command, input=json.dumps(spec), capture_output=True, text=True,
+                              timeout=timeout + 1, env={"PATH": SANDBOX_PATH})
+    except subprocess.TimeoutExpired:
+        raise MeasurementError(f"measurement took longer than {timeout:g}s")
+    try:
+        reply = json.loads(done.stdout)
+    except ValueError:
+        # killed by a limit, or the sandbox could not be set up
+        if done.returncode in (124, 137, -9):
+            raise MeasurementError(f"measurement took longer than {timeout:g}s")
+        detail = done.stderr.strip().splitlines()[-1:] if done.stderr else []
+        raise MeasurementError(f"measurement process failed (exit status {done.returncode})"
+                               + (f": {detail[0]}" if detail else ""))
+    if "error" in reply:
+        raise MeasurementError(reply["error"])
+    return summarize(function, reply)
+
+
+def summarize(function, reply):
+    """The measurement app.py returns, from the child's samples"""
+    (original_times, optimized_times), (original_peaks, optimized_peaks) = reply["times"], reply["peaks"]
+    return {
+        "function": function,
+        "same_results": reply["same_results"],
+        "repeat": len(original_times),
+        "number": reply["number"],
+        "time_per_run_us": {"original": round(statistics.fmean(original_times) * 1e6, 3),
+                            "optimized": round(statistics.fmean(optimized_times) * 1e6, 3)},
+        "speedup": round(statistics.fmean(original_times) / statistics.fmean(optimized_times), 3),
+        "speedup_ci95": [round(v, 3) for v in bootstrap(
+            original_times, optimized_times, lambda a, b: statistics.fmean(a) / statistics.fmean(b))],
+        "peak_memory_bytes": {"original": round(statistics.fmean(original_peaks)),
+                              "optimized": round(statistics.fmean(optimized_peaks))},
+        "memory_delta_bytes": round(statistics.fmean(optimized_peaks) - statistics.fmean(original_peaks)),
+        "memory_delta_ci95": [round(v) for v in bootstrap(
+            original_peaks, optimized_peaks, lambda a, b: statistics.fmean(b) - statistics.fmean(a))],
+    }
+
+
+def bootstrap(a, b, statistic, resamples=BOOTSTRAP_RESAMPLES, seed=0):
+    """95% percentile-bootstrap interval of statistic(a, b), resampling a and b independently"""
+    rng = random.Random(seed)
+    values = sorted(statistic(rng.choices(a, k=len(a)), rng.choices(b, k=len(b))) for _ in range(resamples))
+    return values[int(resamples * 0.025)], values[int(resamples * 0.975) - 1]
@@ -0,0 +1,256 @@
+"""
+Per-minute and per-hour usage rollups, kept up to date by the EventWriter.
+
+Every batch of usage events is folded into one document per (resolution,
+period start, action, language) holding the request and error counts, the
+code size and latency sums and a latency histogram, with $inc upserts;
+/api/stats reads these documents and never the raw events. rebuild() folds
+every stored usage record into them from scratch, for the rollups of a
+database that kept usage records before they existed; ensure() does it once
+per ROLLUPS_VERSION and is run by `flask init-db`.
+
+The histogram is log-linear, as in HdrHistogram: latencies below
+SUB_BUCKETS ms have a bucket each, and above that every power of two is
+split into SUB_BUCKETS buckets, so a percentile is off by at most
+1 / SUB_BUCKETS of its value whatever the range of latencies.
+"""
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, UpdateOne
+
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+# Minute documents are only read for the ragged ends of a window
+MINUTE_RETENTION = timedelta(days=7)
+
+PERCENTILES = (50, 95, 99)
+
+# Stamped on the rollups by rebuild(); bump it when what they count changes
+ROLLUPS_VERSION = 1
+META_ID = "meta"
+
+# Usage records read, and rollup documents written, per round trip by rebuild()
+REBUILD_BATCH = 1000
+
+
+def latency_bucket(ms):
+    """Histogram bucket of a latency in milliseconds"""
+    ms = max(int(ms), 0)
+    if ms < SUB_BUCKETS:
+        return ms
+    shift = ms.bit_length() - SUB_BUCKET_BITS - 1
+    return SUB_BUCKETS * (shift + 1) + (ms >> shift) - SUB_BUCKETS
+
+
+def bucket_bounds(bucket):
+    """(lowest, highest) latency in ms that falls in bucket"""
+    if bucket < SUB_BUCKETS:
+        return bucket, bucket
+    shift = bucket // SUB_BUCKETS - 1
+    sub = bucket % SUB_BUCKETS + SUB_BUCKETS
+    return sub << shift, ((sub + 1) << shift) - 1
+
+
+def percentile(histogram, p, maximum=None):
+    """
+    Latency at percentile p of histogram ({bucket: count}): the highest value
+    of the bucket holding it, never above maximum
+    """
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = max(1, -(-total * p // 100))
+    seen = 0
+    for bucket in sorted(histogram):
+        seen += histogram[bucket]
+        if seen >= rank:
+            value = bucket_bounds(bucket)[1]
+            return min(value, maximum) if maximum is not None else value
+    return None
+
+
+def period_start(timestamp, resolution):
+    if resolution == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def _fold(events, totals):
+    """Add events to totals, {(resolution, start, action, language): counts}"""
+    for event in events:
+        timestamp = event.get("timestamp") or datetime.utcnow()
+        latency = event.get("latency_ms", 0)
+        for resolution in ("minute", "hour"):
+            key = (resolution, period_start(timestamp, resolution), event.get("action"), event.get("language"))
+            total = totals[key]
+            total["count"] += 1
+            total["errors"] += 0 if event.get("success", True) else 1
+            total["code_size"] += event.get("code_size", 0)
+            total["latency_ms"] += latency
+            total["latency_max"] = max(total["latency_max"], latency)
+            total["histogram"][latency_bucket(latency)] += 1
+    return totals
+
+
+def _totals():
+    return defaultdict(lambda: {"count": 0, "errors": 0, "code_size": 0, "latency_ms": 0,
+                                "latency_max": 0, "histogram": defaultdict(int)})
+
+
+def _key_fields(key):
+    """(_id, the fields set when the document is created) of a rollup document"""
+    resolution, start, action, language = key
+    document = {"resolution": resolution, "start": start, "action": action, "language": language}
+    if resolution == "minute":
+        document["expire_at"] = start + MINUTE_RETENTION
+    return f"{resolution}|{start:%Y-%m-%dT%H:%M}|{action}|{language}", document
+
+
+class Rollups:
+    def __init__(self, collection):
+        self.collection = collection
+        self._indexed = False
+        self._lock = threading.Lock()
+
+    def _ensure_indexes(self):
+        # on first use rather than on import, where Mongo may not be up yet
+        if self._indexed:
+            return
+        with self._lock:
+            if not self._indexed:
+                self.collection.create_index([("resolution", ASCENDING), ("start", ASCENDING)])
+                # minute documents carry expire_at; hour documents are kept
+                self.collection.create_index("expire_at", expireAfterSeconds=0)
+                self._indexed = True
+
+    def add(self, events):
+        """Fold usage events into the minute and hour documents they belong to"""
+        self._ensure_indexes()
+        # a batch spans a minute or two, so this is a handful of upserts
+        updates = []
+        for key, total in _fold(events, _totals()).items():
+            _id, document = _key_fields(key)
+            increments = {field: total[field] for field in ("count", "errors", "code_size", "latency_ms")}
+            increments.update((f"histogram.{bucket}", count) for bucket, count in total["histogram"].items())
+            updates.append(UpdateOne(
+                {"_id": _id},
+                {"$inc": increments, "$max": {"latency_max": total["latency_max"]}, "$setOnInsert": document},
+                upsert=True))
+        if updates:
+            self.collection.bulk_write(updates, ordered=False)
+
+    def rebuild(self, source):
+        """
+        Replace the rollups with ones folded from every usage record in
+        source; returns how many records that was. Records written while it
+        runs may be missed or counted twice, so run it before the app takes
+        traffic.
+        """
+        totals = _totals()
+        records = 0
+        batch = []
+        for event in source.find({}, {"_id": 0}, batch_size=REBUILD_BATCH):
+            batch.append(event)
+            if len(batch) == REBUILD_BATCH:
+                _fold(batch, totals)
+                records += len(batch)
+                batch = []
+        _fold(batch, totals)
+        records += len(batch)
+        now = datetime.utcnow()
+        documents = []
+        for key, total in totals.items():
+            _id, document = _key_fields(key)
+            if document.get("expire_at", now) < now:
+                # the TTL index would only delete it again
+                continue
+            documents.append({"_id": _id, **document, **{field: total[field] for field in
+                              ("count", "errors", "code_size", "latency_ms", "latency_max")},
+                              "histogram": {str(bucket): count for bucket, count in total["histogram"].items()}})
+        self.collection.delete_many({})
+        for i in range(0, len(documents), REBUILD_BATCH):
+            self.collection.insert_many(documents[i:i + REBUILD_BATCH], ordered=False)
+        self.collection.insert_one({"_id": META_ID, "version": ROLLUPS_VERSION, "records": records,
+                                    "rebuilt_at": now})
+        # indexes after the bulk load rather than kept up through it
+        self._ensure_indexes()
+        return records
+
+    def ensure(self, source):
+        """Rebuild from source unless this ROLLUPS_VERSION already did; True when it rebuilt"""
+        self._ensure_indexes()
+        meta = self.collection.find_one({"_id": META_ID})
+        if meta is not None and meta.get("version") == ROLLUPS_VERSION:
+            return False
+        self.rebuild(source)
+        return True
+
+    def _documents(self, since, until):
+        """Rollup documents covering [since, until): hours where whole, minutes at the ends"""
+        if since is None:
+            query = {"resolution": "hour"}
+            if until is not None:
+                query["start"] = {"$lt": until}
+            return list(self.collection.find(query))
+        until = until or datetime.utcnow()
+        since = period_start(since, "minute")
+        first_hour = period_start(since + timedelta(minutes=59), "hour")
+        last_hour = period_start(until, "hour")
+        if first_hour >= last_hour:
+            return list(self.collection.find({"resolution": "minute", "start": {"$gte": since, "$lt": until}}))
+        return list(self.collection.find({"$or": [
+            {"resolution": "minute", "start": {"$gte": since, "$lt": first_hour}},
+            {"resolution": "hour", "start": {"$gte": first_hour, "$lt": last_hour}},
+            {"resolution": "minute", "start": {"$gte": last_hour, "$lt": until}},
+        ]}))
+
+    def stats(self, since=None, until=None):
+        """
+        Counts, average code size and latency percentiles of the requests in
+        [since, until) (all of them without since), overall and by action and
+        language
+        """
+        overall = _Summary()
+        by_action = defaultdict(_Summary)
+        by_language = defaultdict(_Summary)
+        for document in self._documents(since, until):
+            for summary in (overall, by_action[document["action"]], by_language[document["language"]]):
+                summary.add(document)
+        return {
+            **overall.to_dict(),
+            "by_action": {action: summary.to_dict() for action, summary in by_action.items()},
+            "by_language": {language: summary.to_dict() for language, summary in by_language.items()},
+        }
+
+
+class _Summary:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.code_size = 0
+        self.latency_ms = 0
+        self.latency_max = 0
+        self.histogram = defaultdict(int)
+
+    def add(self, document):
+        self.count += document.get("count", 0)
+        self.errors += document.get("errors", 0)
+        self.code_size += document.get("code_size", 0)
+        self.latency_ms += document.get("latency_ms", 0)
+        self.latency_max = max(self.latency_max, document.get("latency_max", 0))
+        for bucket, count in document.get("histogram", {}).items():
+            self.histogram[int(bucket)] += count
+
+    def to_dict(self):
+        latency = {f"p{p}": percentile(self.histogram, p, self.latency_max) for p in PERCENTILES}
+        latency["avg"] = round(self.latency_ms / self.count, 1) if self.count else None
+        latency["max"] = self.latency_max if self.count else None
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_code_size": int(self.code_size / self.count) if self.count else 0,
+            "latency_ms": latency,
+        }
@@ -25,6 +25,7 @@ document.getElementById('optimize').addEventListener('click', async () => {
   if (js.error) {
     document.getElementById('optimized').textContent = "Error: " + js.error;
   } else {
-    document.getElementById('optimized').textContent = js.optimized || js.formatted || '';
+    const changes = (js.changes || []).map(c => `# line ${c.lineno}: ${c.message}`).join('\n');
+    document.getElementById('optimized').textContent = (changes ? changes + '\n\n' : '') + (js.optimized || js.formatted || '');
   }
 });
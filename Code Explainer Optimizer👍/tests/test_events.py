@@ -0,0 +1,86 @@
+# Unit tests for the batched usage event writer (requires pytest, mongomock)
+import threading
+
+import mongomock
+
+from events import EventWriter
+
+
+class RecordingCollection:
+    """A mongomock collection that remembers the size of every insert_many"""
+
+    def __init__(self):
+        self.collection = mongomock.MongoClient().db.usage_records
+        self.batches = []
+
+    def insert_many(self, documents, ordered=True):
+        self.batches.append(len(documents))
+        return self.collection.insert_many(documents, ordered=ordered)
+
+
+class StalledCollection:
+    """A collection whose writes hang until released"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def insert_many(self, documents, ordered=True):
+        self.started.set()
+        self.release.wait(10)
+
+
+def test_writes_in_batches():
+    collection = RecordingCollection()
+    # a long interval, so only full batches and the final flush write
+    events = EventWriter(collection, batch_size=10, flush_interval=60)
+    for i in range(25):
+        assert events.emit({"action": "explain", "i": i})
+    assert events.flush()
+    assert collection.batches[:2] == [10, 10]
+    assert sum(collection.batches) == 25
+    assert sorted(d["i"] for d in collection.collection.find()) == list(range(25))
+    assert events.stats()["written"] == 25
+    events.close()
+
+
+def test_close_writes_what_is_buffered():
+    collection = RecordingCollection()
+    events = EventWriter(collection, batch_size=100, flush_interval=60)
+    for i in range(7):
+        events.emit({"i": i})
+    events.close()
+    assert collection.collection.count_documents({}) == 7
+    # closed: further events are dropped, not written
+    assert not events.emit({"i": 7})
+    assert events.stats()["dropped"] == 1
+
+
+def test_drops_when_the_database_stalls():
+    collection = StalledCollection()
+    events = EventWriter(collection, batch_size=2, flush_interval=60, max_buffer=4, block_timeout=0.01)
+    assert events.emit({"i": 0}) and events.emit({"i": 1})
+    assert collection.started.wait(5)
+    # that batch is stuck in insert_many; four more fill the buffer behind it
+    accepted = [events.emit({"i": i}) for i in range(2, 20)]
+    assert accepted.count(True) == 4
+    stats = events.stats()
+    assert stats["dropped"] == 14
+    assert stats["buffered"] == 6
+    collection.release.set()
+    assert events.flush()
+    assert events.stats()["written"] == 6
+    events.close()
+
+
+def test_failed_batch_is_counted_not_retried():
+    class Failing:
+        def insert_many(self, documents, ordered=True):
+            raise RuntimeError("connection reset")
+
+    events = EventWriter(Failing(), batch_size=3, flush_interval=60)
+    for i in range(3):
+        events.emit({"i": i})
+    assert events.flush()
+    assert events.stats()["failed"] == 3
+    events.close()
@@ -0,0 +1,122 @@
+# Unit tests for measuring rewrites in the sandbox (requires pytest)
+import pytest
+
+import app as app_module
+from measure import MeasurementError, measure, measure_options
+
+
+def sandbox_available():
+    try:
+        measure("def f():\n    pass\n", "def f():\n    pass\n", "f", [[]], repeat=2, min_seconds=0)
+    except MeasurementError:
+        return False
+    return True
+
+
+needs_sandbox = pytest.mark.skipif(not sandbox_available(), reason="no unshare/setpriv sandbox here")
+
+
+@pytest.mark.parametrize("spec", [
+    None, [], {"inputs": [[1]]}, {"function": "f()", "inputs": [[1]]}, {"function": "f", "inputs": []},
+    {"function": "f", "inputs": [1]}, {"function": "f", "inputs": [[1]], "repeat": "x"},
+    {"function": "f", "inputs": [[1]], "repeat": True}, {"function": "f", "inputs": [[1]], "repeat": 1000},
+])
+def test_bad_options(spec):
+    with pytest.raises(MeasurementError):
+        measure_options(spec)
+
+
+def test_options():
+    assert measure_options({"function": "f", "inputs": [[1], []]}) == {"function": "f", "inputs": [[1], []],
+                                                                       "repeat": 7}
+
+
+@needs_sandbox
+def test_every_call_gets_fresh_inputs():
+    # would raise on the second call if it saw the list the first one emptied
+    code = ("def drain(xs):\n"
+            "    assert xs == [1, 2, 3]\n"
+            "    while xs:\n"
+            "        xs.pop(0)\n")
+    measurement = measure(code, code, "drain", [[[1, 2, 3]]], repeat=3, min_seconds=0.01)
+    assert measurement["same_results"]
+    assert measurement["number"] > 1
+
+
+@needs_sandbox
+def test_submitted_code_is_contained(tmp_path):
+    victim = tmp_path / "victim"
+    victim.write_text("kept")
+    code = ("import os, socket\n"
+            "\n"
+            "def attempts():\n"
+            f"    for attempt in (lambda: os.remove({str(victim)!r}),\n"
+            f"                    lambda: open({str(victim)!r}).read(),\n"
+            "                    lambda: open('/etc/passwd').read(),\n"
+            "                    lambda: os.kill(os.getppid(), 0),\n"
+            "                    lambda: socket.create_connection(('127.0.0.1', 27017), 1),\n"
+            "                    lambda: __import__('subprocess').run(['true'])):\n"
+            "        try:\n"
+            "            attempt()\n"
+            "        except Exception:\n"
+            "            continue\n"
+            "        raise AssertionError('not contained')\n")
+    measurement = measure(code, code, "attempts", [[]], repeat=2, min_seconds=0)
+    assert measurement["same_results"]
+    assert victim.read_text() == "kept"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    events = []
+    monkeypatch.setattr(app_module, "usage_events", type("Events", (), {"emit": staticmethod(events.append)}))
+    monkeypatch.setattr(app_module, "JOB_WORKERS", 0)
+    monkeypatch.setattr(app_module, "MEASURE_ENABLED", True)
+    return app_module.app.test_client(), events
+
+
+CODE = "def f(xs):\n    out = []\n    for x in xs:\n        out.append(x)\n    return out\n"
+
+
+def test_measuring_is_off_unless_enabled(client, monkeypatch):
+    client, events = client
+    monkeypatch.setattr(app_module, "MEASURE_ENABLED", False)
+    response = client.post("/api/optimize", json={"code": CODE, "measure": {"function": "f", "inputs": [[[1]]]}})
+    assert response.status_code == 400
+    assert len(events) == 1 and not events[0]["success"]
+
+
+@pytest.mark.parametrize("spec", [{"function": "f", "inputs": [[[1]]], "repeat": "x"}, "f", None])
+def test_bad_measure_is_a_400_and_one_event(client, spec):
+    client, events = client
+    response = client.post("/api/optimize", json={"code": CODE, "measure": spec})
+    assert response.status_code == 400
+    assert len(events) == 1 and not events[0]["success"]
+
+
+@needs_sandbox
+def test_measurement_in_the_response(client):
+    client, events = client
+    response = client.post("/api/optimize", json={"code": CODE, "measure": {"function": "f", "inputs": [[[1, 2]]],
+                                                                            "repeat": 2}})
+    assert response.status_code == 200
+    assert response.get_json()["measurement"]["same_results"]
+    assert len(events) == 1 and events[0]["success"]
+
+
+@pytest.mark.parametrize("error", [app_module.JobTimeout("job took longer than 10s"),
+                                   app_module.PoolSaturated("server busy")])
+def test_measure_job_failure_keeps_the_rewrite(client, monkeypatch, error):
+    client, events = client
+    run_job = app_module.run_job
+
+    def fail_measure(action, *args):
+        if action == "measure":
+            raise error
+        return run_job(action, *args)
+    monkeypatch.setattr(app_module, "run_job", fail_measure)
+    response = client.post("/api/optimize", json={"code": CODE, "measure": {"function": "f", "inputs": [[[1]]]}})
+    assert response.status_code == 200
+    assert "optimized" in response.get_json()
+    assert response.get_json()["measurement"] == {"error": str(error)}
+    assert len(events) == 1 and events[0]["success"]
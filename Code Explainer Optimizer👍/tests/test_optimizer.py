@@ -0,0 +1,229 @@
+# Unit tests for the optimizer's passes and pass manager (requires pytest)
+import ast
+import copy
+
+import pytest
+
+from analysis.optimizer import (ConcatToJoin, HoistAttributeLookups, LoopToComprehension, MembershipToSet,
+                                PassManager, SimplifyIfTrue, _LoopToExpression, optimize)
+
+
+def run(source, function, calls):
+    namespace = {}
+    exec(compile(source, "<test>", "exec"), namespace)
+    results = []
+    for args in calls:
+        try:
+            results.append(("ok", namespace[function](*copy.deepcopy(args))))
+        except Exception as e:
+            results.append(("raised", type(e).__name__))
+    return results
+
+
+def assert_same_behaviour(code, function, calls, passes=None):
+    """The optimized source, after checking every call returns or raises as the original does"""
+    result = optimize(code, passes=passes)
+    assert run(result.source, function, calls) == run(code, function, calls)
+    return result
+
+
+def pass_names(result):
+    return {change.pass_name for change in result.changes}
+
+
+def test_loop_to_comprehension():
+    code = ("def f(xs):\n"
+            "    out = []\n"
+            "    for x in xs:\n"
+            "        if x % 2:\n"
+            "            out.append(x * x)\n"
+            "    return out\n")
+    result = assert_same_behaviour(code, "f", [[[]], [[1, 2, 3]]], [LoopToComprehension()])
+    assert "for x in xs if x % 2]" in result.source
+    assert pass_names(result) == {"loop_to_comprehension"}
+
+
+def test_concat_to_join():
+    code = ("def f(xs):\n"
+            "    s = '#'\n"
+            "    for x in xs:\n"
+            "        s += str(x)\n"
+            "    return s\n")
+    result = assert_same_behaviour(code, "f", [[[]], [[1, 2, 3]]], [ConcatToJoin()])
+    assert '.join(' in result.source
+    assert pass_names(result) == {"concat_to_join"}
+
+
+def test_membership_to_set():
+    code = ("def f(x):\n"
+            "    return x in [1, 2, 3] or x not in ('a', 'b')\n")
+    result = assert_same_behaviour(code, "f", [[1], ["a"], [4]], [MembershipToSet()])
+    assert "{1, 2, 3}" in result.source and '{"a", "b"}' in result.source
+
+
+def test_simplify_if_true():
+    code = ("def f(flag):\n"
+            "    return 1 if flag == True else 0\n")
+    result = assert_same_behaviour(code, "f", [[True], [False]], [SimplifyIfTrue()])
+    assert "== True" not in result.source
+
+
+def test_hoist_attribute_lookups():
+    code = ("import math\n"
+            "\n"
+            "\n"
+            "def f(xs):\n"
+            "    acc = []\n"
+            "    for x in xs:\n"
+            "        acc.append(math.sqrt(x))\n"
+            "        acc.append(-x)\n"
+            "    return acc\n")
+    result = assert_same_behaviour(code, "f", [[[]], [[1, 4]]], [HoistAttributeLookups()])
+    assert "_acc_append = acc.append" in result.source
+    assert "_math_sqrt = math.sqrt" in result.source
+
+
+def test_hoist_skips_names_bound_on_some_paths_only():
+    code = ("def f(flag, xs):\n"
+            "    if flag:\n"
+            "        acc = []\n"
+            "    for x in xs:\n"
+            "        acc.append(x)\n"
+            "    return 0\n")
+    result = assert_same_behaviour(code, "f", [[True, [1]], [False, []], [False, [1]]], [HoistAttributeLookups()])
+    assert result.changes == []
+
+
+def test_hoist_into_the_block_that_binds_the_name():
+    code = ("def f(flag, xs):\n"
+            "    if flag:\n"
+            "        acc = []\n"
+            "        for x in xs:\n"
+            "            acc.append(x)\n"
+            "        return acc\n"
+            "    return None\n")
+    result = assert_same_behaviour(code, "f", [[True, [1, 2]], [False, [1]]], [HoistAttributeLookups()])
+    assert pass_names(result) == {"hoist_attribute_lookups"}
+
+
+@pytest.mark.parametrize("body", [
+    "        if hasattr(os, 'startfile_xyz'):\n"
+    "            os.startfile_xyz(p)\n",
+    "        try:\n"
+    "            os.startfile_xyz(p)\n"
+    "        except AttributeError:\n"
+    "            pass\n",
+    "        hasattr(os, 'startfile_xyz') and os.startfile_xyz(p)\n",
+    "        os.startfile_xyz(p) if hasattr(os, 'startfile_xyz') else None\n",
+    "        if not hasattr(os, 'startfile_xyz'):\n"
+    "            continue\n"
+    "        os.startfile_xyz(p)\n",
+    # every iteration calls it, but there may be none
+    "        os.startfile_xyz(p)\n",
+])
+def test_hoist_skips_lookups_the_loop_may_not_make(body):
+    code = ("import os\n"
+            "\n"
+            "\n"
+            "def f(paths):\n"
+            "    for p in paths:\n" + body +
+            "    return len(paths)\n")
+    result = assert_same_behaviour(code, "f", [[[]], [["a"]]], [HoistAttributeLookups()])
+    assert result.changes == []
+
+
+def test_comprehension_skips_global_loop_targets():
+    code = ("x = None\n"
+            "\n"
+            "\n"
+            "def last():\n"
+            "    return x\n"
+            "\n"
+            "\n"
+            "def f(xs):\n"
+            "    global x\n"
+            "    out = []\n"
+            "    for x in xs:\n"
+            "        out.append(x)\n"
+            "    return out, last()\n")
+    result = assert_same_behaviour(code, "f", [[[1, 2]]])
+    assert "loop_to_comprehension" not in pass_names(result)
+
+
+@pytest.mark.parametrize("handling", [
+    "    except ValueError:\n"
+    "        return out\n",
+    "    finally:\n"
+    "        seen.append(list(out))\n",
+])
+def test_comprehension_skips_loops_whose_partial_result_is_read(handling):
+    code = ("seen = []\n"
+            "\n"
+            "\n"
+            "def f(xs):\n"
+            "    try:\n"
+            "        out = []\n"
+            "        for x in xs:\n"
+            "            out.append(int(x))\n" + handling +
+            "    return out\n")
+    result = assert_same_behaviour(code, "f", [[["1", "2"]], [["1", "x", "3"]]])
+    assert "loop_to_comprehension" not in pass_names(result)
+
+
+def test_comprehension_inside_a_try_whose_finally_does_not_read_it():
+    code = ("def f(xs):\n"
+            "    try:\n"
+            "        out = []\n"
+            "        for x in xs:\n"
+            "            out.append(int(x))\n"
+            "    finally:\n"
+            "        xs = None\n"
+            "    return out\n")
+    result = assert_same_behaviour(code, "f", [[["1", "2"]], [["1", "x"]]])
+    assert "loop_to_comprehension" in pass_names(result)
+
+
+def test_units_with_comments_are_left_as_they_are():
+    code = ("def f(xs):\n"
+            "    out = []\n"
+            "    for x in xs:\n"
+            "        out.append(x)  # noqa: PERF401\n"
+            "    return out\n"
+            "\n"
+            "\n"
+            "def g(xs):\n"
+            "    out = []\n"
+            "    for x in xs:\n"
+            "        out.append(x)\n"
+            "    return out\n")
+    result = optimize(code)
+    assert "out.append(x)  # noqa: PERF401" in result.source
+    assert {change.lineno for change in result.changes} == {9}
+
+
+def test_module_level_fold_keeps_comments_between_statements():
+    code = ("out = []\n"
+            "# one per value\n"
+            "for x in range(3):\n"
+            "    out.append(x)\n")
+    assert optimize(code).source == code
+
+
+def test_pass_manager_reaches_a_fixpoint():
+    code = ("def f(xs, strict):\n"
+            "    kept = []\n"
+            "    for v in xs:\n"
+            "        if v in [1, 2, 3] and strict == True:\n"
+            "            kept.append(-v)\n"
+            "    return kept\n")
+    tree = ast.parse(code)
+    changes, changed_units, rounds = PassManager().run(tree)
+    assert {c.pass_name for c in changes} == {"loop_to_comprehension", "membership_to_set", "simplify_if_true"}
+    assert len(changed_units) == 1
+    assert rounds == 2
+    assert run(ast.unparse(tree), "f", [[[1, 4], True], [[1], False]]) == run(code, "f", [[[1, 4], True], [[1], False]])
+
+
+def test_loop_to_expression_is_abstract():
+    with pytest.raises(TypeError):
+        _LoopToExpression()
@@ -0,0 +1,47 @@
+# Unit tests for the performance hotspots in explanations (requires pytest)
+import ast
+
+from analysis import context as context_module
+from analysis.explainer import explain_code
+from analysis.performance import analyze_performance
+
+
+def hotspot_kinds(code):
+    return [h["kind"] for h in analyze_performance(ast.parse(code))["hotspots"]]
+
+
+def test_single_chained_lookup_is_not_a_hotspot():
+    code = ("def f(self, xs):\n"
+            "    for x in xs:\n"
+            "        self.seen.add(x)\n")
+    assert hotspot_kinds(code) == []
+
+
+def test_repeated_lookup_in_a_loop_is_a_hotspot():
+    code = ("import os\n"
+            "\n"
+            "def f(root, names):\n"
+            "    for name in names:\n"
+            "        if os.path.exists(os.path.join(root, name)):\n"
+            "            yield os.path.join(root, name)\n")
+    assert hotspot_kinds(code) == ["repeated_attribute_lookup"]
+
+
+def test_quadratic_function():
+    code = ("def f(xs):\n"
+            "    for x in xs:\n"
+            "        for y in xs:\n"
+            "            pass\n")
+    report = analyze_performance(ast.parse(code))
+    assert report["functions"][0]["big_o"] == "O(n^2)"
+    assert hotspot_kinds(code) == ["nested_loop_same_iterable"]
+
+
+def test_explanation_survives_a_failing_performance_analysis(monkeypatch):
+    def broken(tree):
+        raise RuntimeError("analyzer bug")
+
+    monkeypatch.setattr(context_module, "analyze_performance", broken)
+    explanation = explain_code("def f(x):\n    return x\n")
+    assert explanation["performance"] == {"functions": [], "hotspots": []}
+    assert "Detected 1 function(s)." in explanation["summary"]
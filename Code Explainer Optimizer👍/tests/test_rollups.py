@@ -0,0 +1,85 @@
+# Unit tests for the usage rollups behind /api/stats (requires pytest, mongomock)
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+
+import app as app_module
+from rollups import ROLLUPS_VERSION, Rollups
+
+
+def usage_events(n, end):
+    return [{"timestamp": end - timedelta(minutes=7 * i), "action": ("explain", "optimize")[i % 2],
+             "language": "python", "code_size": 100 + i, "success": i % 5 != 0, "latency_ms": 10 + i}
+            for i in range(n)]
+
+
+class NoMongo:
+    def __getattr__(self, name):
+        raise AssertionError(f"{name} called on the collection")
+
+
+def test_constructing_touches_no_database():
+    Rollups(NoMongo())
+
+
+def test_rebuild_matches_what_the_writer_adds():
+    db = mongomock.MongoClient().db
+    now = datetime.utcnow()
+    events = usage_events(300, now)
+    db.usage_records.insert_many([dict(e) for e in events])
+    live = Rollups(db.live)
+    for i in range(0, len(events), 40):
+        live.add(events[i:i + 40])
+    rebuilt = Rollups(db.rebuilt)
+    assert rebuilt.rebuild(db.usage_records) == 300
+    for since in (None, now - timedelta(hours=3, minutes=17)):
+        assert rebuilt.stats(since, now) == live.stats(since, now)
+    assert rebuilt.stats()["count"] == 300
+    # the writer goes on adding to rebuilt rollups
+    rebuilt.add(usage_events(1, now + timedelta(minutes=1)))
+    assert rebuilt.stats()["count"] == 301
+
+
+def test_ensure_rebuilds_once_per_version(monkeypatch):
+    db = mongomock.MongoClient().db
+    db.usage_records.insert_many(usage_events(20, datetime.utcnow()))
+    rollups = Rollups(db.usage_rollups)
+    assert rollups.ensure(db.usage_records)
+    assert not rollups.ensure(db.usage_records)
+    assert rollups.stats()["count"] == 20
+    monkeypatch.setattr("rollups.ROLLUPS_VERSION", ROLLUPS_VERSION + 1)
+    db.usage_records.insert_many(usage_events(5, datetime.utcnow()))
+    assert rollups.ensure(db.usage_records)
+    assert rollups.stats()["count"] == 25
+
+
+@pytest.fixture
+def client(monkeypatch):
+    db = mongomock.MongoClient().db
+    now = datetime.utcnow().replace(microsecond=0)
+    rollups = Rollups(db.usage_rollups)
+    rollups.add(usage_events(30, now))
+    monkeypatch.setattr(app_module, "usage_rollups", rollups)
+    return app_module.app.test_client(), now
+
+
+@pytest.mark.parametrize("suffix", ["", "Z", "+00:00"])
+def test_stats_window_in_utc(client, suffix):
+    client, now = client
+    since = (now - timedelta(minutes=30)).isoformat()
+    response = client.get("/api/stats", query_string={"since": since + suffix})
+    assert response.status_code == 200
+    # events 0 to 4 are 0, 7, ..., 28 minutes old
+    assert response.get_json()["total_requests"] == 5
+
+
+def test_stats_window_with_an_offset(client):
+    client, now = client
+    since = (now - timedelta(minutes=30) + timedelta(hours=2)).isoformat() + "+02:00"
+    assert client.get("/api/stats", query_string={"since": since}).get_json()["total_requests"] == 5
+
+
+@pytest.mark.parametrize("query", ["since=yesterday", "minutes=x", "minutes=1e300"])
+def test_stats_bad_window(client, query):
+    assert client[0].get(f"/api/stats?{query}").status_code == 400
@@ -0,0 +1,276 @@
+"""
+Explain, optimize and measure jobs run on a pool of pre-warmed worker processes.
+
+Each worker is a process of its own with a pipe to the app. A job gets a
+worker to itself for its whole run and is bounded three ways: the worker's
+CPU time (RLIMIT_CPU, raised as JobTimeout inside the worker), its address
+space (RLIMIT_AS) and the wall clock, enforced by the app, which kills a
+worker that does not answer in time and starts a new one in its place.
+At most workers + queue_size jobs are admitted at once; beyond that
+submit raises PoolSaturated straight away rather than queueing.
+
+    pool = WorkerPool(workers=4, queue_size=16, timeout=10)
+    explanation = pool.submit("explain", code, "python")
+"""
+import os
+import queue
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Connection
+
+# Run in each worker process: imports this module and nothing of the app, so
+# starting a worker does not connect to Mongo or start the app's threads
+# again, as re-importing the app's main module would
+_BOOTSTRAP = "import sys; sys.path.insert(0, sys.argv[1]); import workers; workers._serve(*sys.argv[2:])"
+
+
+class PoolSaturated(Exception):
+    """Every worker is busy and the queue is full"""
+
+
+class JobTimeout(Exception):
+    """A job ran out of time, CPU time or waiting time"""
+
+
+class JobError(Exception):
+    """A job failed in its worker; the message is the worker's error"""
+
+
+def run_job(action, code, language, options=None):
+    """
+    The result of one job: explain_code's explanation, optimize's result
+    dict, or the measurement of code against options["optimized"] (options
+    are measure()'s) or its "error"
+    """
+    from analysis.context import AnalysisContext
+    from analysis.explainer import explain_code
+    from analysis.optimizer import optimize
+    from measure import MeasurementError, measure
+    if action == "measure":
+        try:
+            return measure(code, **options)
+        except MeasurementError as e:
+            return {"error": str(e)}
+    context = AnalysisContext(code, language)
+    if action == "explain":
+        return explain_code(code, language=language, context=context)
+    if action == "optimize":
+        result = optimize(code, language=language, context=context)
+        return {"optimized": result.source, "formatted": context.formatted,
+                "changes": [change._asdict() for change in result.changes]}
+    raise ValueError(f"unknown action {action!r}")
+
+
+def _on_cpu_limit(signum, frame):
+    raise JobTimeout("CPU time limit exceeded")
+
+
+def _cpu_used():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _serve(fd, cpu_seconds, memory_bytes):
+    """Entry point of a worker process, over the socket fd it inherited"""
+    _worker_main(Connection(int(fd)), float(cpu_seconds) or None, int(memory_bytes) or None)
+
+
+def _worker_main(conn, cpu_seconds, memory_bytes):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    if memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, resource.getrlimit(resource.RLIMIT_AS)[1]))
+    # Pre-warm: import Black, radon and Pygments and run them once
+    run_job("explain", "def warm(x):\n    return x\n", "python")
+    run_job("optimize", "def warm(x):\n    return x\n", "python")
+    conn.send(("ready", None))
+    cpu_hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        try:
+            if cpu_seconds:
+                # RLIMIT_CPU counts the whole life of the process
+                resource.setrlimit(resource.RLIMIT_CPU, (int(_cpu_used() + cpu_seconds) + 1, cpu_hard))
+            reply = ("ok", run_job(*job))
+        except JobTimeout as e:
+            reply = ("timeout", str(e))
+        except MemoryError:
+            reply = ("error", "memory limit exceeded")
+        except Exception as e:
+            reply = ("error", str(e))
+        finally:
+            if cpu_seconds:
+                resource.setrlimit(resource.RLIMIT_CPU, (cpu_hard, cpu_hard))
+        conn.send(reply)
+
+
+class _Worker:
+    def __init__(self, cpu_seconds, memory_bytes):
+        ours, theirs = socket.socketpair()
+        with theirs:
+            self.process = subprocess.Popen(
+                [sys.executable, "-c", _BOOTSTRAP, os.path.dirname(os.path.abspath(__file__)),
+                 str(theirs.fileno()), str(cpu_seconds or 0), str(memory_bytes or 0)],
+                pass_fds=[theirs.fileno()])
+        self.conn = Connection(ours.detach())
+        self.ready = False
+
+    def wait_ready(self, timeout):
+        """True once the worker has warmed up; JobError if it exited instead"""
+        if not self.ready and self.conn.poll(timeout):
+            try:
+                self.ready = self.conn.recv()[0] == "ready"
+            except EOFError:
+                raise JobError("worker failed to start")
+        return self.ready
+
+    def join(self, timeout=None):
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            pass
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait()
+        self.conn.close()
+
+
+class WorkerPool:
+    def __init__(self, workers=2, queue_size=8, timeout=10.0, cpu_seconds=None, memory_bytes=None,
+                 start_timeout=60.0):
+        """
+        timeout: wall-clock seconds a job may take from submission, queueing
+        included; cpu_seconds (defaults to timeout) and memory_bytes limit
+        the worker running it
+        """
+        self.size = workers
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds if cpu_seconds is not None else timeout
+        self.memory_bytes = memory_bytes
+        self.start_timeout = start_timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.restarted = 0
+        for _ in range(workers):
+            self._idle.put(self._start())
+
+    def _start(self):
+        # a fresh interpreter: workers do not inherit the app's threads and sockets
+        return _Worker(self.cpu_seconds, self.memory_bytes)
+
+    def submit(self, action, code, language='python', options=None):
+        """
+        Run a job (see run_job) and return its result. PoolSaturated when no slot is free,
+        JobTimeout when it runs out of time, JobError when it fails.
+        """
+        if self._closed:
+            raise RuntimeError("pool is closed")
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PoolSaturated("too many jobs in progress, try again shortly")
+        try:
+            deadline = time.monotonic() + self.timeout
+            try:
+                worker = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                self._count_timeout()
+                raise JobTimeout("no worker became free in time")
+            ready = False
+            try:
+                # a worker started in place of a killed one may still be warming
+                # up; it goes on warming for the next job if this one's time
+                # runs out first
+                ready = worker.wait_ready(max(deadline - time.monotonic(), 0))
+                if ready:
+                    reply = self._run(worker, (action, code, language, options), deadline)
+            except BaseException:
+                worker.kill()
+                worker = self._start()
+                with self._lock:
+                    self.restarted += 1
+                raise
+            finally:
+                self._idle.put(worker)
+        finally:
+            self._slots.release()
+        if not ready:
+            self._count_timeout()
+            raise JobTimeout("no worker became ready in time")
+        status, value = reply
+        if status == "ok":
+            with self._lock:
+                self.completed += 1
+            return value
+        if status == "timeout":
+            self._count_timeout()
+            raise JobTimeout(value)
+        raise JobError(value)
+
+    def _run(self, worker, job, deadline):
+        worker.conn.send(job)
+        if not worker.conn.poll(max(deadline - time.monotonic(), 0)):
+            self._count_timeout()
+            raise JobTimeout(f"job took longer than {self.timeout:g}s")
+        try:
+            return worker.conn.recv()
+        except EOFError:
+            raise JobError("worker exited while running the job")
+
+    def _count_timeout(self):
+        with self._lock:
+            self.timed_out += 1
+
+    def warm_up(self):
+        """Wait until every worker is ready; returns how many are"""
+        workers = []
+        while len(workers) < self.size:
+            workers.append(self._idle.get())
+        ready = 0
+        for worker in workers:
+            try:
+                ready += worker.wait_ready(self.start_timeout)
+            except JobError:
+                # replaced by the first job that gets it
+                pass
+            self._idle.put(worker)
+        return ready
+
+    def stats(self):
+        with self._lock:
+            return {"workers": self.size, "idle": self._idle.qsize(), "completed": self.completed,
+                    "rejected": self.rejected, "timed_out": self.timed_out, "restarted": self.restarted}
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+            worker.join(1)
+            if worker.is_alive():
+                worker.kill()
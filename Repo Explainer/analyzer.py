@@ -1,6 +1,8 @@
+import heapq
 import os
 import re
 from collections import defaultdict, Counter
+from graph import GraphBuilder
 import json
 
 # Heuristic regexes
@@ -38,131 +40,365 @@ def detect_language(path):
     return EXT_LANG.get(e, 'Other')
 
 
-def analyze_repo_tree(files_info, repo_owner="", repo_name="", branch=""):
+# Bump whenever scan_content changes what it returns, so cached scans are redone
+SCAN_VERSION = 1
+
+
+def scan_content(content):
+    """
+    The per-file part of the analysis, which depends only on the content:
+    {"lines": line count, "refs": [[edge type, referenced module or path], ...]}.
+    Being keyed by content alone, it can be cached by blob SHA.
+    """
+    content = content or ""
+    refs = []
+    # Python
+    for m in PY_IMPORT_RE.finditer(content):
+        mod = m.group(1) or m.group(2)
+        if mod:
+            refs.append(["py-import", mod])
+    # JavaScript / TypeScript
+    for m in JS_IMPORT_RE.finditer(content):
+        rel = m.group(1) or m.group(2)
+        if rel:
+            refs.append(["js-import", rel])
+    # HTML references
+    for m in HTML_SCRIPT_RE.finditer(content):
+        refs.append(["html-script", m.group(1)])
+    for m in HTML_LINK_RE.finditer(content):
+        refs.append(["html-link", m.group(1)])
+    return {"lines": content.count('\n') + 1 if content else 0, "refs": refs}
+
+
+# Content handed to one worker at a time by scan_files
+SCAN_CHUNK_BYTES = 512 * 1024
+
+
+def _scan_chunk(contents):
+    """Process-pool entry point: scan_content for a list of contents"""
+    return [scan_content(content) for content in contents]
+
+
+def scan_files(files, executor=None, chunk_bytes=SCAN_CHUNK_BYTES):
+    """
+    Fill in the "scan" of every file dict in the list files that has none.
+    With an executor (e.g. a ProcessPoolExecutor) the contents are sent to
+    its workers in chunks of about chunk_bytes; results are merged back in
+    order, so the outcome is the same as scanning serially.
+    """
+    pending = [f for f in files if not f.get('scan')]
+    if executor is None:
+        for f in pending:
+            f['scan'] = scan_content(f.get('content'))
+        return files
+
+    chunks = [[]]
+    size = 0
+    for f in pending:
+        if size >= chunk_bytes:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(f)
+        size += len(f.get('content') or '')
+    results = executor.map(_scan_chunk, [[f.get('content') for f in chunk] for chunk in chunks])
+    for chunk, scans in zip(chunks, results):
+        for f, scan in zip(chunk, scans):
+            f['scan'] = scan
+    return files
+
+
+# Extensions tried, in order, for a relative reference written without one
+RESOLVE_EXTENSIONS = ['.py', '.js', '.jsx', '.ts', '.tsx', '.html']
+
+
+_UNRESOLVED = object()
+
+
+class ImportResolver:
+    """
+    Maps references found by scan_content to repository paths.
+
+    The module and extension indexes are built once per analysis and every
+    (directory, reference) pair is resolved only once, so each import costs a
+    dict lookup no matter how many files repeat it.
+
+    Python imports resolve, in order, as
+      - a relative import (".mod", "..pkg.mod", ".") from the importing file,
+      - a dotted module from the repository root: a/b.py, then a/b.js,
+        then the package a/b/__init__.py,
+      - a module next to the importing file, as a script directory on sys.path.
+    Other references resolve as before: paths starting with "." or "/" from
+    the referencing file, trying RESOLVE_EXTENSIONS when the file is not
+    there as written, and bare names as a top-level dotted .py or .js file.
+    """
+
+    def __init__(self, paths):
+        self.paths = set(paths)
+        # path without extension -> path, for the first RESOLVE_EXTENSIONS match
+        self.by_stem = {}
+        # dotted Python module -> path (modules and package __init__ files)
+        self.modules = {}
+        self.packages = {}
+        rank = {e: i for i, e in enumerate(RESOLVE_EXTENSIONS)}
+        stem_rank = {}
+        for path in self.paths:
+            e = ext(path)
+            stem = path[:-len(e)] if e else path
+            if e in rank:
+                if rank[e] < stem_rank.get(stem, len(rank)):
+                    stem_rank[stem] = rank[e]
+                    self.by_stem[stem] = path
+            # only paths made of valid module names; "a.b/c.py" is no module
+            if e == '.py' and '.' not in stem:
+                if path == '__init__.py' or path.endswith('/__init__.py'):
+                    self.packages[path[:-len('__init__.py')].rstrip('/').replace('/', '.')] = path
+                else:
+                    self.modules[path[:-3].replace('/', '.')] = path
+        # memos: directory -> ({python ref: target}, {relative path ref: target}),
+        # plus the directory independent ones
+        self._dir_memos = {}
+        self._bare_memo = {}
+        self._py_root = {}
+
+    def resolve(self, source_path, edge_type, ref):
+        """Path that ref, found in source_path, points at; None if not in the repo"""
+        return self.resolve_refs(source_path, [(edge_type, ref)])[0]
+
+    def resolve_refs(self, source_path, refs):
+        """resolve() for every (edge type, ref) of one file, in order"""
+        base_dir = source_path.rpartition('/')[0]
+        memos = self._dir_memos.get(base_dir)
+        if memos is None:
+            memos = self._dir_memos[base_dir] = ({}, {})
+        # Python imports and relative paths depend on the directory; bare
+        # Python modules usually resolve from the root, and other bare names always do
+        py_memo, path_memo = memos
+        py_root = self._py_root
+        bare_memo = self._bare_memo
+        targets = []
+        for edge_type, ref in refs:
+            if edge_type == 'py-import':
+                target = py_root.get(ref)
+                if target is None:
+                    target = py_memo.get(ref, _UNRESOLVED)
+                    if target is _UNRESOLVED:
+                        target = py_memo[ref] = self._resolve_python(base_dir, ref)
+            else:
+                memo = path_memo if ref.startswith(('.', '/')) else bare_memo
+                target = memo.get(ref, _UNRESOLVED)
+                if target is _UNRESOLVED:
+                    target = memo[ref] = self._resolve_path(base_dir, ref)
+            targets.append(target)
+        return targets
+
+    def _module(self, dotted):
+        return self.modules.get(dotted) or self.packages.get(dotted)
+
+    def _resolve_python(self, base_dir, ref):
+        if ref.startswith('.'):
+            rest = ref.lstrip('.')
+            package = base_dir.split('/') if base_dir else []
+            up = len(ref) - len(rest) - 1
+            if up > len(package):
+                return None
+            package = package[:len(package) - up]
+            return self._module('.'.join(package + ([rest] if rest else [])))
+        target = self.modules.get(ref)
+        if not target and ref + '.js' in self.paths:
+            target = ref + '.js'
+        target = target or self.packages.get(ref)
+        if target:
+            self._py_root[ref] = target
+            return target
+        if not base_dir:
+            return None
+        return self._module(base_dir.replace('/', '.') + '.' + ref)
+
+    def _resolve_path(self, base_dir, ref):
+        if ref.startswith(('.', '/')):
+            candidate = os.path.normpath(base_dir + '/' + ref)
+            # trim leading ./ if present
+            candidate = candidate.lstrip('./')
+            if candidate in self.paths:
+                return candidate
+            return self.by_stem.get(candidate)
+        # bare module names: try to map module to path heuristically
+        # e.g., package.module -> package/module.py
+        cand = ref.replace('.', '/') + '.py'
+        if cand in self.paths:
+            return cand
+        cand2 = ref + '.js'
+        if cand2 in self.paths:
+            return cand2
+        return None
+
+
+# Files, nodes or edges per event of iter_repo_tree
+STREAM_CHUNK = 1000
+TOP_FILES = 20
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _scanned(files_info, executor, chunk_size):
+    """
+    files_info with every file scanned. Serially that is one file at a time,
+    so only the file being scanned is held; an executor needs chunk_size
+    files at once to have something to spread over its workers.
     """
-    files_info: list of dicts with keys path, size, content(optional)
-    returns: dict with file tree, stats, nodes, edges
+    if executor is None:
+        for f in files_info:
+            if not f.get('scan'):
+                f['scan'] = scan_content(f.get('content'))
+            yield f
+        return
+    for batch in _batches(files_info, chunk_size):
+        scan_files(batch, executor)
+        yield from batch
+        del batch[:]
+
+
+def iter_repo_tree(files_info, executor=None, include_content=False, chunk_size=STREAM_CHUNK,
+                   dependents_of=None):
+    """
+    The analysis of analyze_repo_tree as a stream of (kind, payload) events,
+    produced while files_info is still being read:
+      ("files", [{path, size, language, lines}, ...])  entries of the file tree
+      ("nodes", [node, ...])
+      ("edges", [edge, ...])                          once every file is known
+      ("summary", {"stats": ..., "top_files": ..., "graph": ...})   last
+    "graph" holds the analytics of graph.DependencyGraph.summary(), plus the
+    transitive "dependents" of the path dependents_of when one is given.
+    files_info may be any iterator; it is read in one pass. Per file only its
+    references and metadata (graph.GraphBuilder) are kept, plus the TOP_FILES
+    largest files; a file's content is let go as soon as it is scanned, so
+    memory grows with the number of files, not with their contents.
+    Paths must be unique, as they are in a Git tree.
     """
     stats = {"total_files": 0, "total_bytes": 0, "languages": Counter(), "total_lines": 0}
-    file_by_path = {}
-    for f in files_info:
+    builder = GraphBuilder()
+    # references of each node, by id
+    refs_by_node = []
+    # min-heap of (size, -position, entry): the largest files, earliest first among equals
+    top = []
+    position = 0
+    entries = []
+    first_node = 0
+    for f in _scanned(files_info, executor, chunk_size):
         path = f['path']
         size = f.get('size', 0) or 0
         language = detect_language(path)
-        content = f.get('content')
-        lines = content.count('\n') + 1 if content else 0
+        scan = f['scan']
+        lines = scan["lines"]
         stats["total_files"] += 1
         stats["total_bytes"] += size
         stats["total_lines"] += lines
         stats["languages"][language] += size
-        file_by_path[path] = {
-            "path": path,
-            "size": size,
-            "language": language,
-            "content": content,
-            "lines": lines
-        }
-
-    # Build a folder tree for the front end
-    tree = {}
-    for path, info in file_by_path.items():
-        parts = path.split('/')
-        node = tree
-        for p in parts[:-1]:
-            node = node.setdefault(p, {})
-        node[parts[-1]] = {"_meta": {"size": info["size"], "language": info["language"], "lines": info["lines"]}}
-
-    # Find relationships by scanning file contents for imports, requires, script/link tags
-    nodes = []
-    edges = []
-    path_set = set(file_by_path.keys())
-
-    # helper to resolve relative paths (simple)
-    def resolve_relative(base_path, rel):
-        if rel.startswith(('.', '/')):
-            base_dir = '/'.join(base_path.split('/')[:-1])
-            candidate = os.path.normpath(base_dir + '/' + rel)
-            # trim leading ./ if present
-            candidate = candidate.lstrip('./')
-            # try common extensions if missing
-            if candidate in path_set:
-                return candidate
-            for ext_try in ['.py', '.js', '.jsx', '.ts', '.tsx', '.html']:
-                if candidate + ext_try in path_set:
-                    return candidate + ext_try
-        else:
-            # bare module names: try to map module to path heuristically
-            # e.g., package.module -> package/module.py
-            cand = rel.replace('.', '/') + '.py'
-            if cand in path_set:
-                return cand
-            cand2 = rel + '.js'
-            if cand2 in path_set:
-                return cand2
-        return None
+        if path in builder.index:
+            continue
+        builder.add_node(path, language, size, lines)
+        refs_by_node.append(scan["refs"])
+        entries.append({"path": path, "size": size, "language": language, "lines": lines})
+        top_file = {"path": path, "size": size, "language": language, "lines": lines}
+        if include_content:
+            top_file["content"] = f.get('content')
+        position += 1
+        item = (size, -position, top_file)
+        if len(top) < TOP_FILES:
+            heapq.heappush(top, item)
+        elif item[:2] > top[0][:2]:
+            heapq.heapreplace(top, item)
+        if len(entries) == chunk_size:
+            yield "files", entries
+            yield "nodes", builder.node_dicts(first_node)
+            entries = []
+            first_node = len(builder.paths)
+    if entries:
+        yield "files", entries
+        yield "nodes", builder.node_dicts(first_node)
 
-    # Prepare nodes
-    for path, info in file_by_path.items():
-        nodes.append({
-            "id": path,
-            "label": path.split('/')[-1],
-            "group": info["language"],
-            "size": info["size"],
-            "lines": info["lines"]
-        })
-
-    # Scan each file for references
-    for path, info in file_by_path.items():
-        content = info.get("content") or ""
-        # Python
-        for m in PY_IMPORT_RE.finditer(content):
-            mod = m.group(1) or m.group(2)
-            if not mod:
-                continue
-            target = resolve_relative(path, mod)
-            if target:
-                edges.append({"source": path, "target": target, "type": "py-import"})
-
-        # JavaScript / TypeScript
-        for m in JS_IMPORT_RE.finditer(content):
-            rel = m.group(1) or m.group(2)
-            if not rel:
-                continue
-            # ignore libraries like 'react' without relative path
-            target = None
-            if rel.startswith(('.', '/')):
-                target = resolve_relative(path, rel)
-            else:
-                # try map to top-level file
-                target = resolve_relative(path, rel)
-            if target:
-                edges.append({"source": path, "target": target, "type": "js-import"})
-
-        # HTML references
-        for m in HTML_SCRIPT_RE.finditer(content):
-            src = m.group(1)
-            target = resolve_relative(path, src)
-            if target:
-                edges.append({"source": path, "target": target, "type": "html-script"})
-        for m in HTML_LINK_RE.finditer(content):
-            href = m.group(1)
-            target = resolve_relative(path, href)
-            if target:
-                edges.append({"source": path, "target": target, "type": "html-link"})
+    # Find relationships from the imports, requires, script/link tags of each file
+    resolver = ImportResolver(builder.index)
+    index = builder.index
+    for node, refs in enumerate(refs_by_node):
+        targets = resolver.resolve_refs(builder.paths[node], refs)
+        builder.add_edges(node, [(index[target], edge_type)
+                                 for (edge_type, ref), target in zip(refs, targets) if target])
+    del refs_by_node
+    graph = builder.build()
+    for edges in graph.iter_edge_dicts(chunk_size):
+        yield "edges", edges
 
     # Summaries
-    top_files = sorted(list(file_by_path.values()), key=lambda x: x["size"], reverse=True)[:20]
-    language_bytes = dict(stats["languages"])
-
-    return {
+    graph_summary = graph.summary()
+    if dependents_of is not None:
+        graph_summary["dependents"] = graph.dependents(dependents_of) if dependents_of in index else None
+    top_files = [entry for _, _, entry in sorted(top, key=lambda item: item[:2], reverse=True)]
+    yield "summary", {
         "stats": {
             "total_files": stats["total_files"],
             "total_bytes": stats["total_bytes"],
             "total_lines": stats["total_lines"],
-            "languages": language_bytes
+            "languages": dict(stats["languages"])
         },
-        "tree": tree,
-        "nodes": nodes,
-        "edges": edges,
-        "top_files": top_files
+        "top_files": top_files,
+        "graph": graph_summary
     }
+
+
+def analyze_repo_tree(files_info, repo_owner="", repo_name="", branch="", executor=None,
+                      include_content=False, dependents_of=None):
+    """
+    files_info: iterable of dicts with keys path, size, content(optional), read once;
+    a "scan" key holding scan_content(content) skips scanning that file again
+    executor: optional process pool to scan the files on (see scan_files)
+    include_content: keep each file's content in top_files
+    dependents_of: path whose transitive dependents to list in graph["dependents"]
+    returns: dict with file tree, stats, nodes, edges, graph analytics
+    """
+    return collect_result(iter_repo_tree(files_info, executor, include_content, dependents_of=dependents_of))
+
+
+def collect_result(events):
+    """The analyze_repo_tree dict assembled from iter_repo_tree events"""
+    result = new_result()
+    for kind, payload in events:
+        add_event(result, kind, payload)
+    return result
+
+
+def new_result():
+    """An empty analyze_repo_tree dict, for add_event"""
+    return {"tree": {}, "nodes": [], "edges": []}
+
+
+def add_event(result, kind, payload):
+    """Fold one iter_repo_tree event into result"""
+    if kind == "files":
+        add_to_tree(result["tree"], payload)
+    elif kind in ("nodes", "edges"):
+        result[kind].extend(payload)
+    elif kind == "summary":
+        result.update(payload)
+    else:
+        result[kind] = payload
+
+
+def add_to_tree(tree, entries):
+    """Add "files" entries of iter_repo_tree to the folder tree shown by the front end"""
+    for entry in entries:
+        parts = entry["path"].split('/')
+        node = tree
+        for p in parts[:-1]:
+            node = node.setdefault(p, {})
+        node[parts[-1]] = {"_meta": {"size": entry["size"], "language": entry["language"],
+                                     "lines": entry["lines"]}}
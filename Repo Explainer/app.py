@@ -1,10 +1,17 @@
 import os
 import re
 import json
+import tarfile
 from urllib.parse import urlparse
-from flask import Flask, request, render_template, jsonify
+from flask import Flask, Response, request, render_template, jsonify
 import requests
-from analyzer import analyze_repo_tree
+from concurrent.futures import ProcessPoolExecutor
+from analyzer import add_event, collect_result, iter_repo_tree, new_result, scan_files
+from archive import ArchiveReader
+from blobcache import BlobCache
+from snapshots import SnapshotRecorder, SnapshotStore, known_scans, snapshot_delta
+from fetcher import GitHubClient
+from results import ResultStore, options_key
 
 app = Flask(__name__)
 
@@ -16,6 +23,67 @@ HEADERS = {"Accept": "application/vnd.github+json"}
 if GITHUB_TOKEN:
     HEADERS["Authorization"] = f"Bearer {GITHUB_TOKEN}"
 
+# Blob downloads in flight at once
+FETCH_CONCURRENCY = int(os.environ.get("FETCH_CONCURRENCY", 16))
+
+github = GitHubClient(GITHUB_API, HEADERS, max_workers=FETCH_CONCURRENCY)
+
+# Files whose contents are fetched (and held) at a time
+FETCH_WINDOW = int(os.environ.get("FETCH_WINDOW", 256))
+
+# SQLite file caching blob contents and scans by SHA; set to "" to disable
+BLOB_CACHE_PATH = os.environ.get("BLOB_CACHE_PATH",
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), "blob_cache.sqlite3"))
+BLOB_CACHE_MAX_BYTES = int(os.environ.get("BLOB_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+blob_cache = BlobCache(BLOB_CACHE_PATH, BLOB_CACHE_MAX_BYTES) if BLOB_CACHE_PATH else None
+
+# SQLite file keeping a snapshot of each analyzed commit, for "since"; "" disables
+SNAPSHOT_DB_PATH = os.environ.get("SNAPSHOT_DB_PATH",
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), "analyses.sqlite3"))
+
+# Snapshots kept; past it the oldest are evicted
+SNAPSHOT_DB_MAX_ENTRIES = int(os.environ.get("SNAPSHOT_DB_MAX_ENTRIES", 10000))
+
+snapshots = SnapshotStore(SNAPSHOT_DB_PATH, SNAPSHOT_DB_MAX_ENTRIES) if SNAPSHOT_DB_PATH else None
+
+# SQLite file keeping the result of each analyzed commit, served again without
+# analyzing when the branch has not moved; "" disables. A file of its own: the
+# stores each hold one connection and do not share one
+RESULT_DB_PATH = os.environ.get("RESULT_DB_PATH",
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.sqlite3"))
+# Results kept; past it the oldest are evicted
+RESULT_DB_MAX_ENTRIES = int(os.environ.get("RESULT_DB_MAX_ENTRIES", 10000))
+
+results = ResultStore(RESULT_DB_PATH, RESULT_DB_MAX_ENTRIES) if RESULT_DB_PATH else None
+
+# Processes scanning file contents for imports; 0 scans in the request thread
+SCAN_WORKERS = int(os.environ.get("SCAN_WORKERS", 0))
+# Below this many files to scan, the pool costs more than it saves
+SCAN_PARALLEL_MIN_FILES = int(os.environ.get("SCAN_PARALLEL_MIN_FILES", 500))
+
+_scan_pool = None
+
+
+def scan_executor(n_files):
+    """The scan process pool, or None to scan n_files serially"""
+    # Created on first use so importing the app does not start worker processes
+    global _scan_pool
+    if SCAN_WORKERS < 1 or n_files < SCAN_PARALLEL_MIN_FILES:
+        return None
+    if _scan_pool is None:
+        _scan_pool = ProcessPoolExecutor(max_workers=SCAN_WORKERS)
+    return _scan_pool
+
+
+def scan_batch_size(size):
+    """Files to hold at once: size, or enough to use the scan pool when there is one"""
+    return max(size, SCAN_PARALLEL_MIN_FILES) if SCAN_WORKERS > 0 else size
+
+# Directory under which local clones, directories and tarballs may be analyzed
+# (the "local_path" request option); unset disables local ingestion
+LOCAL_REPOS_ROOT = os.environ.get("LOCAL_REPOS_ROOT")
+
 
 def parse_github_url(url):
     """
@@ -42,25 +110,15 @@ def parse_github_url(url):
 
 
 def get_default_branch(owner, repo):
-    url = f"{GITHUB_API}/repos/{owner}/{repo}"
-    r = requests.get(url, headers=HEADERS)
-    r.raise_for_status()
-    return r.json().get("default_branch", "main")
+    return github.get_default_branch(owner, repo)
 
 
 def get_repo_tree(owner, repo, branch):
-    # Use the Git Trees API with recursive=1 to get a listing of repository files.
-    url = f"{GITHUB_API}/repos/{owner}/{repo}/git/trees/{branch}?recursive=1"
-    r = requests.get(url, headers=HEADERS)
-    r.raise_for_status()
-    return r.json()
+    return github.get_repo_tree(owner, repo, branch)
 
 
 def get_blob(owner, repo, sha):
-    url = f"{GITHUB_API}/repos/{owner}/{repo}/git/blobs/{sha}"
-    r = requests.get(url, headers=HEADERS)
-    r.raise_for_status()
-    return r.json()
+    return github.get_blob(owner, repo, sha)
 
 
 @app.route("/")
@@ -68,87 +126,420 @@ def index():
     return render_template("index.html")
 
 
-@app.route("/api/analyze", methods=["POST"])
-def analyze():
-    data = request.json or {}
+def resolve_local_path(path):
+    """Absolute path of a local repo, which must lie inside LOCAL_REPOS_ROOT"""
+    if not LOCAL_REPOS_ROOT:
+        raise ValueError("local_path is disabled (set LOCAL_REPOS_ROOT)")
+    root = os.path.realpath(LOCAL_REPOS_ROOT)
+    full = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, full]) != root:
+        raise ValueError("local_path must be inside LOCAL_REPOS_ROOT")
+    if not os.path.exists(full):
+        raise ValueError(f"local_path not found: {path}")
+    return full
+
+
+def list_tree_files(owner, repo, ref, max_files):
+    """The blob entries of the tree at ref. Returns (files, file_count, warning)."""
+    tree_resp = get_repo_tree(owner, repo, ref)
+    if "tree" not in tree_resp:
+        raise ValueError("unexpected response from GitHub trees API")
+
+    entries = tree_resp["tree"]
+    files = [e for e in entries if e["type"] == "blob"]
+    if len(files) > max_files:
+        # return partial result but warn client
+        files = files[:max_files]
+        warning = f"Repo contains more than {max_files} files. Truncated."
+    else:
+        warning = None
+    return files, len(entries), warning
+
+
+def iter_tree_files(owner, repo, files, max_file_size_bytes, known=None, fetched=None, failed=None):
+    """
+    files_info records for tree entries, in tree order. Blob contents are
+    fetched concurrently a window of FETCH_WINDOW files at a time, so only one
+    window of contents is held at once. Blobs with a scan in known
+    ({sha: scan}) or in the blob cache are not downloaded; fetched, a list,
+    gets the number of blobs each window downloaded, and failed, a list, the
+    number whose download failed (their records have no content or scan).
+    """
+    known = known or {}
+    size = scan_batch_size(FETCH_WINDOW)
+    for window in range(0, len(files), size):
+        window_files = files[window:window + size]
+        # fetch blobs for content up to the size threshold, concurrently
+        # (we will fetch content only for reasonably sized files, to avoid heavy downloads)
+        # Blobs already in the cache are neither downloaded nor scanned again
+        wanted = [f["sha"] for f in window_files
+                  if f.get("size") and f["size"] <= max_file_size_bytes and f["sha"] not in known]
+        blobs = blob_cache.get_many(wanted) if blob_cache else {}
+        contents = github.fetch_blob_contents(owner, repo, [sha for sha in wanted if sha not in blobs])
+        new = [{"sha": sha, "content": content} for sha, content in contents.items() if content is not None]
+        scan_files(new, scan_executor(len(new)))
+        for blob in new:
+            blobs[blob["sha"]] = blob
+        if blob_cache:
+            blob_cache.put_many((blob["sha"], blob["content"], blob["scan"]) for blob in new)
+        if fetched is not None:
+            fetched.append(len(contents))
+        if failed is not None:
+            failed.append(len(contents) - len(new))
+        del new, contents
+
+        for f in window_files:
+            file_size = f.get("size", 0)
+            sha = f.get("sha")
+            blob = None
+            if file_size and file_size <= max_file_size_bytes:
+                blob = {"content": None, "scan": known[sha]} if sha in known else blobs.get(sha)
+            yield {
+                "path": f["path"],
+                "size": file_size,
+                "mode": f.get("mode"),
+                "sha": sha,
+                "content": blob["content"] if blob else None,
+                "scan": blob["scan"] if blob else None
+            }
+
+
+def with_scans(records, batch_size=64):
+    """Scan archive records in batches, reusing and filling the blob cache"""
+    batch_size = scan_batch_size(batch_size)
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield from _scan_batch(batch)
+            batch = []
+    yield from _scan_batch(batch)
+
+
+def _scan_batch(batch):
+    new = [r for r in batch if r["content"] is not None]
+    if blob_cache:
+        cached = blob_cache.get_many(r["sha"] for r in new)
+        for record in new:
+            if record["sha"] in cached:
+                record["scan"] = cached[record["sha"]]["scan"]
+        new = [r for r in new if not r.get("scan")]
+    scan_files(new, scan_executor(len(new)))
+    if blob_cache:
+        blob_cache.put_many((r["sha"], r["content"], r["scan"]) for r in new)
+    return batch
+
+
+class AnalysisSource:
+    """
+    The files of one analysis. records is read once, lazily, so that fetching
+    and downloading happen while the analysis consumes them; file_count,
+    files_returned and warning are known once it has been read.
+    """
+
+    def __init__(self, owner, repo, branch, errors, commit=None):
+        self.owner = owner
+        self.repo = repo
+        self.branch = branch
+        self.commit = commit
+        # snapshot of the analysis "since" refers to
+        self.previous = None
+        self.blobs_fetched = None
+        # options_key of the options the result depends on, and the stored result
+        self.options = None
+        self.stored = None
+        self.records = ()
+        self.file_count = 0
+        self.files_returned = 0
+        self.warning = None
+        # some files could not be downloaded: the result is not the commit's
+        self.incomplete = False
+        # [(exception types reading records may raise, (message prefix, status))]
+        self.errors = errors
+
+    def meta(self):
+        return {"owner": self.owner, "repo": self.repo, "branch": self.branch, "commit": self.commit}
+
+    def counts(self):
+        return {"file_count": self.file_count, "files_returned": self.files_returned,
+                "warning": self.warning, "incomplete": self.incomplete}
+
+    def exception_types(self):
+        return tuple(t for types, _ in self.errors for t in types)
+
+    def error(self, e):
+        """(message, status) for an exception of exception_types()"""
+        prefix, status = next(reply for types, reply in self.errors if isinstance(e, types))
+        return f"{prefix}{e}", status
+
+
+def archive_records(source, reader, records):
+    """Records streamed by an ArchiveReader, scanned, counted into source"""
+    yield from with_scans(records)
+    source.file_count = reader.file_count
+    source.files_returned = min(reader.file_count, reader.max_files)
+    if reader.truncated:
+        source.warning = f"Repo contains more than {reader.max_files} files. Truncated."
+
+
+def api_records(source, max_files, max_file_size_bytes):
+    """Records from the trees and blobs APIs, counted into source"""
+    files, source.file_count, source.warning = list_tree_files(source.owner, source.repo, source.commit,
+                                                               max_files)
+    source.files_returned = len(files)
+    known = known_scans(source.previous) if source.previous else None
+    fetched, failed = [], []
+    yield from iter_tree_files(source.owner, source.repo, files, max_file_size_bytes, known, fetched, failed)
+    source.blobs_fetched = sum(fetched)
+    source.incomplete = sum(failed) > 0
+
+
+def open_source(data):
+    """
+    AnalysisSource for the request body; ValueError for a bad request,
+    LookupError when "since" names a commit with no stored snapshot. When a
+    result of the same commit and options is stored, source.stored holds it
+    and there are no records to read.
+    """
     repo_url = data.get("repo_url")
+    local_path = data.get("local_path")
     branch_override = data.get("branch")
+    mode = data.get("mode", "api")
     # small safety limits by default
     max_files = int(data.get("max_files", 2000))
     max_file_size_bytes = int(data.get("max_file_size_bytes", 200 * 1024))  # 200 KB
 
+    if mode not in ("api", "tarball"):
+        raise ValueError("mode must be 'api' or 'tarball'")
+
+    if local_path:
+        full = resolve_local_path(local_path)
+        name = os.path.basename(full.rstrip(os.sep))
+        source = AnalysisSource("", name, branch_override,
+                                [((ValueError, OSError, tarfile.TarError), (f"Could not read {local_path}: ", 400))])
+        reader = ArchiveReader(max_files, max_file_size_bytes)
+        source.records = archive_records(source, reader, reader.iter_local(
+            full, ref=branch_override, strip_components=int(data.get("strip_components", 0))))
+        return source
+
     if not repo_url:
-        return jsonify({"error": "repo_url is required"}), 400
+        raise ValueError("repo_url or local_path is required")
+
+    owner, repo, branch_from_url = parse_github_url(repo_url)
+    branch = branch_override or branch_from_url or get_default_branch(owner, repo)
+    # Everything below reads this one commit, even if the branch moves meanwhile
+    commit = github.get_commit_sha(owner, repo, branch)
+    source = AnalysisSource(owner, repo, branch, [
+        ((requests.HTTPError,), ("GitHub API error: ", 500)),
+        ((ValueError, tarfile.TarError), ("", 500)),
+    ], commit)
+    since = data.get("since")
+    if since:
+        if not snapshots:
+            raise ValueError("since is disabled (set SNAPSHOT_DB_PATH)")
+        source.previous = snapshots.load(owner, repo, since)
+        if source.previous is None:
+            raise LookupError(f"No stored analysis of {owner}/{repo} at {since}")
+    source.options = options_key({"mode": mode, "max_files": max_files,
+                                  "max_file_size_bytes": max_file_size_bytes,
+                                  "include_content": bool(data.get("include_content")),
+                                  "dependents_of": data.get("dependents_of")})
+    if results:
+        source.stored = stored_result(source)
+        if source.stored is not None:
+            return source
+    if mode == "tarball":
+        reader = ArchiveReader(max_files, max_file_size_bytes)
+        source.records = archive_records(source, reader,
+                                         reader.iter_github_tarball(github.open_tarball(owner, repo, commit)))
+    else:
+        source.records = api_records(source, max_files, max_file_size_bytes)
+    return source
+
+
+def stored_result(source):
+    """
+    The stored JSON body for the source's commit and options, or None. With
+    "since" the delta is worked out from the two stored snapshots, and
+    nothing is served when the snapshot of the commit is missing.
+    """
+    body = results.load(source.owner, source.repo, source.commit, source.options)
+    if body is None or not source.previous:
+        return body
+    current = snapshots.load(source.owner, source.repo, source.commit)
+    if current is None:
+        return None
+    response = json.loads(body)
+    response["delta"] = {**snapshot_delta(source.previous, current), "blobs_fetched": 0}
+    return json.dumps(response).encode("utf-8")
+
+
+def save_result(source, result):
+    """
+    The response for an analysis result, stored when it is of a commit and
+    every file of it could be downloaded
+    """
+    response = {**source.meta(), **source.counts(), **result}
+    if source.commit and results and not source.incomplete:
+        # a delta belongs to the request, not to the commit
+        stored = {k: v for k, v in response.items() if k != "delta"}
+        results.save(source.owner, source.repo, source.commit, source.options,
+                     json.dumps(stored).encode("utf-8"))
+    return response
+
+
+def result_response(body, commit):
+    """JSON response for body, tagged with the commit it describes"""
+    response = Response(body, mimetype="application/json")
+    if commit:
+        response.set_etag(commit)
+        # may be kept, but has to be revalidated: the branch may have moved
+        response.cache_control.no_cache = True
+    return response
+
+
+def ndjson(event):
+    return json.dumps(event) + "\n"
+
+
+def analysis_events(source, include_content, dependents_of=None):
+    """
+    iter_repo_tree events for the source. A GitHub analysis is saved as a
+    snapshot of its commit, and with "since" a final ("delta", ...) event
+    tells what changed from that earlier snapshot.
+    """
+    recorder = SnapshotRecorder()
+    for kind, payload in iter_repo_tree(recorder.records(source.records), include_content=include_content,
+                                        dependents_of=dependents_of):
+        recorder.event(kind, payload)
+        yield kind, payload
+    # a truncated or incomplete analysis would stand in for the whole commit
+    if source.commit and snapshots and not source.warning and not source.incomplete:
+        snapshots.save(source.owner, source.repo, source.commit, recorder.snapshot())
+    if source.previous:
+        delta = snapshot_delta(source.previous, recorder.snapshot())
+        delta["blobs_fetched"] = source.blobs_fetched
+        yield "delta", delta
 
+
+def stream_analysis(source, include_content, dependents_of=None):
+    """
+    NDJSON events of an analysis, written while it runs: meta first, then
+    "files" (file tree entries), "nodes" and "edges" chunks, a "summary"
+    with stats and top_files, a "delta" with "since", and "done" with the
+    file counts; an "error" event ends the stream early. A stored result is
+    sent whole, as one "result" event between meta and done.
+    """
+    yield ndjson({"type": "meta", **source.meta()})
+    if source.stored is not None:
+        stored = json.loads(source.stored)
+        yield ndjson({"type": "result", **stored})
+        yield ndjson({"type": "done", **{key: stored.get(key) for key in source.counts()}})
+        return
+    # the result to store, folded from the events as they pass; file contents
+    # are not kept in memory for it, so a result with them is not stored
+    result = new_result() if source.commit and results and not include_content else None
     try:
-        owner, repo, branch_from_url = parse_github_url(repo_url)
-    except ValueError as e:
-        return jsonify({"error": str(e)}), 400
+        for kind, payload in analysis_events(source, include_content, dependents_of):
+            if result is not None:
+                add_event(result, kind, payload)
+            if kind == "summary":
+                yield ndjson({"type": kind, **payload})
+            else:
+                yield ndjson({"type": kind, kind: payload})
+    except source.exception_types() as e:
+        yield ndjson({"type": "error", "error": source.error(e)[0]})
+        return
+    if result is not None:
+        save_result(source, result)
+    yield ndjson({"type": "done", **source.counts()})
+
+
+@app.route("/api/analyze", methods=["POST"])
+def analyze():
+    """
+    Analyze a GitHub repository, or a local one when local_path is given.
+
+    mode "api" (default) lists the tree and fetches each file as a blob;
+    mode "tarball" downloads the whole repository once as an archive and
+    analyzes the files as they are decompressed. With "stream": true the
+    result is sent as NDJSON events while it is computed (see
+    stream_analysis). top_files carries file contents only with
+    "include_content": true, and "dependents_of": path adds the files that
+    import that path, directly or not, to the graph analytics.
+
+    Every GitHub analysis is pinned to a commit, returned as "commit" and as
+    the ETag, and its result is stored: while the branch still points at that
+    commit, the same request is answered from storage. Given "since": an
+    earlier commit, only blobs that changed since are fetched and a "delta"
+    against that analysis is returned with the full result. When some blobs
+    could not be downloaded the result says "incomplete": true and is not
+    stored.
+    """
+    return run_analysis(request.json or {})
 
-    branch = branch_override or branch_from_url or get_default_branch(owner, repo)
 
+@app.route("/api/repos/<owner>/<repo>/analysis")
+def repo_analysis(owner, repo):
+    """
+    Shareable GET form of /api/analyze for a GitHub repository: ref (branch,
+    tag or commit), mode, max_files, max_file_size_bytes, include_content
+    and dependents_of are query parameters. The ETag is the commit analyzed,
+    so a client sending it back in If-None-Match gets 304 Not Modified, after
+    one branch-head lookup, until the branch moves.
+    """
+    args = request.args
+    data = {"repo_url": f"https://github.com/{owner}/{repo}", "branch": args.get("ref"),
+            "include_content": args.get("include_content", "").lower() in ("1", "true"),
+            "dependents_of": args.get("dependents_of")}
+    data.update((key, args[key]) for key in ("mode", "max_files", "max_file_size_bytes") if key in args)
+    if request.if_none_match:
+        try:
+            commit = github.get_commit_sha(owner, repo, data["branch"] or get_default_branch(owner, repo))
+        except requests.HTTPError as e:
+            return jsonify({"error": f"GitHub API error: {e}"}), 500
+        if request.if_none_match.contains(commit):
+            response = Response(status=304)
+            response.set_etag(commit)
+            return response
+    return run_analysis(data)
+
+
+def run_analysis(data):
+    """The /api/analyze response for a request body"""
+    include_content = bool(data.get("include_content"))
+    dependents_of = data.get("dependents_of")
     try:
-        tree_resp = get_repo_tree(owner, repo, branch)
+        source = open_source(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except LookupError as e:
+        return jsonify({"error": str(e.args[0])}), 404
     except requests.HTTPError as e:
         return jsonify({"error": f"GitHub API error: {e}"}), 500
 
-    if "tree" not in tree_resp:
-        return jsonify({"error": "unexpected response from GitHub trees API"}), 500
+    if data.get("stream"):
+        return Response(stream_analysis(source, include_content, dependents_of),
+                        mimetype="application/x-ndjson")
+    if source.stored is not None:
+        return result_response(source.stored, source.commit)
+
+    try:
+        # analyze files for imports, links, line counts etc.
+        result = collect_result(analysis_events(source, include_content, dependents_of))
+    except source.exception_types() as e:
+        message, status = source.error(e)
+        return jsonify({"error": message}), status
+
+    response = save_result(source, result)
+    return result_response(json.dumps(response), source.commit)
 
-    entries = tree_resp["tree"]
-    files = [e for e in entries if e["type"] == "blob"]
-    if len(files) > max_files:
-        # return partial result but warn client
-        files = files[:max_files]
-        warning = f"Repo contains more than {max_files} files. Truncated."
-    else:
-        warning = None
 
-    files_info = []
-    # fetch blobs for content up to the size threshold
-    for f in files:
-        path = f["path"]
-        size = f.get("size", 0)
-        sha = f.get("sha")
-        content = None
-        # we will fetch content only for reasonably sized files (to avoid heavy downloads)
-        if size and size <= max_file_size_bytes:
-            try:
-                blob = get_blob(owner, repo, sha)
-                encoding = blob.get("encoding", "base64")
-                if encoding == "base64":
-                    import base64
-                    raw = base64.b64decode(blob["content"])
-                    try:
-                        content = raw.decode("utf-8", errors="replace")
-                    except Exception:
-                        content = None
-                else:
-                    content = blob.get("content")
-            except Exception:
-                content = None
-
-        files_info.append({
-            "path": path,
-            "size": size,
-            "mode": f.get("mode"),
-            "sha": sha,
-            "content": content
-        })
-
-    # analyze files for imports, links, line counts etc.
-    result = analyze_repo_tree(files_info, repo_owner=owner, repo_name=repo, branch=branch)
-
-    response = {
-        "owner": owner,
-        "repo": repo,
-        "branch": branch,
-        "file_count": len(entries),
-        "files_returned": len(files_info),
-        "warning": warning,
-        **result
-    }
-    return jsonify(response, 200)
+@app.route("/api/cache/stats")
+def cache_stats():
+    if not blob_cache:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **blob_cache.stats()})
 
 
 if __name__ == "__main__":
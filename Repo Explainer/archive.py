@@ -0,0 +1,149 @@
+"""
+Repository ingestion from a single archive instead of one API call per blob.
+
+ArchiveReader turns a tar stream (the GitHub tarball endpoint, a local
+tarball or `git archive` of a local clone) or a plain directory into the
+file records analyze_repo_tree takes, one at a time as they come out of the
+stream. Oversized files are skipped while streaming, without reading their
+data, and the reader stops after max_files files.
+"""
+import hashlib
+import os
+import re
+import subprocess
+import tarfile
+
+
+def git_blob_sha(data):
+    """The SHA-1 Git gives a blob with this content"""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def _record(path, size, mode, data):
+    content = None
+    sha = None
+    if data is not None:
+        sha = git_blob_sha(data)
+        content = data.decode("utf-8", errors="replace")
+    return {"path": path, "size": size, "mode": mode, "sha": sha, "content": content}
+
+
+def _inside(root, path):
+    """Whether path resolves to root (a real path) or somewhere under it"""
+    return os.path.commonpath([root, os.path.realpath(path)]) == root
+
+
+def _open_no_follow(path):
+    """path opened for reading in binary, refusing a symlink swapped in since it was checked"""
+    return os.fdopen(os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0)), "rb")
+
+
+def resolve_git_commit(repo_path, ref):
+    """
+    The commit SHA ref names in a local clone. ref comes from the request, so
+    it is never handed to git where it could be read as an option.
+    """
+    if not ref or ref.startswith("-"):
+        raise ValueError(f"invalid ref {ref!r}")
+    done = subprocess.run(["git", "-C", repo_path, "rev-parse", "--verify", "--quiet", "--end-of-options",
+                           f"{ref}^{{commit}}"], capture_output=True, text=True)
+    sha = done.stdout.strip()
+    if done.returncode != 0 or not re.fullmatch(r"[0-9a-f]{40}|[0-9a-f]{64}", sha):
+        raise ValueError(f"unknown ref {ref!r}")
+    return sha
+
+
+class ArchiveReader:
+    """
+    Iterate it once for the file records; afterwards file_count holds how many
+    files the source had and truncated whether max_files cut it short.
+    """
+
+    def __init__(self, max_files, max_file_size_bytes):
+        self.max_files = max_files
+        self.max_file_size_bytes = max_file_size_bytes
+        self.file_count = 0
+        self.truncated = False
+
+    def _wanted(self):
+        """Count one more file; False once it is past max_files"""
+        self.file_count += 1
+        if self.file_count > self.max_files:
+            self.truncated = True
+            return False
+        return True
+
+    def iter_tar(self, fileobj, strip_components=0):
+        """Records from a (possibly compressed) tar stream, read front to back (.git is skipped)"""
+        with tarfile.open(fileobj=fileobj, mode="r|*") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                parts = member.name.split("/")[strip_components:]
+                if not parts or ".git" in parts[:-1]:
+                    continue
+                if not self._wanted():
+                    # keep counting the rest of the archive for file_count
+                    continue
+                data = None
+                if member.size and member.size <= self.max_file_size_bytes:
+                    data = tar.extractfile(member).read()
+                mode = "100755" if member.mode & 0o111 else "100644"
+                yield _record("/".join(parts), member.size, mode, data)
+
+    def iter_github_tarball(self, response):
+        """Records from a streamed GitHub tarball response (owner-repo-sha/ prefix stripped)"""
+        with response:
+            response.raw.decode_content = True
+            yield from self.iter_tar(response.raw, strip_components=1)
+
+    def iter_git_archive(self, repo_path, ref="HEAD"):
+        """Records from `git archive` of a local clone"""
+        sha = resolve_git_commit(repo_path, ref)
+        proc = subprocess.Popen(["git", "-C", repo_path, "archive", "--format=tar", sha],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            yield from self.iter_tar(proc.stdout)
+        finally:
+            proc.stdout.close()
+            stderr = proc.stderr.read().decode("utf-8", errors="replace")
+            proc.stderr.close()
+            if proc.wait() != 0:
+                raise ValueError(f"git archive failed: {stderr.strip()}")
+
+    def iter_directory(self, root):
+        """
+        Records from a plain directory tree (.git is skipped). Symlinks are
+        skipped too, and so is anything resolving outside root: a link could
+        point at any file of the host.
+        """
+        root = os.path.realpath(root)
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if d != ".git")
+            for name in sorted(filenames):
+                full = os.path.join(dirpath, name)
+                if os.path.islink(full) or not os.path.isfile(full) or not _inside(root, full):
+                    continue
+                if not self._wanted():
+                    continue
+                size = os.path.getsize(full)
+                data = None
+                if size and size <= self.max_file_size_bytes:
+                    with _open_no_follow(full) as f:
+                        data = f.read()
+                path = os.path.relpath(full, root).replace(os.sep, "/")
+                yield _record(path, size, "100644", data)
+
+    def iter_local(self, path, ref=None, strip_components=0):
+        """Records from a local tarball, git clone or directory"""
+        if os.path.islink(path):
+            raise ValueError(f"Not following a symlink: {path}")
+        if os.path.isfile(path):
+            with _open_no_follow(path) as f:
+                yield from self.iter_tar(f, strip_components)
+        elif os.path.isdir(os.path.join(path, ".git")):
+            yield from self.iter_git_archive(path, ref or "HEAD")
+        elif os.path.isdir(path):
+            yield from self.iter_directory(path)
+        else:
+            raise ValueError(f"No such file or directory: {path}")
@@ -0,0 +1,52 @@
+"""
+Benchmark: wall-clock time to download every blob of a repository from a
+local stub of the GitHub API with simulated latency, for the old sequential
+requests.get loop and for GitHubClient at increasing concurrency.
+
+Usage:
+    python bench_fetch.py               # 500 files, 20 ms per request
+    python bench_fetch.py 2000 0.05     # files, seconds of latency
+"""
+import sys
+import time
+
+import requests
+
+from fetcher import GitHubClient, decode_blob
+from stub_github import StubGitHub
+
+
+def sequential(url, shas):
+    """The loop app.py used before GitHubClient: one requests.get per blob"""
+    contents = {}
+    for sha in shas:
+        r = requests.get(f"{url}/repos/owner/repo/git/blobs/{sha}")
+        r.raise_for_status()
+        contents[sha] = decode_blob(r.json())
+    return contents
+
+
+def main(n_files, latency):
+    files = {f"src/module{i}.py": f"import module{i + 1}\nVALUE = {i}\n" for i in range(n_files)}
+    with StubGitHub(files, latency=latency) as stub:
+        shas = [e["sha"] for e in stub.tree]
+        print(f"{n_files} blobs, {latency * 1000:.0f} ms simulated latency")
+        print(f"{'mode':<16}{'seconds':>9}{'blobs/s':>10}")
+
+        start = time.perf_counter()
+        expected = sequential(stub.url, shas)
+        elapsed = time.perf_counter() - start
+        print(f"{'sequential':<16}{elapsed:>9.2f}{n_files / elapsed:>10.1f}")
+
+        for workers in (1, 2, 4, 8, 16, 32, 64):
+            client = GitHubClient(stub.url, max_workers=workers)
+            start = time.perf_counter()
+            contents = client.fetch_blob_contents("owner", "repo", shas)
+            elapsed = time.perf_counter() - start
+            assert contents == expected
+            print(f"{f'{workers} workers':<16}{elapsed:>9.2f}{n_files / elapsed:>10.1f}")
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 500, float(args[1]) if len(args) > 1 else 0.02)
@@ -0,0 +1,89 @@
+"""
+Benchmark: memory and time of the dependency graph with 100k edges, held as
+the per-edge dicts analyze_repo_tree used to build and as a DependencyGraph,
+plus the time of each analytics query on it.
+
+Usage:
+    python bench_graph.py                # 20000 files, 100000 edges
+    python bench_graph.py 50000 500000
+"""
+import random
+import sys
+import time
+import tracemalloc
+
+from graph import GraphBuilder
+
+
+def synthetic_edges(n_nodes, n_edges, seed=0):
+    """[(source, target)] mostly pointing at earlier files, with some cycles"""
+    rng = random.Random(seed)
+    edges = []
+    for _ in range(n_edges):
+        source = rng.randrange(1, n_nodes)
+        if rng.random() < 0.97:
+            target = rng.randrange(source)
+        else:
+            target = rng.randrange(n_nodes)
+        edges.append((source, target))
+    edges.sort(key=lambda edge: edge[0])
+    return edges
+
+
+def measure(build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    value = build()
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, elapsed, size
+
+
+def main(n_nodes, n_edges):
+    paths = [f"src/package{i // 100}/module{i}.py" for i in range(n_nodes)]
+    edges = synthetic_edges(n_nodes, n_edges)
+    print(f"{n_nodes} files, {n_edges} edges")
+    print(f"{'representation':<18}{'seconds':>9}{'MB':>8}")
+
+    def dicts():
+        return [{"source": paths[s], "target": paths[t], "type": "py-import"} for s, t in edges]
+
+    def compact():
+        builder = GraphBuilder()
+        for path in paths:
+            builder.add_node(path, "Python", 100, 10)
+        by_source = [[] for _ in paths]
+        for s, t in edges:
+            by_source[s].append((t, "py-import"))
+        for s, targets in enumerate(by_source):
+            builder.add_edges(s, targets)
+        return builder.build()
+
+    expected, elapsed, size = measure(dicts)
+    print(f"{'edge dicts':<18}{elapsed:>9.3f}{size / 1e6:>8.1f}")
+    # the node list is shared with the dicts above, so it is not counted twice
+    graph, elapsed, size = measure(compact)
+    index_size = sys.getsizeof(graph.index) + sys.getsizeof(graph.paths)
+    print(f"{'DependencyGraph':<18}{elapsed:>9.3f}{size / 1e6:>8.1f}"
+          f"   (edge buffers {(graph.targets.itemsize + graph.types.itemsize) * graph.edge_count / 1e6:.1f} MB,"
+          f" path index {index_size / 1e6:.1f} MB)")
+    assert [e for chunk in graph.iter_edge_dicts(10000) for e in chunk] == expected
+
+    print(f"{'query':<18}{'seconds':>9}")
+    for name, query in [
+        ("cycles", graph.cycles),
+        ("layers", graph.layers),
+        ("fan_in", graph.fan_in),
+        ("fan_out", graph.fan_out),
+        ("dependents", lambda: graph.dependents(paths[0])),
+        ("edge dicts", lambda: sum(len(chunk) for chunk in graph.iter_edge_dicts(1000))),
+    ]:
+        start = time.perf_counter()
+        query()
+        print(f"{name:<18}{time.perf_counter() - start:>9.3f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 100000)
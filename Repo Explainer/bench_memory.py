@@ -0,0 +1,57 @@
+"""
+Benchmark: peak traced memory (tracemalloc) of analyze_repo_tree when the
+files are handed over as a materialized list, as app.py used to, and as a
+generator producing one file at a time, for growing repositories.
+
+With the list every content is alive at once; with the generator the peak
+is the per-file metadata and the result plus the one file being scanned,
+so it grows with the number of files but not with their contents, and a
+single large file only adds about its own size.
+
+Usage:
+    python bench_memory.py               # 8 KB files
+    python bench_memory.py 32768         # file size in bytes
+"""
+import sys
+import time
+import tracemalloc
+
+from analyzer import analyze_repo_tree
+
+
+FILLER = "def handler(request):\n    return render(request, 'page.html')\n\n"
+
+
+def iter_files(n_files, file_size, large_file=0):
+    """Python files with a few imports each, padded with ordinary code"""
+    for i in range(n_files):
+        size = large_file if i == n_files // 2 and large_file else file_size
+        imports = "".join(f"import pkg.module{(i * 7 + k) % n_files}\n" for k in range(5))
+        body = imports + FILLER * (max(size - len(imports), 0) // len(FILLER))
+        yield {"path": f"pkg/module{i}.py", "size": len(body), "content": body}
+
+
+def peak(make_files):
+    tracemalloc.start()
+    start = time.perf_counter()
+    analyze_repo_tree(make_files())
+    elapsed = time.perf_counter() - start
+    top = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return top, elapsed
+
+
+def main(file_size):
+    print(f"{file_size // 1024} KB files")
+    print(f"{'files':>7}{'largest':>9}{'content MB':>12}{'list MB':>10}{'stream MB':>11}{'stream s':>10}")
+    for n_files, large_file in [(1000, 0), (4000, 0), (8000, 0), (8000, 16 << 20)]:
+        content_mb = (n_files * file_size + large_file) / 1e6
+        list_peak, _ = peak(lambda: list(iter_files(n_files, file_size, large_file)))
+        stream_peak, elapsed = peak(lambda: iter_files(n_files, file_size, large_file))
+        largest = f"{max(file_size, large_file) // 1024} KB"
+        print(f"{n_files:>7}{largest:>9}{content_mb:>12.1f}{list_peak / 1e6:>10.1f}"
+              f"{stream_peak / 1e6:>11.1f}{elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 8192)
@@ -0,0 +1,124 @@
+"""
+Benchmark: import resolution on a synthetic repository, for the
+resolve_relative helper analyze_repo_tree used before ImportResolver and for
+ImportResolver. Every edge the old helper found must be found again; the
+extra edges come from package __init__ files, relative Python imports and
+modules next to the importing script.
+
+Usage:
+    python bench_resolve.py            # 50000 files
+    python bench_resolve.py 200000
+"""
+import os
+import random
+import sys
+import time
+
+from analyzer import ImportResolver, scan_content
+
+
+def legacy_resolve_relative(path_set, base_path, rel):
+    """resolve_relative as it was nested in analyze_repo_tree"""
+    if rel.startswith(('.', '/')):
+        base_dir = '/'.join(base_path.split('/')[:-1])
+        candidate = os.path.normpath(base_dir + '/' + rel)
+        candidate = candidate.lstrip('./')
+        if candidate in path_set:
+            return candidate
+        for ext_try in ['.py', '.js', '.jsx', '.ts', '.tsx', '.html']:
+            if candidate + ext_try in path_set:
+                return candidate + ext_try
+    else:
+        cand = rel.replace('.', '/') + '.py'
+        if cand in path_set:
+            return cand
+        cand2 = rel + '.js'
+        if cand2 in path_set:
+            return cand2
+    return None
+
+
+def pick(rng, modules, index):
+    """An import target the way real code picks them: mostly shared core modules
+    and neighbours in the same package, sometimes anything"""
+    kind = rng.random()
+    if kind < 0.5:
+        return modules[int(rng.paretovariate(1.2)) % 100]
+    if kind < 0.8:
+        return modules[max(0, index - rng.randrange(20))]
+    return rng.choice(modules)
+
+
+def synthetic_repo(n_files, seed=0):
+    """{path: content}: Python packages and JS component folders importing each other"""
+    rng = random.Random(seed)
+    files = {}
+    n_py = n_files // 2
+    py_modules = []
+    for i in range(n_py):
+        package = f"pkg{i // 200}/sub{i // 20 % 10}"
+        if i % 20 == 0:
+            files[f"{package}/__init__.py"] = ""
+        py_modules.append(f"{package}/mod{i}")
+    for index, module in enumerate(py_modules):
+        lines = []
+        for _ in range(6):
+            other = pick(rng, py_modules, index)
+            dotted = other.replace('/', '.')
+            kind = rng.random()
+            if kind < 0.4:
+                lines.append(f"import {dotted}")
+            elif kind < 0.6:
+                lines.append(f"from {dotted.rpartition('.')[0]} import {dotted.rpartition('.')[2]}")
+            elif kind < 0.8:
+                lines.append(f"from .{other.rpartition('/')[2]} import thing")
+            else:
+                lines.append(rng.choice(["import os", "import json", "from typing import List"]))
+        files[module + ".py"] = "\n".join(lines) + "\n"
+    js_files = [f"src/feature{i // 50}/component{i}" for i in range(n_files - len(files))]
+    for index, module in enumerate(js_files):
+        lines = []
+        for _ in range(6):
+            other = pick(rng, js_files, index)
+            rel = os.path.relpath(other, os.path.dirname(module))
+            if not rel.startswith('.'):
+                rel = './' + rel
+            lines.append(rng.choice([f"import x from '{rel}'", f"const y = require('{rel}')",
+                                     "import React from 'react'"]))
+        files[module + rng.choice([".js", ".jsx", ".ts"])] = "\n".join(lines) + "\n"
+    return files
+
+
+def main(n_files):
+    files = synthetic_repo(n_files)
+    scans = {path: scan_content(content) for path, content in files.items()}
+    n_refs = sum(len(s["refs"]) for s in scans.values())
+    print(f"{len(files)} files, {n_refs} references")
+
+    start = time.perf_counter()
+    path_set = set(files)
+    legacy = [(path, legacy_resolve_relative(path_set, path, ref), kind)
+              for path, scan in scans.items() for kind, ref in scan["refs"]]
+    legacy = [edge for edge in legacy if edge[1]]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    resolver = ImportResolver(files)
+    index_time = time.perf_counter() - start
+    edges = [(path, target, kind)
+             for path, scan in scans.items()
+             for (kind, ref), target in zip(scan["refs"], resolver.resolve_refs(path, scan["refs"]))
+             if target]
+    resolver_time = time.perf_counter() - start
+
+    missing = set(legacy) - set(edges)
+    assert not missing, f"{len(missing)} legacy edges lost, e.g. {next(iter(missing))}"
+    print(f"{'resolver':<16}{'seconds':>9}{'edges':>9}")
+    print(f"{'legacy':<16}{legacy_time:>9.3f}{len(legacy):>9}")
+    print(f"{'ImportResolver':<16}{resolver_time:>9.3f}{len(edges):>9}"
+          f"   ({index_time:.3f}s building indexes)")
+    print(f"speedup {legacy_time / resolver_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
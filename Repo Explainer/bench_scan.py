@@ -0,0 +1,53 @@
+"""
+Benchmark: analyze_repo_tree on a synthetic repository with the import scan
+done serially and on process pools of 1..N workers. Every parallel result
+must be identical to the serial one.
+
+Usage:
+    python bench_scan.py                 # 20000 files, up to os.cpu_count() workers
+    python bench_scan.py 50000 8
+"""
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from analyzer import analyze_repo_tree
+from bench_resolve import synthetic_repo
+
+# Ordinary code between the imports, so the scan does realistic work per file
+FILLER = "".join(f"def handler_{i}(request):\n    return render(request, 'page_{i}.html')\n\n"
+                 for i in range(40))
+
+
+def files_info(files):
+    return [{"path": path, "size": len(content), "content": content + FILLER}
+            for path, content in files.items()]
+
+
+def main(n_files, max_workers):
+    files = synthetic_repo(n_files)
+    total_mb = sum(len(c) + len(FILLER) for c in files.values()) / 1e6
+    print(f"{n_files} files, {total_mb:.0f} MB of source, {os.cpu_count()} CPUs")
+    print(f"{'mode':<12}{'seconds':>9}{'speedup':>9}")
+
+    start = time.perf_counter()
+    expected = analyze_repo_tree(files_info(files))
+    serial = time.perf_counter() - start
+    print(f"{'serial':<12}{serial:>9.2f}{1:>9.1f}")
+
+    workers = 1
+    while workers <= max_workers:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pool.submit(int).result()  # start-up is not part of a request
+            start = time.perf_counter()
+            result = analyze_repo_tree(files_info(files), executor=pool)
+            elapsed = time.perf_counter() - start
+        assert result == expected, f"{workers} workers differ from the serial result"
+        print(f"{f'{workers} workers':<12}{elapsed:>9.2f}{serial / elapsed:>9.1f}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1)
@@ -0,0 +1,119 @@
+"""
+On-disk cache of blob contents and their scans, keyed by Git blob SHA.
+
+A blob SHA names its content forever, so once a blob has been downloaded and
+scanned (analyzer.scan_content) neither has to happen again: re-analyzing a
+branch where a few files changed only fetches and scans those few. Entries
+live in one SQLite file and the least recently used ones are evicted once the
+stored content passes max_bytes.
+"""
+import json
+import sqlite3
+import threading
+import time
+
+from analyzer import SCAN_VERSION
+
+# Bound parameters per SELECT; SQLite's default limit is 999
+_CHUNK = 500
+
+
+class BlobCache:
+    def __init__(self, path, max_bytes=512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " sha TEXT PRIMARY KEY,"
+            " version INTEGER NOT NULL,"
+            " content TEXT NOT NULL,"
+            " bytes INTEGER NOT NULL,"
+            " lines INTEGER NOT NULL,"
+            " refs TEXT NOT NULL,"
+            " used REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS blobs_used ON blobs (used)")
+        self._db.commit()
+        self.total_bytes = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM blobs").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, shas):
+        """{sha: {"content", "scan"}} for the cached blobs among shas"""
+        shas = list(dict.fromkeys(shas))
+        found = {}
+        with self._lock:
+            for i in range(0, len(shas), _CHUNK):
+                chunk = shas[i:i + _CHUNK]
+                marks = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT sha, content, lines, refs FROM blobs WHERE version = ? AND sha IN ({marks})",
+                    [SCAN_VERSION, *chunk])
+                for sha, content, lines, refs in rows:
+                    found[sha] = {"content": content, "scan": {"lines": lines, "refs": json.loads(refs)}}
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE blobs SET used = ? WHERE sha = ?",
+                                     [(now, sha) for sha in found])
+                self._db.commit()
+            self.hits += len(found)
+            self.misses += len(shas) - len(found)
+        return found
+
+    def get(self, sha):
+        return self.get_many([sha]).get(sha)
+
+    def put_many(self, entries):
+        """Store (sha, content, scan) triples, then evict down to max_bytes"""
+        now = time.time()
+        rows = list({sha: (sha, SCAN_VERSION, content, len(content.encode("utf-8")), scan["lines"],
+                           json.dumps(scan["refs"]), now)
+                     for sha, content, scan in entries if content is not None}.values())
+        if not rows:
+            return
+        with self._lock:
+            shas = [row[0] for row in rows]
+            replaced = 0
+            for i in range(0, len(shas), _CHUNK):
+                chunk = shas[i:i + _CHUNK]
+                marks = ",".join("?" * len(chunk))
+                replaced += self._db.execute(
+                    f"SELECT COALESCE(SUM(bytes), 0) FROM blobs WHERE sha IN ({marks})", chunk).fetchone()[0]
+            self._db.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self.total_bytes += sum(row[3] for row in rows) - replaced
+            self._evict()
+            self._db.commit()
+
+    def put(self, sha, content, scan):
+        self.put_many([(sha, content, scan)])
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes:
+            oldest = self._db.execute("SELECT sha, bytes FROM blobs ORDER BY used LIMIT 256").fetchall()
+            if not oldest:
+                self.total_bytes = 0
+                return
+            for sha, size in oldest:
+                if self.total_bytes <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM blobs WHERE sha = ?", (sha,))
+                self.total_bytes -= size
+
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        self._db.close()
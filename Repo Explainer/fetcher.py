@@ -0,0 +1,191 @@
+import base64
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Transient server errors worth another try
+RETRY_STATUSES = {500, 502, 503, 504}
+
+
+class RateLimitError(requests.HTTPError):
+    pass
+
+
+def decode_blob(blob):
+    """Text content of a Git blobs API response"""
+    encoding = blob.get("encoding", "base64")
+    if encoding == "base64":
+        raw = base64.b64decode(blob["content"])
+        return raw.decode("utf-8", errors="replace")
+    return blob.get("content")
+
+
+class GitHubClient:
+    """
+    Small GitHub REST client shared by every request of the app.
+
+    All calls go through one pooled requests.Session. Blob downloads run on a
+    bounded thread pool, failed calls are retried with exponential backoff,
+    and once GitHub reports the rate limit as exhausted (X-RateLimit-Remaining
+    of 0, or Retry-After) every worker waits for the reset instead of burning
+    requests on 403s. Repository and branch-head lookups are conditional
+    requests (If-None-Match): an unchanged answer is a 304, which GitHub does
+    not count against the rate limit.
+    """
+
+    # Conditional answers kept, least recently used dropped first
+    MAX_CONDITIONAL = 1024
+
+    def __init__(self, api_base="https://api.github.com", headers=None, max_workers=16,
+                 max_retries=3, backoff=0.5, timeout=30, max_rate_limit_wait=60):
+        self.api_base = api_base.rstrip("/")
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_rate_limit_wait = max_rate_limit_wait
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._resume_at = 0.0  # time.time() before which no request is sent
+        # url: (ETag, value) of conditional requests
+        self._conditional = OrderedDict()
+
+    def _wait_for_rate_limit(self):
+        with self._lock:
+            delay = self._resume_at - time.time()
+        if delay > self.max_rate_limit_wait:
+            raise RateLimitError(f"GitHub rate limit exhausted for another {int(delay)}s")
+        if delay > 0:
+            time.sleep(delay)
+
+    def _note_rate_limit(self, r):
+        """Returns True when the response is a rate-limit rejection"""
+        resume_at = None
+        retry_after = r.headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                resume_at = time.time() + float(retry_after)
+            except ValueError:
+                resume_at = None
+        elif r.headers.get("X-RateLimit-Remaining") == "0":
+            try:
+                resume_at = float(r.headers.get("X-RateLimit-Reset", 0))
+            except ValueError:
+                resume_at = None
+        if resume_at is not None:
+            with self._lock:
+                self._resume_at = max(self._resume_at, resume_at)
+        return r.status_code == 429 or (r.status_code == 403 and resume_at is not None)
+
+    def _get(self, url, **kwargs):
+        """GET with rate-limit waits and retries; returns the successful response"""
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            self._wait_for_rate_limit()
+            try:
+                r = self.session.get(url, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+                continue
+            if self._note_rate_limit(r):
+                r.close()
+                if last_attempt:
+                    raise RateLimitError(f"GitHub rate limit exceeded for {url}", response=r)
+                continue
+            if r.status_code in RETRY_STATUSES and not last_attempt:
+                r.close()
+                time.sleep(self.backoff * 2 ** attempt)
+                continue
+            r.raise_for_status()
+            return r
+
+    def get_json(self, path):
+        return self._get(self.api_base + path).json()
+
+    def _get_conditional(self, url, parse, headers=None):
+        """
+        parse(response) of a GET, revalidated with the ETag of the last answer
+        for url: on 304 Not Modified the value parsed then is returned again
+        """
+        headers = dict(headers or {})
+        with self._lock:
+            known = self._conditional.get(url)
+        if known:
+            headers["If-None-Match"] = known[0]
+        r = self._get(url, headers=headers)
+        if r.status_code == 304 and known:
+            with self._lock:
+                if url in self._conditional:
+                    self._conditional.move_to_end(url)
+            return known[1]
+        value = parse(r)
+        etag = r.headers.get("ETag")
+        if etag:
+            with self._lock:
+                self._conditional[url] = (etag, value)
+                self._conditional.move_to_end(url)
+                while len(self._conditional) > self.MAX_CONDITIONAL:
+                    self._conditional.popitem(last=False)
+        return value
+
+    def get_default_branch(self, owner, repo):
+        return self._get_conditional(f"{self.api_base}/repos/{owner}/{repo}",
+                                     lambda r: r.json().get("default_branch", "main"))
+
+    def get_repo_tree(self, owner, repo, branch):
+        # Use the Git Trees API with recursive=1 to get a listing of repository files.
+        return self.get_json(f"/repos/{owner}/{repo}/git/trees/{branch}?recursive=1")
+
+    def get_commit_sha(self, owner, repo, ref):
+        """SHA of the commit a branch, tag or SHA points at; cheap when unchanged"""
+        return self._get_conditional(f"{self.api_base}/repos/{owner}/{repo}/commits/{ref}",
+                                     lambda r: r.text.strip(),
+                                     headers={"Accept": "application/vnd.github.sha"})
+
+    def get_blob(self, owner, repo, sha):
+        return self.get_json(f"/repos/{owner}/{repo}/git/blobs/{sha}")
+
+    def open_tarball(self, owner, repo, ref):
+        """Streaming response for the repository tarball at ref (gzip-compressed tar)"""
+        return self._get(f"{self.api_base}/repos/{owner}/{repo}/tarball/{ref}", stream=True)
+
+    def _blob_content(self, owner, repo, sha):
+        try:
+            return decode_blob(self.get_blob(owner, repo, sha))
+        except RateLimitError:
+            # every other download would hit the same limit
+            raise
+        except Exception:
+            return None
+
+    def iter_blob_contents(self, owner, repo, shas):
+        """
+        Yields (sha, content) as downloads finish; content is None when a
+        download failed. RateLimitError is raised, and the downloads not
+        started yet are dropped.
+        """
+        shas = list(dict.fromkeys(shas))
+        if not shas:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(shas))) as pool:
+            futures = {pool.submit(self._blob_content, owner, repo, sha): sha for sha in shas}
+            try:
+                for future in as_completed(futures):
+                    yield futures[future], future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def fetch_blob_contents(self, owner, repo, shas):
+        """{sha: content} for every sha, fetched concurrently"""
+        return dict(self.iter_blob_contents(owner, repo, shas))
@@ -0,0 +1,308 @@
+"""
+Compact dependency graph of a repository, and analytics on it.
+
+Files are interned as integer ids in the order they are added; every
+per-node attribute and the edge list live in `array` buffers, with the
+edges of a file stored together (CSR: out_offsets[i]:out_offsets[i + 1]
+indexes the edges of node i). The nodes and edges JSON of analyze_repo_tree
+is generated from these buffers, and the reverse adjacency used by the
+dependent and fan-in queries is built only when first needed.
+
+    builder = GraphBuilder()
+    a = builder.add_node("app.py", "Python", 120, 10)
+    b = builder.add_node("util.py", "Python", 40, 3)
+    builder.add_edges(a, [(b, "py-import")])
+    graph = builder.build()
+    graph.cycles(), graph.layers(), graph.dependents("util.py")
+"""
+from array import array
+
+
+class _Nodes:
+    """Node attributes shared by GraphBuilder and DependencyGraph"""
+
+    def node_dicts(self, start=0, stop=None):
+        """The nodes with ids start..stop as JSON dicts"""
+        paths = self.paths
+        languages = self.languages
+        return [{
+            "id": paths[i],
+            "label": paths[i].split('/')[-1],
+            "group": languages[self.language[i]],
+            "size": self.size[i],
+            "lines": self.lines[i]
+        } for i in range(start, len(paths) if stop is None else stop)]
+
+
+class GraphBuilder(_Nodes):
+    """Collects nodes, then the edges of each node in node order"""
+
+    def __init__(self):
+        self.paths = []
+        self.index = {}
+        self.languages = []
+        self._language_ids = {}
+        self.edge_types = []
+        self._edge_type_ids = {}
+        self.language = array('H')
+        self.size = array('q')
+        self.lines = array('q')
+        self.out_offsets = array('q', [0])
+        self.targets = array('l')
+        self.types = array('B')
+
+    @staticmethod
+    def _intern(value, values, ids):
+        i = ids.get(value)
+        if i is None:
+            i = ids[value] = len(values)
+            values.append(value)
+        return i
+
+    def add_node(self, path, language, size, lines):
+        """Id of a new node; paths must be unique"""
+        node = len(self.paths)
+        self.paths.append(path)
+        self.index[path] = node
+        self.language.append(self._intern(language, self.languages, self._language_ids))
+        self.size.append(size)
+        self.lines.append(lines)
+        return node
+
+    def add_edges(self, source, edges):
+        """
+        The edges [(target id, edge type), ...] of node source. Called once per
+        node, for every node in id order.
+        """
+        assert source == len(self.out_offsets) - 1, "edges must be added in node order"
+        for target, edge_type in edges:
+            self.targets.append(target)
+            self.types.append(self._intern(edge_type, self.edge_types, self._edge_type_ids))
+        self.out_offsets.append(len(self.targets))
+
+    def build(self):
+        # nodes whose edges were never added have none
+        while len(self.out_offsets) <= len(self.paths):
+            self.out_offsets.append(len(self.targets))
+        return DependencyGraph(self)
+
+
+class DependencyGraph(_Nodes):
+    def __init__(self, builder):
+        self.paths = builder.paths
+        self.index = builder.index
+        self.languages = builder.languages
+        self.edge_types = builder.edge_types
+        self.language = builder.language
+        self.size = builder.size
+        self.lines = builder.lines
+        self.out_offsets = builder.out_offsets
+        self.targets = builder.targets
+        self.types = builder.types
+        self._in_offsets = None
+        self._sources = None
+        self._components = None
+
+    def __len__(self):
+        return len(self.paths)
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    # ------------------------------------------------------------------ JSON
+
+    def iter_edge_dicts(self, chunk_size):
+        """The edges as {source, target, type} dicts, chunk_size at a time"""
+        paths = self.paths
+        edge_types = self.edge_types
+        offsets = self.out_offsets
+        chunk = []
+        for source in range(len(paths)):
+            for e in range(offsets[source], offsets[source + 1]):
+                chunk.append({"source": paths[source], "target": paths[self.targets[e]],
+                              "type": edge_types[self.types[e]]})
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    # ------------------------------------------------------------- adjacency
+
+    def dependencies_of(self, node):
+        """Distinct ids node imports"""
+        return set(self.targets[self.out_offsets[node]:self.out_offsets[node + 1]])
+
+    def _reverse(self):
+        """Reverse CSR: _sources[_in_offsets[i]:_in_offsets[i + 1]] import node i"""
+        if self._in_offsets is None:
+            n = len(self.paths)
+            counts = array('q', bytes(8 * (n + 1)))
+            for target in self.targets:
+                counts[target + 1] += 1
+            for i in range(n):
+                counts[i + 1] += counts[i]
+            fill = array('q', counts)
+            sources = array('l', bytes(self.targets.itemsize * len(self.targets)))
+            offsets = self.out_offsets
+            for source in range(n):
+                for e in range(offsets[source], offsets[source + 1]):
+                    target = self.targets[e]
+                    sources[fill[target]] = source
+                    fill[target] += 1
+            self._in_offsets = counts
+            self._sources = sources
+        return self._in_offsets, self._sources
+
+    def dependents_of(self, node):
+        """Distinct ids importing node"""
+        offsets, sources = self._reverse()
+        return set(sources[offsets[node]:offsets[node + 1]])
+
+    # ------------------------------------------------------------- analytics
+
+    def fan_out(self):
+        """Number of distinct files each node imports, by id"""
+        return array('q', (len(self.dependencies_of(i)) for i in range(len(self.paths))))
+
+    def fan_in(self):
+        """Number of distinct files importing each node, by id"""
+        return array('q', (len(self.dependents_of(i)) for i in range(len(self.paths))))
+
+    def ranking(self, counts, limit=20):
+        """[{"path", "count"}] of the largest counts, ties in node order"""
+        ranked = sorted((i for i in range(len(counts)) if counts[i]), key=lambda i: -counts[i])
+        return [{"path": self.paths[i], "count": counts[i]} for i in ranked[:limit]]
+
+    def dependents(self, path):
+        """Paths that import path directly or through other files, nearest first"""
+        start = self.index[path]
+        offsets, sources = self._reverse()
+        seen = bytearray(len(self.paths))
+        seen[start] = 1
+        order = []
+        frontier = [start]
+        while frontier:
+            following = []
+            for node in frontier:
+                for e in range(offsets[node], offsets[node + 1]):
+                    source = sources[e]
+                    if not seen[source]:
+                        seen[source] = 1
+                        order.append(source)
+                        following.append(source)
+            frontier = following
+        return [self.paths[i] for i in order]
+
+    def components(self):
+        """
+        Strongly connected component id of every node (iterative Tarjan).
+        Components are numbered in reverse topological order: a component
+        only imports components with smaller ids.
+        """
+        if self._components is None:
+            self._components = self._tarjan()
+        return self._components
+
+    def _tarjan(self):
+        n = len(self.paths)
+        offsets = self.out_offsets
+        targets = self.targets
+        unvisited = -1
+        index = array('l', [unvisited]) * n
+        low = array('l', [0]) * n
+        component = array('l', [unvisited]) * n
+        on_stack = bytearray(n)
+        stack = []
+        counter = 0
+        n_components = 0
+        for root in range(n):
+            if index[root] != unvisited:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            # (node, next edge to look at)
+            work = [(root, offsets[root])]
+            while work:
+                node, e = work[-1]
+                end = offsets[node + 1]
+                while e < end:
+                    target = targets[e]
+                    e += 1
+                    if index[target] == unvisited:
+                        work[-1] = (node, e)
+                        index[target] = low[target] = counter
+                        counter += 1
+                        stack.append(target)
+                        on_stack[target] = 1
+                        work.append((target, offsets[target]))
+                        break
+                    if on_stack[target] and index[target] < low[node]:
+                        low[node] = index[target]
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        if low[node] < low[parent]:
+                            low[parent] = low[node]
+                    if low[node] == index[node]:
+                        while True:
+                            member = stack.pop()
+                            on_stack[member] = 0
+                            component[member] = n_components
+                            if member == node:
+                                break
+                        n_components += 1
+        return component
+
+    def cycles(self):
+        """Import cycles: the paths of every component with more than one file, or a self-import"""
+        component = self.components()
+        members = {}
+        for node in range(len(self.paths)):
+            members.setdefault(component[node], []).append(node)
+        cycles = []
+        for nodes in members.values():
+            if len(nodes) > 1 or nodes[0] in self.dependencies_of(nodes[0]):
+                cycles.append([self.paths[i] for i in nodes])
+        return sorted(cycles, key=lambda paths: (-len(paths), paths[0]))
+
+    def layers(self):
+        """
+        Topological layer of every node, by id: 0 for files importing nothing
+        in the repository, otherwise one more than the deepest file they
+        import. Files in one import cycle share a layer.
+        """
+        component = self.components()
+        n_components = max(component) + 1 if len(component) else 0
+        # components are in reverse topological order, so dependencies come first
+        members = [[] for _ in range(n_components)]
+        for node in range(len(self.paths)):
+            members[component[node]].append(node)
+        component_layer = array('l', [0]) * n_components
+        offsets = self.out_offsets
+        for c in range(n_components):
+            layer = 0
+            for node in members[c]:
+                for e in range(offsets[node], offsets[node + 1]):
+                    target_component = component[self.targets[e]]
+                    if target_component != c and component_layer[target_component] + 1 > layer:
+                        layer = component_layer[target_component] + 1
+            component_layer[c] = layer
+        return array('l', (component_layer[component[node]] for node in range(len(self.paths))))
+
+    def summary(self, limit=20):
+        """Analytics for the JSON result"""
+        layers = self.layers()
+        layer_sizes = [0] * (max(layers) + 1 if len(layers) else 0)
+        for layer in layers:
+            layer_sizes[layer] += 1
+        return {
+            "cycles": self.cycles(),
+            "fan_in": self.ranking(self.fan_in(), limit),
+            "fan_out": self.ranking(self.fan_out(), limit),
+            "layer_sizes": layer_sizes
+        }
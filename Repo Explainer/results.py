@@ -0,0 +1,65 @@
+"""
+Finished Repo Explainer analyses, stored so that the same commit is not
+analyzed twice.
+
+A result is the JSON body /api/analyze returned, zlib-compressed in SQLite
+under (owner, repo, commit SHA, options): a commit never changes, so the
+stored body stays valid for as long as it is kept; past max_entries the
+oldest results are evicted.
+"""
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+
+def options_key(options):
+    """Canonical string of the request options a result depends on"""
+    return json.dumps(options, sort_keys=True, separators=(",", ":"))
+
+
+class ResultStore:
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " owner TEXT NOT NULL,"
+            " repo TEXT NOT NULL,"
+            " commit_sha TEXT NOT NULL,"
+            " options TEXT NOT NULL,"
+            " body BLOB NOT NULL,"
+            " created REAL NOT NULL,"
+            " PRIMARY KEY (owner, repo, commit_sha, options))")
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_created ON results (created)")
+        self._db.commit()
+
+    def save(self, owner, repo, commit_sha, options, body):
+        """Store body, the JSON bytes of a result, for options (see options_key)"""
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                             (owner, repo, commit_sha, options, zlib.compress(body), time.time()))
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        """Drop the oldest results beyond max_entries"""
+        self._db.execute("DELETE FROM results WHERE rowid IN"
+                         " (SELECT rowid FROM results ORDER BY created DESC, rowid DESC LIMIT -1 OFFSET ?)",
+                         (self.max_entries,))
+
+    def load(self, owner, repo, commit_sha, options):
+        """The JSON bytes stored for that commit and options, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT body FROM results"
+                " WHERE owner = ? AND repo = ? AND commit_sha = ? AND options = ?",
+                (owner, repo, commit_sha, options)).fetchone()
+        return zlib.decompress(row[0]) if row else None
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,121 @@
+"""
+Per-commit snapshots of Repo Explainer analyses, and the delta between two.
+
+A snapshot keeps what a later analysis of the same repository needs to
+reuse the earlier one: the blob SHA and scan of every file, the edges and
+the stats. It is stored zlib-compressed in SQLite under (owner, repo,
+commit SHA); past max_entries the oldest snapshots are evicted.
+"""
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+from analyzer import scan_content
+
+
+class SnapshotRecorder:
+    """Collects the snapshot of an analysis from its records and events"""
+
+    def __init__(self):
+        self.files = {}
+        self.edges = []
+        self.stats = None
+
+    def records(self, records):
+        """Pass records through, scanned, noting each file's SHA and scan"""
+        for record in records:
+            if not record.get("scan") and record.get("content") is not None:
+                record["scan"] = scan_content(record["content"])
+            self.files[record["path"]] = [record.get("sha"), record.get("scan")]
+            yield record
+
+    def event(self, kind, payload):
+        if kind == "edges":
+            self.edges.extend([e["source"], e["target"], e["type"]] for e in payload)
+        elif kind == "summary":
+            self.stats = payload["stats"]
+
+    def snapshot(self):
+        return {"files": self.files, "edges": self.edges, "stats": self.stats}
+
+
+def known_scans(snapshot):
+    """{blob sha: scan} of the files a snapshot scanned"""
+    return {sha: scan for sha, scan in snapshot["files"].values() if sha and scan}
+
+
+def snapshot_delta(old, new):
+    """What changed from snapshot old to snapshot new"""
+    old_files = old["files"]
+    new_files = new["files"]
+    added = [path for path in new_files if path not in old_files]
+    removed = [path for path in old_files if path not in new_files]
+    modified = [path for path, (sha, _) in new_files.items()
+                if path in old_files and old_files[path][0] != sha]
+    old_edges = {tuple(e) for e in old["edges"]}
+    new_edges = {tuple(e) for e in new["edges"]}
+
+    def edge_dicts(edges):
+        return [{"source": s, "target": t, "type": kind} for s, t, kind in sorted(edges)]
+
+    stats = {}
+    for key, value in new["stats"].items():
+        before = old["stats"].get(key)
+        if key == "languages":
+            before = before or {}
+            changes = {language: value.get(language, 0) - before.get(language, 0)
+                       for language in {**before, **value}}
+            stats[key] = {language: change for language, change in changes.items() if change}
+        else:
+            stats[key] = value - (before or 0)
+    return {
+        "files": {"added": added, "modified": modified, "removed": removed},
+        "edges": {"added": edge_dicts(new_edges - old_edges), "removed": edge_dicts(old_edges - new_edges)},
+        "stats": stats
+    }
+
+
+class SnapshotStore:
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            " owner TEXT NOT NULL,"
+            " repo TEXT NOT NULL,"
+            " commit_sha TEXT NOT NULL,"
+            " data BLOB NOT NULL,"
+            " created REAL NOT NULL,"
+            " PRIMARY KEY (owner, repo, commit_sha))")
+        self._db.execute("CREATE INDEX IF NOT EXISTS snapshots_created ON snapshots (created)")
+        self._db.commit()
+
+    def save(self, owner, repo, commit_sha, snapshot):
+        data = zlib.compress(json.dumps(snapshot, separators=(",", ":")).encode("utf-8"))
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)",
+                             (owner, repo, commit_sha, data, time.time()))
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        """Drop the oldest snapshots beyond max_entries"""
+        self._db.execute("DELETE FROM snapshots WHERE rowid IN"
+                         " (SELECT rowid FROM snapshots ORDER BY created DESC, rowid DESC LIMIT -1 OFFSET ?)",
+                         (self.max_entries,))
+
+    def load(self, owner, repo, commit_sha):
+        """The snapshot saved for that commit, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM snapshots WHERE owner = ? AND repo = ? AND commit_sha = ?",
+                (owner, repo, commit_sha)).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def close(self):
+        self._db.close()
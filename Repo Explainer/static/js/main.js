@@ -5,7 +5,8 @@ async function analyzeRepo() {
   const status = document.getElementById('status');
   status.textContent = 'Analyzing...';
 
-  const payload = { repo_url: repoUrl };
+  // the server streams NDJSON events, rendered as they arrive
+  const payload = { repo_url: repoUrl, stream: true };
   if (branch) payload.branch = branch;
   // pass optional params to server (server uses GITHUB_TOKEN env if available)
   try {
@@ -14,18 +15,84 @@ async function analyzeRepo() {
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify(payload)
     });
-    const data = await res.json();
     if (!res.ok) {
+      const data = await res.json();
       status.textContent = 'Error: ' + (data.error || res.statusText);
       return;
     }
-    status.textContent = 'Done';
-    renderResults(data);
+    const data = { tree: {}, nodes: [], edges: [], top_files: [] };
+    for await (const event of readEvents(res)) {
+      if (!handleEvent(event, data, status)) return;
+    }
   } catch (err) {
     status.textContent = 'Network error: ' + err.message;
   }
 }
 
+async function* readEvents(res) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffered += decoder.decode(value, { stream: true });
+    const lines = buffered.split('\n');
+    buffered = lines.pop();
+    for (const line of lines) {
+      if (line) yield JSON.parse(line);
+    }
+  }
+  if (buffered) yield JSON.parse(buffered);
+}
+
+// Applies one stream event to data and the page; false once the stream failed
+function handleEvent(event, data, status) {
+  switch (event.type) {
+    case 'meta':
+      Object.assign(data, event);
+      break;
+    case 'files':
+      event.files.forEach(f => addToTree(data.tree, f));
+      document.getElementById('results').style.display = 'block';
+      document.getElementById('fileTree').textContent = JSON.stringify(data.tree, null, 2);
+      break;
+    case 'nodes':
+      data.nodes.push(...event.nodes);
+      status.textContent = `Analyzing... ${data.nodes.length} files`;
+      break;
+    case 'edges':
+      data.edges.push(...event.edges);
+      status.textContent = `Resolving imports... ${data.edges.length} links`;
+      break;
+    case 'result':
+      // an analysis of this commit stored earlier, sent whole
+      Object.assign(data, event);
+      break;
+    case 'summary':
+      data.stats = event.stats;
+      data.top_files = event.top_files;
+      data.graph = event.graph;
+      break;
+    case 'done':
+      Object.assign(data, event);
+      status.textContent = 'Done';
+      renderResults(data);
+      break;
+    case 'error':
+      status.textContent = 'Error: ' + event.error;
+      return false;
+  }
+  return true;
+}
+
+function addToTree(tree, f) {
+  const parts = f.path.split('/');
+  let node = tree;
+  parts.slice(0, -1).forEach(p => { node = node[p] = node[p] || {}; });
+  node[parts[parts.length - 1]] = { _meta: { size: f.size, language: f.language, lines: f.lines } };
+}
+
 function renderResults(data) {
   document.getElementById('results').style.display = 'block';
   const summ = document.getElementById('summaryArea');
@@ -34,8 +101,11 @@ function renderResults(data) {
     <p>Total files (repo reported): ${data.file_count}</p>
     <p>Files analyzed: ${data.files_returned}</p>
     ${data.warning ? `<p style="color: #b45309">${data.warning}</p>` : ''}
+    ${data.incomplete ? `<p style="color: #b45309">Some files could not be downloaded; their imports are missing.</p>` : ''}
     <p>Total bytes: ${data.stats.total_bytes} • Total lines: ${data.stats.total_lines}</p>
     <p>Languages: ${Object.entries(data.stats.languages).map(([k,v]) => `${k}: ${v}`).join(', ')}</p>
+    ${data.graph ? `<p>Import cycles: ${data.graph.cycles.length} • Dependency layers: ${data.graph.layer_sizes.length}</p>
+    <p>Most imported: ${data.graph.fan_in.slice(0, 5).map(f => `${f.path} (${f.count})`).join(', ') || 'none'}</p>` : ''}
   `;
 
   // file tree display (simple)
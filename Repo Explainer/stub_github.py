@@ -0,0 +1,160 @@
+"""
+Local stand-in for the parts of the GitHub REST API Repo Explainer calls,
+for tests and benchmarks that must not touch the network.
+
+    with StubGitHub({"app.py": "import util\n", "util.py": ""}, latency=0.01) as stub:
+        client = GitHubClient(stub.url)
+"""
+import base64
+import hashlib
+import io
+import json
+import tarfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from archive import git_blob_sha
+
+
+class StubGitHub:
+    def __init__(self, files, owner="owner", repo="repo", branch="main", latency=0.0):
+        self.owner = owner
+        self.repo = repo
+        self.branch = branch
+        self.latency = latency
+        self.blobs = {}
+        self.tree = []
+        self.set_files(files)
+        self.requests = 0
+        # Requests answered 304 Not Modified
+        self.not_modified = 0
+        # Answer this many requests with 502 before serving normally
+        self.fail_next = 0
+        # Answer this many requests with a rate-limit 403 (resets after rate_limit_reset seconds)
+        self.rate_limited_next = 0
+        self.rate_limit_reset = 0.2
+        self._lock = threading.Lock()
+        self._server = None
+
+    def set_files(self, files):
+        """Replace the repository contents ({path: str or bytes})"""
+        self.blobs = {}
+        self.tree = []
+        for path, content in sorted(files.items()):
+            data = content.encode("utf-8") if isinstance(content, str) else content
+            sha = git_blob_sha(data)
+            self.blobs[sha] = data
+            self.tree.append({"path": path, "mode": "100644", "type": "blob", "sha": sha, "size": len(data)})
+
+    def tarball(self):
+        """The repository as GitHub serves it: gzipped tar under owner-repo-sha/"""
+        buf = io.BytesIO()
+        prefix = f"{self.owner}-{self.repo}-0000000"
+        with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+            for entry in self.tree:
+                info = tarfile.TarInfo(f"{prefix}/{entry['path']}")
+                info.size = entry["size"]
+                tar.addfile(info, io.BytesIO(self.blobs[entry["sha"]]))
+        return buf.getvalue()
+
+    @property
+    def commit_sha(self):
+        """Stands in for the commit SHA: changes whenever the files do"""
+        return hashlib.sha1(json.dumps(self.tree, sort_keys=True).encode("utf-8")).hexdigest()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub._handle(self)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _send(self, handler, status, body=b"", headers=None, content_type="application/json"):
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            handler.send_header(k, v)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _json(self, handler, status, payload, headers=None):
+        self._send(handler, status, json.dumps(payload).encode("utf-8"), headers)
+
+    def _conditional(self, handler, body, content_type="application/json"):
+        """200 with an ETag for body, or 304 when If-None-Match has that ETag"""
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if handler.headers.get("If-None-Match") == etag:
+            with self._lock:
+                self.not_modified += 1
+            handler.send_response(304)
+            handler.send_header("ETag", etag)
+            handler.end_headers()
+            return
+        self._send(handler, 200, body, {"ETag": etag}, content_type)
+
+    def _handle(self, handler):
+        with self._lock:
+            self.requests += 1
+            fail = self.fail_next > 0
+            if fail:
+                self.fail_next -= 1
+            limited = not fail and self.rate_limited_next > 0
+            if limited:
+                self.rate_limited_next -= 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            return self._json(handler, 502, {"message": "Bad Gateway"})
+        if limited:
+            reset = time.time() + self.rate_limit_reset
+            return self._json(handler, 403, {"message": "API rate limit exceeded"},
+                              {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": f"{reset:.3f}"})
+
+        parts = [p for p in urlparse(handler.path).path.split("/") if p]
+        prefix = ["repos", self.owner, self.repo]
+        if parts[:3] != prefix:
+            return self._json(handler, 404, {"message": "Not Found"})
+        rest = parts[3:]
+        if not rest:
+            return self._conditional(handler, json.dumps({"default_branch": self.branch}).encode("utf-8"))
+        if rest[0] == "commits":
+            return self._conditional(handler, self.commit_sha.encode("ascii"), "text/plain")
+        if rest[0] == "tarball":
+            return self._send(handler, 200, self.tarball(), content_type="application/x-gzip")
+        if rest[:2] == ["git", "trees"]:
+            return self._json(handler, 200, {"sha": "tree", "tree": list(self.tree), "truncated": False})
+        if rest[:2] == ["git", "blobs"] and len(rest) == 3 and rest[2] in self.blobs:
+            data = self.blobs[rest[2]]
+            return self._json(handler, 200, {
+                "sha": rest[2],
+                "size": len(data),
+                "encoding": "base64",
+                "content": base64.b64encode(data).decode("ascii")
+            })
+        return self._json(handler, 404, {"message": "Not Found"})
@@ -0,0 +1,57 @@
+# Unit tests for import resolution (requires pytest)
+from analyzer import ImportResolver, analyze_repo_tree
+
+PATHS = ["app.py", "pkg/__init__.py", "pkg/core.py", "pkg/sub/__init__.py", "pkg/sub/leaf.py",
+         "scripts/run.py", "scripts/helpers.py", "web/index.html", "web/js/main.js", "web/js/util.ts"]
+
+
+def test_python_imports():
+    resolver = ImportResolver(PATHS)
+    assert resolver.resolve("app.py", "py-import", "pkg.core") == "pkg/core.py"
+    assert resolver.resolve("app.py", "py-import", "pkg.sub") == "pkg/sub/__init__.py"
+    assert resolver.resolve("pkg/sub/leaf.py", "py-import", ".") == "pkg/sub/__init__.py"
+    assert resolver.resolve("pkg/sub/leaf.py", "py-import", "..core") == "pkg/core.py"
+    assert resolver.resolve("pkg/core.py", "py-import", "...core") is None
+    assert resolver.resolve("scripts/run.py", "py-import", "helpers") == "scripts/helpers.py"
+    assert resolver.resolve("app.py", "py-import", "os") is None
+
+
+def test_path_references():
+    resolver = ImportResolver(PATHS)
+    assert resolver.resolve_refs("web/js/main.js", [["js-import", "./util"], ["js-import", "react"],
+                                                    ["js-import", "../js/main.js"]]) \
+        == ["web/js/util.ts", None, "web/js/main.js"]
+    assert resolver.resolve("web/index.html", "html-script", "./js/main") == "web/js/main.js"
+
+
+def test_edges_from_repo_tree():
+    files = [{"path": "pkg/__init__.py", "content": "from .core import run\n"},
+             {"path": "pkg/core.py", "content": "import pkg\n"}]
+    edges = analyze_repo_tree(files)["edges"]
+    assert edges == [{"source": "pkg/__init__.py", "target": "pkg/core.py", "type": "py-import"},
+                     {"source": "pkg/core.py", "target": "pkg/__init__.py", "type": "py-import"}]
+
+
+def test_parallel_scan_matches_serial():
+    from concurrent.futures import ProcessPoolExecutor
+    files = [{"path": f"pkg/m{i}.py", "size": 20, "content": f"import pkg.m{(i + 1) % 50}\n" * (i % 3)}
+             for i in range(50)]
+    expected = analyze_repo_tree([dict(f) for f in files])
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        assert analyze_repo_tree([dict(f) for f in files], executor=pool) == expected
+
+
+def test_stream_events_rebuild_the_result():
+    from analyzer import add_to_tree, iter_repo_tree
+    files = [{"path": f"src/m{i}.js", "size": i, "content": f"import x from './m{i + 1}'\n"} for i in range(5)]
+    events = list(iter_repo_tree([dict(f) for f in files], chunk_size=2))
+    assert [kind for kind, _ in events] == ["files", "nodes"] * 3 + ["edges", "edges", "summary"]
+    tree = {}
+    for kind, payload in events:
+        if kind == "files":
+            add_to_tree(tree, payload)
+    result = analyze_repo_tree([dict(f) for f in files])
+    assert tree == result["tree"]
+    assert [f["path"] for f in result["top_files"]] == [f"src/m{i}.js" for i in (4, 3, 2, 1, 0)]
+    assert "content" not in result["top_files"][0]
+    assert analyze_repo_tree([dict(f) for f in files], include_content=True)["top_files"][0]["content"]
@@ -0,0 +1,72 @@
+# Unit tests for the /api/analyze endpoint against a local stub server (requires pytest)
+import json
+import os
+
+import pytest
+
+# no stores next to the sources; the tests set their own
+for name in ("BLOB_CACHE_PATH", "SNAPSHOT_DB_PATH", "RESULT_DB_PATH"):
+    os.environ.setdefault(name, "")
+
+import app
+from fetcher import GitHubClient
+from results import ResultStore
+from snapshots import SnapshotStore
+from stub_github import StubGitHub, git_blob_sha
+
+FILES = {"app.py": "import util\n", "util.py": "VALUE = 1\n", "static/main.js": "import './x.js'\n"}
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    with StubGitHub(FILES) as stub:
+        monkeypatch.setattr(app, "github", GitHubClient(stub.url, backoff=0.01))
+        monkeypatch.setattr(app, "blob_cache", None)
+        monkeypatch.setattr(app, "results", ResultStore(str(tmp_path / "results.sqlite3")))
+        monkeypatch.setattr(app, "snapshots", SnapshotStore(str(tmp_path / "analyses.sqlite3")))
+        yield stub
+
+
+def analyze(body):
+    with app.app.test_client() as client:
+        return client.post("/api/analyze", json={"repo_url": "https://github.com/owner/repo", **body})
+
+
+def stream_events(body):
+    return [json.loads(line) for line in analyze({**body, "stream": True}).get_data(as_text=True).splitlines()]
+
+
+def test_result_is_stored_and_served_again(stub):
+    first = analyze({}).get_json()
+    assert first["incomplete"] is False
+    assert app.results.load("owner", "repo", stub.commit_sha, app.options_key({
+        "mode": "api", "max_files": 2000, "max_file_size_bytes": 200 * 1024,
+        "include_content": False, "dependents_of": None})) is not None
+    requests = stub.requests
+    assert analyze({}).get_json() == first
+    # only the default branch and its head are revalidated
+    assert stub.requests == requests + 2
+
+
+def test_failed_blob_download_is_not_stored(stub):
+    del stub.blobs[git_blob_sha(FILES["util.py"].encode())]
+    result = analyze({}).get_json()
+    assert result["incomplete"] is True
+    assert app.snapshots.load("owner", "repo", stub.commit_sha) is None
+    # analyzed again, not served from storage
+    requests = stub.requests
+    assert analyze({}).get_json()["incomplete"] is True
+    assert stub.requests > requests + 2
+
+
+def test_streamed_result_is_stored(stub):
+    events = stream_events({})
+    assert events[-1]["type"] == "done" and events[-1]["incomplete"] is False
+    stored = stream_events({})
+    assert [e["type"] for e in stored] == ["meta", "result", "done"]
+    assert stored[1]["nodes"] == analyze({}).get_json()["nodes"]
+
+
+def test_streamed_result_with_content_is_not_stored(stub):
+    stream_events({"include_content": True})
+    assert [e["type"] for e in stream_events({"include_content": True})][1] != "result"
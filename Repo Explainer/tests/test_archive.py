@@ -0,0 +1,79 @@
+# Unit tests for archive ingestion (requires pytest)
+import io
+import subprocess
+import tarfile
+
+import pytest
+
+from archive import ArchiveReader, git_blob_sha
+from fetcher import GitHubClient
+from stub_github import StubGitHub
+
+FILES = {"app.py": "import util\n", "util.py": "VALUE = 1\n", "static/main.js": "import './x.js'\n"}
+
+
+def test_github_tarball_matches_blobs():
+    with StubGitHub(FILES) as stub:
+        client = GitHubClient(stub.url)
+        reader = ArchiveReader(max_files=100, max_file_size_bytes=1024)
+        records = list(reader.iter_github_tarball(client.open_tarball("owner", "repo", "main")))
+    assert {r["path"]: r["content"] for r in records} == FILES
+    assert all(r["sha"] == git_blob_sha(r["content"].encode()) for r in records)
+    assert reader.file_count == 3 and not reader.truncated
+
+
+def test_limits_applied_while_streaming():
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for name, data in [("a.py", b"x" * 10), ("big.py", b"x" * 100), ("c.py", b"y")]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    buf.seek(0)
+    reader = ArchiveReader(max_files=2, max_file_size_bytes=50)
+    records = list(reader.iter_tar(buf))
+    assert [(r["path"], r["content"] is None) for r in records] == [("a.py", False), ("big.py", True)]
+    assert reader.file_count == 3 and reader.truncated
+
+
+def git_clone_with(tmp_path, files):
+    repo = tmp_path / "clone"
+    repo.mkdir()
+    for path, content in files.items():
+        (repo / path).parent.mkdir(parents=True, exist_ok=True)
+        (repo / path).write_text(content)
+    git = ["git", "-C", str(repo), "-c", "user.name=t", "-c", "user.email=t@t"]
+    subprocess.run(["git", "init", "-q", "-b", "main", str(repo)], check=True)
+    subprocess.run(git + ["add", "-A"], check=True)
+    subprocess.run(git + ["commit", "-q", "-m", "files"], check=True)
+    return str(repo)
+
+
+def test_git_archive_of_a_branch(tmp_path):
+    repo = git_clone_with(tmp_path, FILES)
+    records = list(ArchiveReader(100, 1024).iter_git_archive(repo, "main"))
+    assert {r["path"]: r["content"] for r in records} == FILES
+
+
+@pytest.mark.parametrize("ref", ["--output=OUT", "--remote=OUT", "-o", "", "no-such-branch", "main^{tree}"])
+def test_git_archive_rejects_option_and_unknown_refs(tmp_path, ref):
+    repo = git_clone_with(tmp_path, FILES)
+    target = tmp_path / "injected.tar"
+    with pytest.raises(ValueError):
+        list(ArchiveReader(100, 1024).iter_git_archive(repo, ref.replace("OUT", str(target))))
+    assert not target.exists()
+
+
+def test_directory_skips_symlinks_out_of_the_tree(tmp_path):
+    secret = tmp_path / "secret.txt"
+    secret.write_text("password\n")
+    root = tmp_path / "repo"
+    (root / "sub").mkdir(parents=True)
+    (root / "app.py").write_text("import util\n")
+    (root / "leak").symlink_to(secret)
+    (root / "sub" / "up").symlink_to("../../secret.txt")
+    (root / "inner").symlink_to("app.py")
+    records = list(ArchiveReader(100, 1024).iter_directory(str(root)))
+    assert {r["path"]: r["content"] for r in records} == {"app.py": "import util\n"}
+    with pytest.raises(ValueError):
+        list(ArchiveReader(100, 1024).iter_local(str(root / "leak")))
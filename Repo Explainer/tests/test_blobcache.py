@@ -0,0 +1,23 @@
+# Unit tests for the SHA-keyed blob cache (requires pytest)
+from analyzer import scan_content
+from blobcache import BlobCache
+
+
+def test_round_trip(tmp_path):
+    cache = BlobCache(str(tmp_path / "blobs.sqlite3"))
+    content = "import util\nfrom pkg import mod\n"
+    cache.put("abc", content, scan_content(content))
+    reopened = BlobCache(str(tmp_path / "blobs.sqlite3"))
+    assert reopened.get("abc") == {"content": content, "scan": scan_content(content)}
+    assert reopened.get("missing") is None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = BlobCache(str(tmp_path / "blobs.sqlite3"), max_bytes=300)
+    for sha in ("a", "b", "c"):
+        cache.put(sha, "x" * 100, scan_content("x"))
+    cache.get("a")
+    cache.put("d", "x" * 100, scan_content("x"))
+    kept = set(cache.get_many("abcd"))
+    assert len(kept) == 3 and {"a", "d"} <= kept
+    assert cache.total_bytes == 300
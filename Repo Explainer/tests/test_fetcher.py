@@ -0,0 +1,64 @@
+# Unit tests for the GitHub client against a local stub server (requires pytest)
+import time
+
+import pytest
+
+from fetcher import GitHubClient, RateLimitError
+from stub_github import StubGitHub, git_blob_sha
+
+FILES = {"app.py": "import util\n", "util.py": "VALUE = 1\n", "static/main.js": "import './x.js'\n"}
+
+
+def test_fetch_blob_contents():
+    with StubGitHub(FILES) as stub:
+        client = GitHubClient(stub.url, max_workers=4)
+        tree = client.get_repo_tree("owner", "repo", "main")["tree"]
+        contents = client.fetch_blob_contents("owner", "repo", [e["sha"] for e in tree])
+    assert contents == {git_blob_sha(v.encode()): v for v in FILES.values()}
+
+
+def test_retries_server_errors():
+    with StubGitHub(FILES) as stub:
+        stub.fail_next = 2
+        client = GitHubClient(stub.url, backoff=0.01)
+        assert client.get_default_branch("owner", "repo") == "main"
+        assert stub.requests == 3
+
+
+def test_waits_for_rate_limit_reset():
+    with StubGitHub(FILES) as stub:
+        stub.rate_limited_next = 1
+        stub.rate_limit_reset = 0.3
+        client = GitHubClient(stub.url)
+        start = time.time()
+        assert client.get_default_branch("owner", "repo") == "main"
+        assert time.time() - start >= 0.2
+
+
+def test_gives_up_on_long_rate_limit():
+    with StubGitHub(FILES) as stub:
+        stub.rate_limited_next = 1
+        stub.rate_limit_reset = 600
+        client = GitHubClient(stub.url, max_rate_limit_wait=1)
+        with pytest.raises(RateLimitError):
+            client.get_default_branch("owner", "repo")
+
+
+def test_revalidates_branch_head():
+    with StubGitHub(FILES) as stub:
+        client = GitHubClient(stub.url)
+        sha = client.get_commit_sha("owner", "repo", "main")
+        assert client.get_commit_sha("owner", "repo", "main") == sha
+        assert stub.not_modified == 1
+        stub.set_files({"app.py": "print(1)\n"})
+        assert client.get_commit_sha("owner", "repo", "main") == stub.commit_sha != sha
+
+
+def test_rate_limit_stops_blob_downloads():
+    with StubGitHub(FILES) as stub:
+        client = GitHubClient(stub.url, max_workers=1, max_rate_limit_wait=1)
+        tree = client.get_repo_tree("owner", "repo", "main")["tree"]
+        stub.rate_limited_next = 1
+        stub.rate_limit_reset = 600
+        with pytest.raises(RateLimitError):
+            client.fetch_blob_contents("owner", "repo", [e["sha"] for e in tree])
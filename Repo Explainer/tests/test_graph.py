@@ -0,0 +1,38 @@
+# Unit tests for the compact dependency graph (requires pytest)
+from graph import GraphBuilder
+
+
+def build(paths, edges):
+    builder = GraphBuilder()
+    for path in paths:
+        builder.add_node(path, "Python", 1, 1)
+    for source, path in enumerate(paths):
+        builder.add_edges(source, [(paths.index(t), "py-import") for s, t in edges if s == path])
+    return builder.build()
+
+
+PATHS = ["app.py", "views.py", "models.py", "db.py", "util.py"]
+EDGES = [("app.py", "views.py"), ("views.py", "models.py"), ("models.py", "db.py"),
+         ("db.py", "models.py"), ("views.py", "util.py"), ("app.py", "util.py")]
+
+
+def test_cycles_and_layers():
+    graph = build(PATHS, EDGES)
+    assert graph.cycles() == [["models.py", "db.py"]]
+    assert list(graph.layers()) == [2, 1, 0, 0, 0]
+    assert graph.summary()["layer_sizes"] == [3, 1, 1]
+
+
+def test_fan_in_out_and_dependents():
+    graph = build(PATHS, EDGES)
+    assert graph.ranking(graph.fan_in(), 2) == [{"path": "models.py", "count": 2},
+                                                {"path": "util.py", "count": 2}]
+    assert list(graph.fan_out()) == [2, 2, 1, 1, 0]
+    assert graph.dependents("db.py") == ["models.py", "views.py", "app.py"]
+    assert graph.dependents("app.py") == []
+
+
+def test_edges_round_trip():
+    graph = build(PATHS, EDGES)
+    edges = [(e["source"], e["target"]) for chunk in graph.iter_edge_dicts(2) for e in chunk]
+    assert sorted(edges) == sorted(EDGES)
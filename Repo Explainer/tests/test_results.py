@@ -0,0 +1,20 @@
+# Unit tests for the stored analysis results (requires pytest)
+from results import ResultStore, options_key
+
+
+def test_store_round_trip(tmp_path):
+    store = ResultStore(str(tmp_path / "analyses.sqlite3"))
+    options = options_key({"mode": "api", "max_files": 2000})
+    store.save("owner", "repo", "c0ffee", options, b'{"nodes": []}')
+    assert store.load("owner", "repo", "c0ffee", options_key({"max_files": 2000, "mode": "api"})) == b'{"nodes": []}'
+    assert store.load("owner", "repo", "c0ffee", options_key({"mode": "tarball", "max_files": 2000})) is None
+    assert store.load("owner", "repo", "beef", options) is None
+
+
+def test_store_evicts_oldest_past_max_entries(tmp_path):
+    store = ResultStore(str(tmp_path / "results.sqlite3"), max_entries=2)
+    options = options_key({"mode": "api"})
+    for sha in ("c1", "c2", "c3"):
+        store.save("owner", "repo", sha, options, sha.encode())
+    assert store.load("owner", "repo", "c1", options) is None
+    assert [store.load("owner", "repo", sha, options) for sha in ("c2", "c3")] == [b"c2", b"c3"]
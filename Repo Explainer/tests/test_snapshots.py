@@ -0,0 +1,44 @@
+# Unit tests for analysis snapshots and deltas (requires pytest)
+from analyzer import iter_repo_tree
+from snapshots import SnapshotRecorder, SnapshotStore, known_scans, snapshot_delta
+
+
+def snapshot_of(files):
+    recorder = SnapshotRecorder()
+    records = [{"path": path, "sha": content, "size": len(content), "content": content}
+               for path, content in files.items()]
+    for kind, payload in iter_repo_tree(recorder.records(records)):
+        recorder.event(kind, payload)
+    return recorder.snapshot()
+
+
+def test_delta_between_snapshots():
+    old = snapshot_of({"a.py": "import b\n", "b.py": "", "c.py": "import a\n"})
+    new = snapshot_of({"a.py": "import c\n", "b.py": "", "d.py": "\n\n"})
+    delta = snapshot_delta(old, new)
+    assert delta["files"] == {"added": ["d.py"], "modified": ["a.py"], "removed": ["c.py"]}
+    assert delta["edges"] == {"added": [], "removed": [{"source": "a.py", "target": "b.py", "type": "py-import"},
+                                                      {"source": "c.py", "target": "a.py", "type": "py-import"}]}
+    assert delta["stats"] == {"total_files": 0, "total_bytes": -7, "total_lines": 1, "languages": {"Python": -7}}
+
+
+def test_store_round_trip(tmp_path):
+    store = SnapshotStore(str(tmp_path / "analyses.sqlite3"))
+    snapshot = snapshot_of({"a.py": "import b\n", "b.py": ""})
+    store.save("owner", "repo", "c0ffee", snapshot)
+    assert store.load("owner", "repo", "c0ffee") == snapshot
+    assert store.load("owner", "repo", "beef") is None
+    assert set(known_scans(snapshot)) == {"import b\n"}
+
+
+def test_store_evicts_oldest_past_max_entries(tmp_path):
+    store = SnapshotStore(str(tmp_path / "analyses.sqlite3"), max_entries=2)
+    snapshot = snapshot_of({"a.py": ""})
+    for sha in ("c1", "c2", "c3"):
+        store.save("owner", "repo", sha, snapshot)
+    assert store.load("owner", "repo", "c1") is None
+    assert store.load("owner", "repo", "c2") == store.load("owner", "repo", "c3") == snapshot
+    store.save("owner", "repo", "c2", snapshot)
+    store.save("owner", "repo", "c4", snapshot)
+    assert store.load("owner", "repo", "c3") is None
+    assert store.load("owner", "repo", "c2") == snapshot